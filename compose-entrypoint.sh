@@ -3,6 +3,8 @@ set -eo pipefail
 
 uv run -m manage migrate --noinput --skip-checks
 
+uv run -m manage createcachetable --skip-checks
+
 uv run -m manage collectstatic --noinput --skip-checks
 
 exec "$@"
@@ -91,6 +91,34 @@ MIDDLEWARE = (
     "allauth.account.middleware.AccountMiddleware",
 )
 
+# Report each request's queries and timings in a Server-Timing header and
+# the log, and log the slowest queries of requests slower than SLOW_MS.
+REQUEST_TIMING = env.bool("REQUEST_TIMING", default=False)
+REQUEST_TIMING_SLOW_MS = env.int("REQUEST_TIMING_SLOW_MS", default=1000)
+REQUEST_TIMING_SLOW_QUERIES = env.int("REQUEST_TIMING_SLOW_QUERIES", default=5)
+if REQUEST_TIMING:
+    MIDDLEWARE = ("grants.middleware.RequestTimingMiddleware",) + MIDDLEWARE
+
+# Save cProfile stats for a random fraction of requests, and sampled
+# stacks for requests slower than SLOW_MS (0 for none), to download from
+# the admin.
+REQUEST_PROFILING = env.bool("REQUEST_PROFILING", default=False)
+REQUEST_PROFILING_SAMPLE_RATE = env.float("REQUEST_PROFILING_SAMPLE_RATE", default=0.0)
+REQUEST_PROFILING_SLOW_MS = env.int("REQUEST_PROFILING_SLOW_MS", default=2000)
+REQUEST_PROFILING_INTERVAL_MS = env.int("REQUEST_PROFILING_INTERVAL_MS", default=10)
+if REQUEST_PROFILING:
+    MIDDLEWARE = ("grants.middleware.RequestProfilingMiddleware",) + MIDDLEWARE
+
+# A directory shared by the web and worker processes, where each keeps
+# the metrics it records for /metrics/ to add up. The start scripts clear
+# out their host's files.
+# METRICS_TOKEN must be sent as a bearer token to read them; outside
+# DEBUG they aren't served at all without one.
+METRICS_DIR = env.str("METRICS_DIR", default="")
+METRICS_TOKEN = env.str("METRICS_TOKEN", default="")
+if METRICS_DIR:
+    MIDDLEWARE = ("grants.middleware.MetricsMiddleware",) + MIDDLEWARE
+
 ROOT_URLCONF = "config.urls"
 
 WSGI_APPLICATION = "config.wsgi.application"
@@ -105,6 +133,17 @@ DATABASES = {
     "default": env.dj_db_url("DATABASE_URL", default="sqlite:///db.sqlite3"),
 }
 
+# Cache
+# https://docs.djangoproject.com/en/dev/topics/cache/
+# Shared between the web and worker processes, as cached values are
+# invalidated from both. The database cache is only a fallback, as every
+# write to it is several queries; production is expected to set CACHE_URL
+# to Redis or Memcached.
+
+CACHES = {
+    "default": env.dj_cache_url("CACHE_URL", default="db://grants_cache"),
+}
+
 # Internationalization
 # https://docs.djangoproject.com/en/dev/topics/i18n/
 
@@ -126,6 +165,16 @@ STATICFILES_DIRS = (
     str(BASE_DIR.joinpath("static")),
 )
 
+# Uploaded and generated files (exports, imports). Not served publicly;
+# views stream them after checking access. Uploaded CSVs are saved by the
+# web processes and read by the worker, and exports the other way round,
+# so MEDIA_ROOT must be a directory both can see, e.g. one volume mounted
+# into the web and worker containers. It has to be set outside DEBUG, as
+# a directory inside each container would keep them apart.
+
+MEDIA_URL = "/media/"
+MEDIA_ROOT = env.str("MEDIA_ROOT", default=str(BASE_DIR.joinpath("media")) if DEBUG else "")
+
 DEFAULT_AUTO_FIELD = "django.db.models.AutoField"
 
 ADMIN_URL = env.str("ADMIN_URL", default="django-admin/")
@@ -165,17 +214,42 @@ PRODUCTION_PROCESSES = {
 
 # django-q settings
 
+# Full exports of big programs are allowed longer than other tasks. The
+# broker hands a task to another worker if it's still running after
+# "retry" seconds, so that has to be longer than any task's timeout.
+EXPORT_TIMEOUT = env.int("EXPORT_TIMEOUT", default=600)
+
 Q_CLUSTER = {
     "bulk": 10,
     "max_attempts": 1,
     "name": "DjangORM",
     "orm": "default",
     "queue_limit": 50,
-    "retry": 120,
+    "retry": EXPORT_TIMEOUT + 60,
     "timeout": 90,
     "workers": 2,
 }
 
+# Save submitted applications in the django-q worker rather than in the
+# request, to ride out launch-day spikes on the apply page.
+APPLY_ASYNC = env.bool("APPLY_ASYNC", default=False)
+
+# Logging
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "grants": {
+            "handlers": ["console"],
+            "level": env.str("GRANTS_LOG_LEVEL", default="INFO"),
+        },
+    },
+}
+
 # Tailwind CSS settings
 
 TAILWIND_CLI_AUTOMATIC_DOWNLOAD = env.bool(
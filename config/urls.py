@@ -7,7 +7,7 @@ from django.urls import path
 
 from config import __version__
 from config.views import favicon
-from grants.views import bulk_load, program
+from grants.views import bulk_load, export, metrics, program
 from users import views as users
 
 admin_header = f"Grorg v{__version__}"
@@ -17,6 +17,7 @@ admin.site.site_title = admin_header
 
 urlpatterns = [
     path("health/", include("health_check.urls")),
+    path("metrics/", metrics.metrics),
     path("favicon.ico", favicon),
     path("", program.index, name="index"),
     path("accounts/", include("allauth.urls")),
@@ -53,7 +54,21 @@ urlpatterns = [
         "<str:program>/applicants/bulk_scores/",
         bulk_load.BulkLoadScores.as_view(),
     ),
+    path(
+        "<str:program>/applicants/imports/<str:upload_id>/",
+        bulk_load.ImportStatus.as_view(),
+    ),
     path("<str:program>/applicants/csv/", program.ProgramApplicantsCsv.as_view()),
+    path("<str:program>/applicants/exports/", export.ProgramExports.as_view()),
+    path("<str:program>/applicants/exports/<str:job_id>/", export.ExportJobView.as_view()),
+    path(
+        "<str:program>/applicants/exports/<str:job_id>/status/",
+        export.ExportJobStatus.as_view(),
+    ),
+    path(
+        "<str:program>/applicants/exports/<str:job_id>/download/",
+        export.ExportJobDownload.as_view(),
+    ),
     path(
         "<str:program>/applicants/random-unscored/",
         program.RandomUnscoredApplicant.as_view(),
@@ -1,8 +1,11 @@
 from __future__ import annotations
 
 import pytest
+from django_q.conf import Conf
 from model_bakery import baker
 
+from grants.forms import application_form_classes
+
 
 @pytest.fixture
 def user(db):
@@ -90,3 +93,30 @@ def client_logged_in(client, user):
     """Return a client with the user logged in."""
     client.force_login(user)
     return client
+
+
+@pytest.fixture
+def media_root(settings, tmp_path):
+    """Store uploaded and generated files in a temporary directory."""
+    settings.MEDIA_ROOT = str(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def manager_client(client_logged_in, program, user):
+    """Return a logged-in client whose user created (and so manages) the program."""
+    program.created_by = user
+    program.save()
+    return client_logged_in
+
+
+@pytest.fixture
+def sync_tasks(monkeypatch):
+    """Run django-q tasks synchronously instead of enqueueing them."""
+    monkeypatch.setattr(Conf, "SYNC", True)
+
+
+@pytest.fixture(autouse=True)
+def clear_application_form_classes():
+    """Forget application form classes built in other tests, as ids get reused."""
+    application_form_classes.clear()
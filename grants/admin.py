@@ -1,6 +1,11 @@
 from __future__ import annotations
 
 from django.contrib import admin
+from django.core.exceptions import PermissionDenied
+from django.http import FileResponse
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html
 
 from grants import models
 
@@ -30,9 +35,17 @@ class ApplicantAdmin(admin.ModelAdmin):
     list_filter = ["program"]
     list_display = ["id", "name", "email", "program", "applied"]
     list_display_links = ["id", "name"]
+    readonly_fields = ["score_count", "score_value_count", "score_sum", "score_sum_squares"]
     inlines = [AnswerInline]
 
 
+@admin.register(models.ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = ["id", "program", "requested_by", "status", "created"]
+    list_filter = ["status"]
+    raw_id_fields = ["program", "requested_by"]
+
+
 @admin.register(models.Program)
 class ProgramAdmin(admin.ModelAdmin):
     list_display = ["id", "name", "completed"]
@@ -59,6 +72,40 @@ class QuestionAdmin(admin.ModelAdmin):
     search_fields = ["question"]
 
 
+@admin.register(models.RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = ["id", "created", "kind", "method", "view", "status", "duration_ms", "download"]
+    list_filter = ["kind", "view"]
+    search_fields = ["path"]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        return [
+            path(
+                "<int:profile_id>/download/",
+                self.admin_site.admin_view(self.download_view),
+                name="grants_requestprofile_download",
+            ),
+        ] + super().get_urls()
+
+    @admin.display(description="File")
+    def download(self, obj):
+        return format_html(
+            '<a href="{}">{}</a>', reverse("admin:grants_requestprofile_download", args=[obj.pk]), obj.filename()
+        )
+
+    def download_view(self, request, profile_id):
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        profile = get_object_or_404(models.RequestProfile, pk=profile_id)
+        return FileResponse(profile.file.open("rb"), as_attachment=True, filename=profile.filename())
+
+
 @admin.register(models.Resource)
 class ResourceAdmin(admin.ModelAdmin):
     raw_id_fields = ["program"]
@@ -73,4 +120,6 @@ class ScoreAdmin(admin.ModelAdmin):
 
 @admin.register(models.UploadedCSV)
 class UploadedCSVAdmin(admin.ModelAdmin):
-    pass
+    list_display = ["id", "program", "kind", "status", "uploaded"]
+    list_filter = ["kind", "status"]
+    raw_id_fields = ["program", "uploaded_by"]
@@ -0,0 +1,43 @@
+"""
+Helpers for caching values derived from data that changes, by keying
+them on a version that's bumped whenever that data changes.
+"""
+
+from __future__ import annotations
+
+import uuid
+
+from django.core.cache import cache
+
+
+def version_key(name):
+    return "grants:version:%s" % name
+
+
+def get_version(name):
+    """
+    Returns the current version token for name, creating one if needed.
+    """
+    version = cache.get(version_key(name))
+    if version is None:
+        # A fresh random token, so entries cached under a version that has
+        # since been evicted can never be picked up again.
+        version = uuid.uuid4().hex
+        if not cache.add(version_key(name), version, timeout=None):
+            version = cache.get(version_key(name), version)
+    return version
+
+
+def bump_version(name):
+    """
+    Invalidates everything cached against name's version.
+    """
+    cache.set(version_key(name), uuid.uuid4().hex, timeout=None)
+
+
+def get_or_set_versioned(name, key, default, timeout=None):
+    """
+    Returns the value cached for key under name's current version, calling
+    default() to compute and cache it if it's not there.
+    """
+    return cache.get_or_set("grants:%s:%s:%s" % (name, get_version(name), key), default, timeout=timeout)
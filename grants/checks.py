@@ -0,0 +1,21 @@
+"""
+System checks for settings the web and worker processes have to agree on.
+"""
+
+from __future__ import annotations
+
+from django.conf import settings
+from django.core.checks import Error, register
+
+
+@register()
+def check_media_root(app_configs, **kwargs):
+    if settings.MEDIA_ROOT:
+        return []
+    return [
+        Error(
+            "MEDIA_ROOT is not set.",
+            hint="Set it to a directory shared by the web and worker processes, such as a volume mounted into both.",
+            id="grants.E001",
+        )
+    ]
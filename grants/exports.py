@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import collections
+
+from .models import Allocation, Answer, Score
+from .utils import chunked
+
+
+class Echo:
+    """
+    A file-like object that hands back whatever is written to it, so
+    csv.writer can be used to format rows for a streaming response.
+    """
+
+    def write(self, value):
+        return value
+
+
+class ApplicantExport:
+    """
+    Builds the rows of an applicant export for a program as seen by a user.
+
+    Applicants are read in chunks and each chunk's answers are fetched with
+    one query, so memory use and the number of queries per chunk don't
+    grow with the size of the program.
+    """
+
+    chunk_size = 500
+    include_rejected = False
+
+    def __init__(self, program, user, sort="applied"):
+        self.program = program
+        self.user = user
+        self.sort = sort
+        self.questions = list(self.program.questions.order_by("order").only("id", "question"))
+
+    def get_queryset(self):
+        qs = self.program.applicants_visible_to(self.user)
+        if not self.include_rejected:
+            qs = qs.exclude(status="rejected")
+        qs = qs.with_score_stats(self.user)
+        if self.sort == "score":
+            return qs.order_by_score()
+        return qs.order_by("-applied", "-id")
+
+    def headers(self):
+        headers = ["Email", "Name", "Has Scored", "Average Score"]
+        if self.user.is_staff:
+            headers.append("Applied to Speak")
+        return headers + [question.question for question in self.questions]
+
+    def row(self, applicant, answers):
+        row = [
+            applicant.email,
+            applicant.name,
+            applicant.has_scored,
+            applicant.score_average if applicant.has_scored else -1,
+        ]
+        if self.user.is_staff:
+            row.append(applicant.applied_to_speak)
+        return row + [answers.get((applicant.id, question.id), "") for question in self.questions]
+
+    def chunks(self):
+        """
+        Yields lists of (applicant, answers) pairs, where answers maps
+        (applicant id, question id) to the answer text.
+        """
+        for applicants in chunked(self.get_queryset().iterator(chunk_size=self.chunk_size), self.chunk_size):
+            answers = {
+                (applicant_id, question_id): answer
+                for applicant_id, question_id, answer in Answer.objects.filter(
+                    applicant__in=[applicant.id for applicant in applicants],
+                    question__in=[question.id for question in self.questions],
+                ).values_list("applicant_id", "question_id", "answer")
+            }
+            yield applicants, answers
+
+    def rows(self):
+        """
+        Yields the header row and then one row per applicant.
+        """
+        yield self.headers()
+        for applicants, answers in self.chunks():
+            for applicant in applicants:
+                yield self.row(applicant, answers)
+
+
+class FullApplicantExport(ApplicantExport):
+    """
+    An export for program managers that covers rejected applicants too,
+    shows every average, and also includes every reviewer's score and
+    comment and each applicant's allocations.
+    """
+
+    include_rejected = True
+
+    def headers(self):
+        headers = super().headers()
+        extra = ["Status", "Applied", "Score Count", "Score Std Dev", "Scores", "Allocations"]
+        return headers[:4] + extra + headers[4:]
+
+    def row(self, applicant, answers):
+        row = super().row(applicant, answers)
+        row[3] = applicant.score_average
+        extra = [
+            applicant.status,
+            applicant.applied.isoformat() if applicant.applied else "",
+            applicant.score_count,
+            applicant.score_stdev,
+            "; ".join(
+                "%s: %s%s" % (score.user, score.score, " (%s)" % score.comment if score.comment else "")
+                for score in self.scores.get(applicant.id, [])
+            ),
+            "; ".join(
+                "%s: %s" % (allocation.resource, allocation.amount)
+                for allocation in self.allocations.get(applicant.id, [])
+            ),
+        ]
+        return row[:4] + extra + row[4:]
+
+    def chunks(self):
+        for applicants, answers in super().chunks():
+            applicant_ids = [applicant.id for applicant in applicants]
+            self.scores = collections.defaultdict(list)
+            for score in Score.objects.filter(applicant__in=applicant_ids).select_related("user").order_by("id"):
+                self.scores[score.applicant_id].append(score)
+            self.allocations = collections.defaultdict(list)
+            for allocation in (
+                Allocation.objects.filter(applicant__in=applicant_ids).select_related("resource").order_by("id")
+            ):
+                self.allocations[allocation.applicant_id].append(allocation)
+            yield applicants, answers
@@ -4,6 +4,7 @@ from django import forms
 from django.utils.text import slugify
 
 from .models import Allocation, Program, Question, Resource, Score
+from .utils import normalise_email
 
 
 class QuestionForm(forms.ModelForm):
@@ -28,11 +29,40 @@ class BaseApplyForm(forms.Form):
 
     def clean_email(self):
         email = self.cleaned_data["email"]
-        if self.program.applicants.filter(email=email).exists():
+        if self.program.applicants.filter(email_normalised=normalise_email(email)).exists():
             raise forms.ValidationError("An application with that email address has already been submitted.")
         return email
 
 
+# Application form classes built by application_form_class(), keyed by
+# program id, along with the questions_version they were built from.
+application_form_classes = {}
+
+
+def application_form_class(program):
+    """
+    Returns a form class for applying to a program, with a field for each
+    of its questions. Classes are built once per process and kept until
+    the program's questions change.
+    """
+    cached = application_form_classes.get(program.id)
+    if cached and cached[0] == program.questions_version:
+        return cached[1]
+    questions = list(program.questions.order_by("order"))
+    fields = {"questions": questions}
+    for question in questions:
+        widget = forms.Textarea if question.type == "textarea" else None
+        fields["question-%s" % question.id] = {
+            "boolean": forms.BooleanField,
+            "text": forms.CharField,
+            "textarea": forms.CharField,
+            "integer": forms.IntegerField,
+        }[question.type](required=question.required, widget=widget, label=question.question)
+    form_class = type("ApplicationForm", (BaseApplyForm,), fields)
+    application_form_classes[program.id] = (program.questions_version, form_class)
+    return form_class
+
+
 class BulkLoadUploadForm(forms.Form):
     csv = forms.FileField(required=True)
 
@@ -73,6 +103,14 @@ class ResourceForm(forms.ModelForm):
         fields = ["name", "type", "amount"]
         model = Resource
 
+    def clean_amount(self):
+        amount = self.cleaned_data["amount"]
+        if self.instance.pk:
+            allocated = self.instance.amount_allocated()
+            if amount < allocated:
+                raise forms.ValidationError("%s has already been allocated; remove allocations first." % allocated)
+        return amount
+
 
 class AllocationForm(forms.ModelForm):
     class Meta:
@@ -82,7 +120,11 @@ class AllocationForm(forms.ModelForm):
     def __init__(self, applicant, *args, **kwargs):
         self.applicant = applicant
         super().__init__(*args, **kwargs)
-        self.fields["resource"].queryset = self.applicant.program.resources
+        self.fields["resource"].queryset = self.applicant.program.resources.with_allocation_totals()
+        self.fields["resource"].label_from_instance = lambda resource: "%s (%s left)" % (
+            resource,
+            resource.amount_remaining(),
+        )
 
     def clean_resource(self):
         resource = self.cleaned_data["resource"]
@@ -0,0 +1,302 @@
+from __future__ import annotations
+
+import datetime
+
+from django.db.transaction import atomic, on_commit
+
+from . import metrics
+from .caching import bump_version
+from .models import Answer, Applicant, Score
+from .utils import chunked, normalise_email
+
+
+class ApplicantImporter:
+    """
+    Imports applicants and their answers from CSV rows in bulk.
+
+    Every row is validated before anything is written. Existing applicants
+    and the program's questions are preloaded into dicts, and valid rows
+    are written in batches with bulk inserts, so the number of queries
+    depends on the number of batches rather than rows.
+
+    `target_map` maps "name", "email", "timestamp" and "q<question id>"
+    to column offsets, as produced by the bulk load mapping form.
+    """
+
+    kind = "applicants"
+
+    batch_size = 500
+
+    time_formats = [
+        "%Y-%m-%dT%H:%M:%SZ",
+        "%Y-%m-%dT%H:%M:%S",
+        "%m/%d/%Y %H:%M:%S",
+    ]
+
+    def __init__(self, program, target_map, user=None):
+        self.program = program
+        self.target_map = target_map
+        questions = {question.id: question for question in program.questions.all()}
+        self.question_columns = [
+            (questions[int(key.lstrip("q"))], offset)
+            for key, offset in target_map.items()
+            if key not in ["name", "email", "timestamp"]
+        ]
+        self.imported_emails = set()
+
+    def skip_rows(self, rows):
+        """
+        Catches up on rows imported by an earlier, interrupted run, so
+        duplicates of them are still caught.
+        """
+        for row in rows:
+            try:
+                self.imported_emails.add(normalise_email(row[self.target_map["email"]]))
+            except IndexError:
+                pass
+
+    def import_rows(self, rows):
+        """
+        Imports (index, row) pairs. Returns the number of rows imported and
+        a list of (index, row, exception) for the rows that failed.
+        """
+        errors = []
+        cleaned = []
+        for index, row in rows:
+            try:
+                cleaned.append((index, row, self.clean_row(row)))
+            except Exception as e:
+                errors.append((index, row, e))
+        successful = 0
+        for batch in chunked(cleaned, self.batch_size):
+            try:
+                self.write(batch)
+                successful += len(batch)
+            except Exception:
+                # Retry the batch a row at a time to pin the failure on a row.
+                for index, row, data in batch:
+                    try:
+                        self.write([(index, row, data)])
+                        successful += 1
+                    except Exception as e:
+                        errors.append((index, row, e))
+        errors.sort(key=lambda error: error[0])
+        return successful, errors
+
+    def clean_row(self, row):
+        """
+        Validates a row, returning a dict of the applicant's details and
+        answers, or raising an exception describing the problem.
+        """
+        email = row[self.target_map["email"]]
+        # Check for duplicate email within this import
+        normalised = normalise_email(email)
+        if not self.program.duplicate_emails and normalised in self.imported_emails:
+            raise ValueError(f"Duplicate email '{normalised}' - this email already appeared earlier in the CSV")
+        self.imported_emails.add(normalised)
+        name = row[self.target_map["name"]]
+        if not name.strip():
+            raise ValueError("Name is blank")
+        if not email.strip():
+            raise ValueError("Email is blank")
+        applied = None
+        if "timestamp" in self.target_map:
+            for time_format in self.time_formats:
+                try:
+                    applied = datetime.datetime.strptime(row[self.target_map["timestamp"]], time_format)
+                except ValueError:
+                    pass
+        answers = {}
+        for question, offset in self.question_columns:
+            answers[question.id] = self.clean_answer(question, row[offset])
+        return {"name": name, "email": email, "applied": applied, "answers": answers}
+
+    def clean_answer(self, question, raw_answer):
+        if question.type == "boolean":
+            return str(not any((raw_answer.lower().strip() == no_word) for no_word in ("no", "false", "off", "", "0")))
+        elif question.type == "integer":
+            if not raw_answer.strip():
+                return ""
+            try:
+                return str(int(raw_answer.strip()))
+            except ValueError:
+                raise ValueError("Invalid integer value for question %s: %s" % (question.question, raw_answer))
+        return raw_answer or ""
+
+    @atomic
+    def write(self, batch):
+        """
+        Creates or updates the applicants in a batch of cleaned rows, then
+        upserts their answers.
+        """
+        existing = {}
+        if not self.program.duplicate_emails:
+            emails = [normalise_email(data["email"]) for _, _, data in batch]
+            for applicant in self.program.applicants.filter(email_normalised__in=emails).order_by("pk"):
+                existing.setdefault(applicant.email_normalised, applicant)
+        new_applicants = []
+        updated_applicants = []
+        applicants = []
+        for _, _, data in batch:
+            applicant = existing.get(normalise_email(data["email"]))
+            if applicant:
+                applicant.name = data["name"]
+                updated_applicants.append(applicant)
+            else:
+                applicant = Applicant(program=self.program, name=data["name"], email=data["email"])
+                # bulk_create skips save(), which normally does this.
+                applicant.set_email_fields(self.program)
+                new_applicants.append(applicant)
+            if data["applied"]:
+                applicant.applied = data["applied"]
+            applicants.append(applicant)
+        Applicant.objects.bulk_create(new_applicants)
+        Applicant.objects.bulk_update(updated_applicants, ["name", "applied"])
+        answers = [
+            Answer(applicant=applicant, question_id=question_id, answer=answer)
+            for applicant, (_, _, data) in zip(applicants, batch)
+            for question_id, answer in data["answers"].items()
+        ]
+        # bulk_create skips save(), so fill in the typed values here.
+        for answer in answers:
+            answer.set_typed_values()
+        Answer.objects.bulk_create(
+            answers,
+            update_conflicts=True,
+            unique_fields=["applicant", "question"],
+            update_fields=["answer", "answer_int", "answer_bool"],
+        )
+        # Bulk writes don't send signals, so invalidate cached data here.
+        for question, _ in self.question_columns:
+            if question.type == "integer":
+                bump_version(question.answers_version(question.id))
+        self.program.progress_changed()
+
+
+class ScoreImporter:
+    """
+    Imports one user's scores and comments from CSV rows in bulk.
+
+    Emails are matched to the program's applicants with one query per
+    chunk of rows, and scores are upserted in batches, with the applicants'
+    score summaries then recalculated together, so the number of queries
+    doesn't grow with the number of rows.
+
+    `target_map` maps "email", "score" and "comment" to column offsets.
+    """
+
+    kind = "scores"
+
+    batch_size = 500
+
+    def __init__(self, program, target_map, user=None):
+        self.program = program
+        self.target_map = target_map
+        self.user = user
+
+    def skip_rows(self, rows):
+        pass
+
+    def import_rows(self, rows):
+        """
+        Imports (index, row) pairs. Returns the number of rows imported and
+        a list of (index, row, exception) for the rows that failed.
+        """
+        errors = []
+        cleaned = []
+        for index, row in rows:
+            try:
+                cleaned.append((index, row, self.clean_row(row)))
+            except Exception as e:
+                errors.append((index, row, e))
+        applicant_ids = {}
+        for applicant_id, email in self.program.applicants.filter(
+            email_normalised__in=[data["email"] for _, _, data in cleaned]
+        ).values_list("id", "email_normalised"):
+            applicant_ids.setdefault(email, []).append(applicant_id)
+        matched = []
+        for index, row, data in cleaned:
+            ids = applicant_ids.get(data["email"], [])
+            if len(ids) == 1:
+                data["applicant_id"] = ids[0]
+                matched.append((index, row, data))
+            elif ids:
+                errors.append((index, row, ValueError("More than one applicant has the email '%s'" % data["email"])))
+            else:
+                errors.append((index, row, ValueError("No applicant has the email '%s'" % data["email"])))
+        successful = 0
+        for batch in chunked(matched, self.batch_size):
+            try:
+                self.write(batch)
+                successful += len(batch)
+            except Exception:
+                # Retry the batch a row at a time to pin the failure on a row.
+                for index, row, data in batch:
+                    try:
+                        self.write([(index, row, data)])
+                        successful += 1
+                    except Exception as e:
+                        errors.append((index, row, e))
+        errors.sort(key=lambda error: error[0])
+        return successful, errors
+
+    def clean_row(self, row):
+        """
+        Validates a row, returning a dict of the normalised email, score and
+        comment, or raising an exception describing the problem.
+        """
+        target_map = self.target_map
+        score_value = row[target_map["score"]]
+        try:
+            score = float(score_value)
+        except ValueError:
+            if not score_value.strip():
+                raise ValueError("Score is blank")
+            else:
+                raise ValueError("Score is invalid: %s" % score_value)
+        # Checked here as the database would otherwise reject the batch.
+        Score._meta.get_field("score").run_validators(score)
+        data = {"email": normalise_email(row[target_map["email"]]), "score": score}
+        if "comment" in target_map:
+            data["comment"] = row[target_map["comment"]]
+        return data
+
+    @atomic
+    def write(self, batch):
+        """
+        Upserts the scores in a batch of cleaned rows, then updates the
+        applicants' score summaries.
+        """
+        applicant_ids = {data["applicant_id"] for _, _, data in batch}
+        scores = {
+            score.applicant_id: score
+            for score in Score.objects.filter(applicant__in=applicant_ids, user=self.user).only(
+                "id", "applicant", "user", "score", "comment", "score_history"
+            )
+        }
+        # Rows for the same applicant are applied in order, as separate
+        # saves would be, so each change still lands in the history.
+        for _, _, data in batch:
+            score = scores.get(data["applicant_id"])
+            if score is None:
+                score = scores[data["applicant_id"]] = Score(applicant_id=data["applicant_id"], user=self.user)
+            previous, score.score = score.score, data["score"]
+            score.record_history(previous)
+            if "comment" in data:
+                score.comment = data["comment"]
+        created = sum(1 for score in scores.values() if score.pk is None)
+        Score.objects.bulk_create(
+            scores.values(),
+            update_conflicts=True,
+            unique_fields=["applicant", "user"],
+            update_fields=["score", "comment", "score_history"],
+        )
+        # Bulk writes skip save() and signals, so do their work here.
+        Applicant.objects.filter(pk__in=applicant_ids).refresh_score_summaries()
+        self.program.progress_changed()
+        if created:
+            # Counted once committed, as a failed batch is retried row by row.
+            on_commit(lambda: metrics.store.inc("grorg_scores_submitted_total", amount=created))
+
+
+IMPORTERS = {importer.kind: importer for importer in [ApplicantImporter, ScoreImporter]}
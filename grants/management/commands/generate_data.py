@@ -0,0 +1,232 @@
+from __future__ import annotations
+
+import datetime
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from grants.caching import bump_version
+from grants.models import Allocation, Answer, Applicant, Program, Question, Resource, Score
+from users.models import User
+
+# fmt: off
+FIRST_NAMES = [
+    "Ada", "Alan", "Barbara", "Carlos", "Chen", "Dara", "Emeka", "Fatima", "Grace", "Hana",
+    "Ines", "Jamal", "Kai", "Lena", "Mateo", "Nadia", "Oren", "Priya", "Quinn", "Rosa",
+    "Sami", "Tomas", "Uma", "Vera", "Wei", "Yara", "Zane",
+]
+LAST_NAMES = [
+    "Adeyemi", "Baker", "Costa", "Dubois", "Eriksson", "Fernandes", "Garcia", "Hopper", "Ito",
+    "Jensen", "Kowalski", "Lovelace", "Mensah", "Nakamura", "Okafor", "Patel", "Rossi", "Silva",
+    "Tanaka", "Umar", "Varga", "Wong", "Yilmaz", "Zhang",
+]
+# fmt: on
+WORDS = (
+    "community conference python talk sprint mentor travel first time open source library "
+    "students local meetup organise learn share maintain contribute workshop data web teach"
+).split()
+COMMENTS = ["Strong case", "Local, lower priority", "First-time attendee", "Speaker", "Unclear answers"]
+
+RESOURCE_AMOUNTS = {
+    "money": (20000, [100, 250, 500, 750]),
+    "ticket": (100, [1]),
+    "place": (40, [1]),
+    "accomodation": (150, [2, 3, 4, 5]),
+}
+
+# A fixed start, so the same seed always produces the same data.
+APPLICATIONS_OPEN = datetime.datetime(2025, 1, 6, tzinfo=datetime.timezone.utc)
+
+
+class Command(BaseCommand):
+    help = "Generate programs full of synthetic applicants, answers, scores and allocations for load testing"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--programs", type=int, default=1, help="Number of programs (default: 1)")
+        parser.add_argument("--applicants", type=int, default=1000, help="Applicants per program (default: 1000)")
+        parser.add_argument(
+            "--questions", type=int, default=2, help="Questions of each question type per program (default: 2)"
+        )
+        parser.add_argument("--reviewers", type=int, default=10, help="Reviewers per program (default: 10)")
+        parser.add_argument(
+            "--coverage",
+            type=float,
+            default=0.6,
+            help="Fraction of applicants each reviewer scores (default: 0.6)",
+        )
+        parser.add_argument("--resources", type=int, default=3, help="Resources per program (default: 3)")
+        parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0)")
+        parser.add_argument("--prefix", default="generated", help="Prefix for program slugs (default: generated)")
+        parser.add_argument("--replace", action="store_true", help="Delete existing programs with the same slugs")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Rows per bulk insert (default: 1000)")
+
+    def handle(self, *args, **options):
+        self.batch_size = options["batch_size"]
+        slugs = ["%s-%s-%s" % (options["prefix"], options["seed"], index) for index in range(options["programs"])]
+        existing = Program.objects.filter(slug__in=slugs)
+        if existing.exists():
+            if not options["replace"]:
+                raise CommandError(
+                    "Programs already exist: %s (use --replace to overwrite them)"
+                    % ", ".join(sorted(existing.values_list("slug", flat=True)))
+                )
+            existing.delete()
+        for slug in slugs:
+            # Each program gets its own stream, so it doesn't depend on the others.
+            rng = random.Random("%s:%s" % (options["seed"], slug))
+            with transaction.atomic():
+                program = self.generate_program(rng, slug, options)
+            self.stdout.write(
+                "Created %s: %s applicants, %s answers, %s scores, %s allocations"
+                % (
+                    program.slug,
+                    program.applicants.count(),
+                    Answer.objects.filter(applicant__program=program).count(),
+                    Score.objects.filter(applicant__program=program).count(),
+                    Allocation.objects.filter(resource__program=program).count(),
+                )
+            )
+        self.stdout.write(self.style.SUCCESS(f"Done. Generated {len(slugs)} programs."))
+
+    def generate_program(self, rng, slug, options):
+        reviewers = self.generate_reviewers(slug, options["reviewers"])
+        program = Program.objects.create(
+            name=slug.replace("-", " ").title(),
+            slug=slug,
+            created_by=reviewers[0] if reviewers else None,
+            applications_open=APPLICATIONS_OPEN,
+            applications_close=APPLICATIONS_OPEN + datetime.timedelta(days=60),
+        )
+        program.users.add(*reviewers)
+        questions = self.generate_questions(program, options["questions"])
+        applicants = self.generate_applicants(rng, program, options["applicants"])
+        self.generate_answers(rng, applicants, questions)
+        self.generate_scores(rng, applicants, reviewers, options["coverage"])
+        self.generate_allocations(rng, program, applicants, options["resources"])
+        # Bulk inserts skip save() and signals, so do their work here.
+        program.applicants.refresh_score_summaries()
+        program.progress_changed()
+        for question in questions:
+            if question.type == "integer":
+                bump_version(Question.answers_version(question.id))
+        return program
+
+    def generate_reviewers(self, slug, count):
+        password = make_password(None)
+        reviewers = [
+            User(email="reviewer%s@%s.example.com" % (index, slug), name="Reviewer %s" % index, password=password)
+            for index in range(count)
+        ]
+        # Reviewers are kept when programs are replaced, so reuse them.
+        User.objects.bulk_create(reviewers, ignore_conflicts=True)
+        return list(User.objects.filter(email__in=[reviewer.email for reviewer in reviewers]).order_by("email"))
+
+    def generate_questions(self, program, per_type):
+        questions = [
+            Question(
+                program=program,
+                type=type,
+                question="%s question %s" % (label, index + 1),
+                required=index == 0,
+                filterable=type in ("boolean", "integer"),
+            )
+            for index in range(per_type)
+            for type, label in Question.TYPE_CHOICES
+        ]
+        for order, question in enumerate(questions):
+            question.order = order
+        return Question.objects.bulk_create(questions)
+
+    def generate_applicants(self, rng, program, count):
+        applicants = []
+        for index in range(count):
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            applicant = Applicant(
+                program=program,
+                name="%s %s" % (first, last),
+                email="%s.%s.%s@example.com" % (first.lower(), last.lower(), index),
+                applied=APPLICATIONS_OPEN + datetime.timedelta(minutes=rng.randrange(60 * 24 * 60)),
+                applied_to_speak=rng.random() < 0.2,
+                status=rng.choices(["pending", "accepted", "rejected"], [80, 12, 8])[0],
+            )
+            # A hidden quality, so reviewers broadly agree about applicants.
+            applicant.quality = rng.gauss(3.2, 0.8)
+            applicant.set_email_fields(program)
+            applicants.append(applicant)
+        return Applicant.objects.bulk_create(applicants, batch_size=self.batch_size)
+
+    def answer_text(self, rng, question):
+        if not question.required and rng.random() < 0.1:
+            return ""
+        if question.type == "boolean":
+            return str(rng.random() < 0.4)
+        if question.type == "integer":
+            return str(int(rng.lognormvariate(6, 1)))
+        length = rng.randint(3, 12) if question.type == "text" else rng.randint(30, 150)
+        return " ".join(rng.choice(WORDS) for _ in range(length)).capitalize()
+
+    def generate_answers(self, rng, applicants, questions):
+        answers = []
+        for applicant in applicants:
+            for question in questions:
+                answer = Answer(applicant=applicant, question=question, answer=self.answer_text(rng, question))
+                answer.set_typed_values()
+                answers.append(answer)
+            if len(answers) >= self.batch_size:
+                Answer.objects.bulk_create(answers)
+                answers = []
+        Answer.objects.bulk_create(answers)
+
+    def generate_scores(self, rng, applicants, reviewers, coverage):
+        scores = []
+        for reviewer in reviewers:
+            # Some reviewers are harsher than others.
+            bias = rng.gauss(0, 0.4)
+            for applicant in applicants:
+                if rng.random() >= coverage:
+                    continue
+                score = Score(applicant=applicant, user=reviewer)
+                if rng.random() < 0.05:
+                    # Saved with only a comment.
+                    score.comment = rng.choice(COMMENTS)
+                    scores.append(score)
+                    continue
+                for _ in range(rng.choices([1, 2, 3], [85, 12, 3])[0]):
+                    previous = score.score
+                    score.score = min(5, max(1, round(applicant.quality + bias + rng.gauss(0, 0.6))))
+                    score.record_history(previous)
+                if rng.random() < 0.2:
+                    score.comment = rng.choice(COMMENTS)
+                scores.append(score)
+            if len(scores) >= self.batch_size:
+                Score.objects.bulk_create(scores, batch_size=self.batch_size)
+                scores = []
+        Score.objects.bulk_create(scores, batch_size=self.batch_size)
+
+    def generate_allocations(self, rng, program, applicants, count):
+        types = [type for type, _ in Resource.TYPE_CHOICES]
+        resources = []
+        for index in range(count):
+            type = types[index % len(types)]
+            resources.append(
+                Resource(
+                    program=program,
+                    name="%s %s" % (dict(Resource.TYPE_CHOICES)[type], index + 1),
+                    type=type,
+                    amount=RESOURCE_AMOUNTS[type][0],
+                )
+            )
+        resources = Resource.objects.bulk_create(resources)
+        accepted = [applicant for applicant in applicants if applicant.status == "accepted"]
+        allocations = []
+        for resource in resources:
+            remaining = resource.amount
+            for applicant in rng.sample(accepted, k=len(accepted)):
+                amount = rng.choice(RESOURCE_AMOUNTS[resource.type][1])
+                if amount > remaining:
+                    break
+                allocations.append(Allocation(applicant=applicant, resource=resource, amount=amount))
+                remaining -= amount
+        Allocation.objects.bulk_create(allocations, batch_size=self.batch_size)
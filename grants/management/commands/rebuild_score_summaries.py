@@ -0,0 +1,23 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand, CommandError
+
+from grants.models import Applicant, Program
+
+
+class Command(BaseCommand):
+    help = "Recalculate applicants' score summaries from their scores"
+
+    def add_arguments(self, parser):
+        parser.add_argument("program_slugs", nargs="*", help="Only rebuild these programs (default: all)")
+
+    def handle(self, *args, **options):
+        applicants = Applicant.objects.all()
+        if options["program_slugs"]:
+            programs = list(Program.objects.filter(slug__in=options["program_slugs"]))
+            missing = set(options["program_slugs"]) - {program.slug for program in programs}
+            if missing:
+                raise CommandError("Unknown program: %s" % ", ".join(sorted(missing)))
+            applicants = applicants.filter(program__in=programs)
+        updated = applicants.refresh_score_summaries()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt score summaries for {updated} applicants."))
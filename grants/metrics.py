@@ -0,0 +1,215 @@
+"""
+Metrics in the Prometheus text format, served at /metrics/.
+
+Metrics recorded in a process (request latencies, query counts, task
+durations, scores submitted) are kept in memory and written every second
+or so, from a background thread, to a file of their own in METRICS_DIR,
+and the endpoint adds up every process's file, so the numbers cover all
+of gunicorn's workers and the django-q cluster. Without METRICS_DIR
+nothing is recorded.
+
+Metrics read from the database (queue depth, stored task results, import
+and export progress) are gathered when scraped. Scores per minute come
+from rate(grorg_scores_submitted_total) rather than counting every score.
+"""
+
+from __future__ import annotations
+
+import atexit
+import collections
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import Count, Q, Sum
+from django_q.models import OrmQ, Task
+
+from .models import ExportJob, UploadedCSV
+
+# Name -> (type, help) of every metric.
+METRICS = {
+    "grorg_requests_total": ("counter", "Requests handled, by view, method and status"),
+    "grorg_request_duration_seconds": ("histogram", "Time taken to handle requests, by view"),
+    "grorg_db_queries_total": ("counter", "Database queries run while handling requests, by view"),
+    "grorg_scores_submitted_total": ("counter", "Scores saved or imported for the first time"),
+    "grorg_tasks_total": ("counter", "django-q tasks finished, by function and result"),
+    "grorg_task_duration_seconds": ("histogram", "Time taken by django-q tasks, by function"),
+    "grorg_queue_depth": ("gauge", "Tasks in the django-q ORM broker queue, by state"),
+    "grorg_stored_tasks": ("gauge", "Task results stored by django-q, by function and result"),
+    "grorg_imports": ("gauge", "Uploaded CSV imports, by kind and status"),
+    "grorg_import_rows": ("gauge", "CSV rows imported by stored uploads, by kind and outcome"),
+    "grorg_exports": ("gauge", "Full applicant exports, by status"),
+    "grorg_export_rows": ("gauge", "Rows written by stored full applicant exports"),
+}
+
+REQUEST_BUCKETS = [0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+TASK_BUCKETS = [0.1, 0.5, 1, 5, 15, 30, 60, 90]
+
+
+class MetricsStore:
+    """
+    A process's own metric values, saved to <directory>/<host>-<pid>.json
+    every `interval` seconds by a background thread when they've changed,
+    and when the process exits, so recording a value never waits on the
+    disk. The host keeps processes in different containers sharing the
+    directory apart.
+    """
+
+    def __init__(self, directory, interval=1.0):
+        self.directory = directory
+        self.interval = interval
+        self.lock = threading.Lock()
+        # Held while writing, so an older snapshot never replaces a newer one.
+        self.flush_lock = threading.Lock()
+        # (name, sorted label items) -> value
+        self.values = collections.defaultdict(float)
+        self.dirty = False
+        self.thread = None
+        if directory:
+            atexit.register(self.flush)
+            os.register_at_fork(after_in_child=self.forked)
+
+    def inc(self, name, labels=None, amount=1):
+        if not self.directory:
+            return
+        with self.lock:
+            self.values[(name, tuple(sorted((labels or {}).items())))] += amount
+            self.dirty = True
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="metrics-flush", daemon=True)
+                self.thread.start()
+
+    def observe(self, name, labels, value, buckets):
+        """
+        Records a value in a histogram, as its cumulative bucket, sum and
+        count series.
+        """
+        for bound in buckets:
+            if value <= bound:
+                self.inc(name + "_bucket", {**labels, "le": str(bound)})
+        self.inc(name + "_bucket", {**labels, "le": "+Inf"})
+        self.inc(name + "_sum", labels, value)
+        self.inc(name + "_count", labels)
+
+    def forked(self):
+        # A forked child starts afresh: the parent's values are in the
+        # parent's file, and its thread doesn't come along.
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.values = collections.defaultdict(float)
+        self.dirty = False
+        self.thread = None
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            self.flush()
+
+    def flush(self):
+        with self.flush_lock:
+            with self.lock:
+                if not self.dirty:
+                    return
+                rows = [[name, dict(labels), value] for (name, labels), value in self.values.items()]
+                self.dirty = False
+            os.makedirs(self.directory, exist_ok=True)
+            # Written aside and moved into place, so readers never see half a file.
+            handle, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(handle, "w") as file:
+                json.dump(rows, file)
+            os.replace(temp_path, os.path.join(self.directory, "%s-%s.json" % (socket.gethostname(), os.getpid())))
+
+
+store = MetricsStore(settings.METRICS_DIR)
+
+
+def process_samples(directory):
+    """
+    Returns the values recorded by every process, added together.
+    """
+    totals = collections.defaultdict(float)
+    if not directory or not os.path.isdir(directory):
+        return totals
+    for filename in os.listdir(directory):
+        if not filename.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(directory, filename)) as file:
+                rows = json.load(file)
+        except (OSError, ValueError):
+            continue
+        for name, labels, value in rows:
+            totals[(name, tuple(sorted(labels.items())))] += value
+    return totals
+
+
+def database_samples():
+    """
+    Returns metric values read from the database.
+    """
+    samples = {}
+    queue = OrmQ.objects.aggregate(locked=Count("pk", filter=Q(lock__isnull=False)), total=Count("pk"))
+    samples[("grorg_queue_depth", (("state", "queued"),))] = queue["total"] - queue["locked"]
+    samples[("grorg_queue_depth", (("state", "locked"),))] = queue["locked"]
+    for row in Task.objects.values("func", "success").annotate(n=Count("pk")).order_by():
+        labels = (("func", row["func"]), ("result", "success" if row["success"] else "failure"))
+        samples[("grorg_stored_tasks", labels)] = row["n"]
+    rows = collections.defaultdict(float)
+    for row in (
+        UploadedCSV.objects.values("kind", "status")
+        .annotate(n=Count("pk"), successful=Sum("successful"), errors=Sum("error_count"))
+        .order_by()
+    ):
+        samples[("grorg_imports", (("kind", row["kind"]), ("status", row["status"])))] = row["n"]
+        rows[row["kind"], "successful"] += row["successful"] or 0
+        rows[row["kind"], "error"] += row["errors"] or 0
+    for (kind, outcome), value in rows.items():
+        samples[("grorg_import_rows", (("kind", kind), ("outcome", outcome)))] = value
+    for row in ExportJob.objects.values("status").annotate(n=Count("pk")).order_by():
+        samples[("grorg_exports", (("status", row["status"]),))] = row["n"]
+    samples[("grorg_export_rows", ())] = ExportJob.objects.aggregate(rows=Sum("rows_done"))["rows"] or 0
+    return samples
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_value(value):
+    return "%d" % value if float(value).is_integer() else repr(float(value))
+
+
+def render():
+    """
+    Returns every metric in the Prometheus text exposition format.
+    """
+    # This process's values are written now, rather than up to a second late.
+    store.flush()
+    samples = {**process_samples(settings.METRICS_DIR), **database_samples()}
+    by_metric = collections.defaultdict(list)
+    for (name, labels), value in samples.items():
+        family = name
+        for suffix in ("_bucket", "_sum", "_count"):
+            if name.endswith(suffix) and name[: -len(suffix)] in METRICS:
+                family = name[: -len(suffix)]
+        by_metric[family].append((name, labels, value))
+    lines = []
+    for family, (type, help) in METRICS.items():
+        lines.append("# HELP %s %s" % (family, help))
+        lines.append("# TYPE %s %s" % (family, type))
+        for name, labels, value in sorted(by_metric.get(family, []), key=sample_order):
+            label_text = ",".join('%s="%s"' % (key, escape(label)) for key, label in labels)
+            lines.append("%s%s %s" % (name, "{%s}" % label_text if label_text else "", format_value(value)))
+    return "\n".join(lines) + "\n"
+
+
+def sample_order(sample):
+    # Histogram buckets go in increasing order of their bound.
+    name, labels, _ = sample
+    bound = dict(labels).get("le")
+    other = tuple(item for item in labels if item[0] != "le")
+    return (other, name, float(bound) if bound else 0.0)
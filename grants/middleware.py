@@ -0,0 +1,315 @@
+"""
+Optional request instrumentation, turned on with REQUEST_TIMING,
+REQUEST_PROFILING and METRICS_DIR. None of it is in MIDDLEWARE unless
+turned on, so it costs nothing otherwise.
+"""
+
+from __future__ import annotations
+
+import collections
+import cProfile
+import functools
+import heapq
+import io
+import logging
+import marshal
+import random
+import sys
+import threading
+import time
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection
+
+from . import metrics
+from .models import RequestProfile
+
+logger = logging.getLogger(__name__)
+
+
+class QueryTimer:
+    """
+    A database execute wrapper that counts and times queries, keeping the
+    slowest few so they can be logged.
+    """
+
+    def __init__(self, keep):
+        self.keep = keep
+        self.count = 0
+        self.seconds = 0.0
+        self.slowest = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.count += 1
+            self.seconds += duration
+            # A min-heap of the slowest queries, the count breaking ties.
+            entry = (duration, self.count, sql)
+            if len(self.slowest) < self.keep:
+                heapq.heappush(self.slowest, entry)
+            elif self.keep:
+                heapq.heappushpop(self.slowest, entry)
+
+
+def view_name(request):
+    """
+    Returns the resolved view as "module.View", e.g. "program.ProgramApplicants".
+    """
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "unresolved"
+    view = match.func
+    while isinstance(view, functools.partial):
+        view = view.func
+    # Class-based views are named after the class, not as_view()'s function.
+    view = getattr(view, "view_class", view)
+    return "%s.%s" % (view.__module__.rsplit(".", 1)[-1], view.__qualname__)
+
+
+class RequestTimingMiddleware:
+    """
+    Records each request's query count, database time, template render
+    time and total time, and reports them in a Server-Timing header and a
+    log line on the "grants.middleware" logger. Requests slower than
+    REQUEST_TIMING_SLOW_MS also get their slowest queries logged.
+
+    Render time covers TemplateResponses (so every TemplateView), which
+    are rendered after the view returns; templates rendered inside a view
+    count as view time. Streamed bodies are produced after the response
+    leaves here, so aren't counted.
+
+    Goes first in MIDDLEWARE, so the total covers the other middleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_ms = settings.REQUEST_TIMING_SLOW_MS
+        self.slow_queries = settings.REQUEST_TIMING_SLOW_QUERIES
+
+    def __call__(self, request):
+        request.render_seconds = 0.0
+        timer = QueryTimer(self.slow_queries)
+        start = time.perf_counter()
+        with connection.execute_wrapper(timer):
+            response = self.get_response(request)
+        total_ms = (time.perf_counter() - start) * 1000
+        db_ms = timer.seconds * 1000
+        render_ms = request.render_seconds * 1000
+        response["Server-Timing"] = ", ".join(
+            [
+                'db;dur=%.1f;desc="%s queries"' % (db_ms, timer.count),
+                "render;dur=%.1f" % render_ms,
+                "total;dur=%.1f" % total_ms,
+            ]
+        )
+        name = view_name(request)
+        logger.info(
+            "view=%s method=%s status=%s queries=%s db_ms=%.1f render_ms=%.1f total_ms=%.1f",
+            name,
+            request.method,
+            response.status_code,
+            timer.count,
+            db_ms,
+            render_ms,
+            total_ms,
+            extra={
+                "view": name,
+                "path": request.path,
+                "method": request.method,
+                "status": response.status_code,
+                "queries": timer.count,
+                "db_ms": round(db_ms, 1),
+                "render_ms": round(render_ms, 1),
+                "total_ms": round(total_ms, 1),
+            },
+        )
+        if total_ms >= self.slow_ms and timer.slowest:
+            logger.warning(
+                "Slow request view=%s total_ms=%.1f, slowest queries:\n%s",
+                name,
+                total_ms,
+                "\n".join(
+                    "%.1fms %s" % (duration * 1000, sql[:1000])
+                    for duration, _, sql in sorted(timer.slowest, reverse=True)
+                ),
+            )
+        return response
+
+    def process_template_response(self, request, response):
+        # Called last, just before the response is rendered.
+        start = time.perf_counter()
+
+        def rendered(response):
+            request.render_seconds += time.perf_counter() - start
+
+        response.add_post_render_callback(rendered)
+        return response
+
+
+class MetricsMiddleware:
+    """
+    Records each request's duration and query count, by view, for the
+    metrics endpoint.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timer = QueryTimer(0)
+        start = time.perf_counter()
+        with connection.execute_wrapper(timer):
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+        labels = {"view": view_name(request)}
+        metrics.store.inc("grorg_requests_total", {**labels, "method": request.method, "status": response.status_code})
+        metrics.store.inc("grorg_db_queries_total", labels, timer.count)
+        metrics.store.observe("grorg_request_duration_seconds", labels, duration, metrics.REQUEST_BUCKETS)
+        return response
+
+
+def collapse_stack(frame):
+    """
+    Returns a frame's stack as one line of a collapsed stack file, outermost
+    call first, as read by flame graph tools.
+    """
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append("%s (%s:%s)" % (code.co_name, code.co_filename, code.co_firstlineno))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class StackSampler:
+    """
+    Samples the stacks of requests that have been running for longer than
+    `threshold` seconds, every `interval` seconds, from a background
+    thread. Requests quicker than the threshold are never sampled, so only
+    slow ones pay for it.
+    """
+
+    def __init__(self, threshold, interval):
+        self.threshold = threshold
+        self.interval = interval
+        self.lock = threading.Lock()
+        # Thread id -> (start time, Counter of collapsed stacks)
+        self.running = {}
+        self.thread = None
+
+    def track(self, thread_id):
+        """
+        Starts timing a request on a thread, returning the Counter its
+        samples are collected in.
+        """
+        samples = collections.Counter()
+        with self.lock:
+            self.running[thread_id] = (time.perf_counter(), samples)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="stack-sampler", daemon=True)
+                self.thread.start()
+        return samples
+
+    def untrack(self, thread_id):
+        with self.lock:
+            self.running.pop(thread_id, None)
+
+    def sample(self):
+        now = time.perf_counter()
+        with self.lock:
+            due = [
+                (thread_id, samples)
+                for thread_id, (start, samples) in self.running.items()
+                if now - start >= self.threshold
+            ]
+        if not due:
+            return
+        frames = sys._current_frames()
+        for thread_id, samples in due:
+            frame = frames.get(thread_id)
+            if frame is not None:
+                samples[collapse_stack(frame)] += 1
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            self.sample()
+
+
+class RequestProfilingMiddleware:
+    """
+    Profiles a sample of requests, and slow requests, and stores the
+    results as RequestProfiles for staff to download from the admin.
+
+    A REQUEST_PROFILING_SAMPLE_RATE fraction of requests run under cProfile,
+    and their stats are saved in pstats format. Any other request taking
+    longer than REQUEST_PROFILING_SLOW_MS has its stack sampled from then
+    on, and the samples are saved as collapsed stacks; set it to 0 to
+    turn this off.
+
+    Goes first in MIDDLEWARE, so the other middleware is profiled too.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = settings.REQUEST_PROFILING_SAMPLE_RATE
+        self.sampler = None
+        if settings.REQUEST_PROFILING_SLOW_MS:
+            self.sampler = StackSampler(
+                settings.REQUEST_PROFILING_SLOW_MS / 1000,
+                settings.REQUEST_PROFILING_INTERVAL_MS / 1000,
+            )
+
+    def __call__(self, request):
+        if self.sample_rate and random.random() < self.sample_rate:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # Another profiler is already running in this thread.
+                return self.get_response(request)
+            start = time.perf_counter()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+            duration = time.perf_counter() - start
+            profiler.create_stats()
+            # The format pstats.Stats loads from a file.
+            self.save(request, response, duration, "cprofile", marshal.dumps(profiler.stats))
+            return response
+        if self.sampler is None:
+            return self.get_response(request)
+        thread_id = threading.get_ident()
+        samples = self.sampler.track(thread_id)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            self.sampler.untrack(thread_id)
+        duration = time.perf_counter() - start
+        if samples:
+            folded = io.StringIO()
+            for stack, count in samples.most_common():
+                folded.write("%s %s\n" % (stack, count))
+            self.save(request, response, duration, "stacks", folded.getvalue().encode())
+        return response
+
+    def save(self, request, response, duration, kind, content):
+        user = getattr(request, "user", None)
+        profile = RequestProfile(
+            kind=kind,
+            method=request.method,
+            path=request.get_full_path()[:2000],
+            view=view_name(request),
+            status=response.status_code,
+            duration_ms=duration * 1000,
+            user=user if user is not None and user.is_authenticated else None,
+        )
+        profile.file.save("%s.%s" % (profile.view, kind), ContentFile(content))
+        logger.info("Saved %s profile of view=%s duration_ms=%.1f", kind, profile.view, profile.duration_ms)
@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("grants", "0019_exportjob"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="uploadedcsv",
+            name="checkpoint",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="uploadedcsv",
+            name="error_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="uploadedcsv",
+            name="errors",
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name="uploadedcsv",
+            name="kind",
+            field=models.CharField(
+                blank=True,
+                choices=[("applicants", "Applicants"), ("scores", "Scores")],
+                max_length=20,
+            ),
+        ),
+        migrations.AddField(
+            model_name="uploadedcsv",
+            name="program",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="uploaded_csvs",
+                to="grants.program",
+            ),
+        ),
+        migrations.AddField(
+            model_name="uploadedcsv",
+            name="rows_total",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="uploadedcsv",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("uploaded", "Uploaded"),
+                    ("queued", "Queued"),
+                    ("running", "Running"),
+                    ("complete", "Complete"),
+                    ("failed", "Failed"),
+                ],
+                default="uploaded",
+                max_length=20,
+            ),
+        ),
+        migrations.AddField(
+            model_name="uploadedcsv",
+            name="successful",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="uploadedcsv",
+            name="target_map",
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="uploadedcsv",
+            name="updated",
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name="uploadedcsv",
+            name="uploaded_by",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="uploaded_csvs",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+    ]
@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+from django.core.files.base import ContentFile
+from django.db import migrations, models
+
+
+def move_csv_text_to_files(apps, schema_editor):
+    UploadedCSV = apps.get_model("grants", "UploadedCSV")
+    for upload in UploadedCSV.objects.exclude(csv="").iterator():
+        upload.file.save("upload-%s.csv" % upload.pk, ContentFile(upload.csv.encode()), save=True)
+
+
+def move_files_to_csv_text(apps, schema_editor):
+    UploadedCSV = apps.get_model("grants", "UploadedCSV")
+    for upload in UploadedCSV.objects.exclude(file="").iterator():
+        with upload.file.open("rb") as handle:
+            upload.csv = handle.read().decode()
+        upload.save(update_fields=["csv"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("grants", "0020_uploadedcsv_import_progress"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="uploadedcsv",
+            name="file",
+            field=models.FileField(blank=True, upload_to="uploads/"),
+        ),
+        migrations.RunPython(move_csv_text_to_files, move_files_to_csv_text),
+        migrations.RemoveField(
+            model_name="uploadedcsv",
+            name="csv",
+        ),
+    ]
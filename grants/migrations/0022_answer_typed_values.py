@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def fill_typed_values(apps, schema_editor):
+    Answer = apps.get_model("grants", "Answer")
+    Answer.objects.filter(answer="True").update(answer_bool=True)
+    Answer.objects.filter(answer="False").update(answer_bool=False)
+    batch = []
+    for pk, answer in Answer.objects.values_list("pk", "answer").iterator(chunk_size=BATCH_SIZE):
+        try:
+            value = int(answer)
+        except ValueError:
+            continue
+        if -(2**63) <= value < 2**63:
+            batch.append(Answer(pk=pk, answer_int=value))
+        if len(batch) >= BATCH_SIZE:
+            Answer.objects.bulk_update(batch, ["answer_int"])
+            batch = []
+    Answer.objects.bulk_update(batch, ["answer_int"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("grants", "0021_uploadedcsv_file"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="answer",
+            name="answer_bool",
+            field=models.BooleanField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="answer",
+            name="answer_int",
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(fill_typed_values, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="answer",
+            index=models.Index(
+                fields=["question", "answer_int"],
+                name="grants_answ_questio_4043e7_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="answer",
+            index=models.Index(
+                fields=["question", "answer_bool"],
+                name="grants_answ_questio_f8be36_idx",
+            ),
+        ),
+    ]
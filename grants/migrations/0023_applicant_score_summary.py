@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def fill_score_summaries(apps, schema_editor):
+    Applicant = apps.get_model("grants", "Applicant")
+    Score = apps.get_model("grants", "Score")
+    scores = Score.objects.filter(applicant=models.OuterRef("pk")).order_by().values("applicant")
+
+    def total(aggregate, default):
+        return Coalesce(models.Subquery(scores.annotate(total=aggregate).values("total")), default)
+
+    Applicant.objects.update(
+        score_count=total(models.Count("pk"), 0),
+        score_value_count=total(models.Count("score"), 0),
+        score_sum=total(models.Sum("score"), 0.0),
+        score_sum_squares=total(models.Sum(models.F("score") * models.F("score")), 0.0),
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("grants", "0022_answer_typed_values"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="applicant",
+            name="score_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="applicant",
+            name="score_sum",
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name="applicant",
+            name="score_sum_squares",
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name="applicant",
+            name="score_value_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_score_summaries, migrations.RunPython.noop),
+    ]
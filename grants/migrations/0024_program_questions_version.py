@@ -0,0 +1,17 @@
+from __future__ import annotations
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("grants", "0023_applicant_score_summary"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="program",
+            name="questions_version",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
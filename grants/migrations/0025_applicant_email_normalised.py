@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+from django.db import migrations, models
+from django.db.models.functions import Lower, Trim
+
+
+def fill_email_fields(apps, schema_editor):
+    Applicant = apps.get_model("grants", "Applicant")
+    Applicant.objects.update(email_normalised=Lower(Trim("email")))
+    # Only the earliest applicant with each email is held to the constraint,
+    # so programs that already have duplicates still migrate.
+    applicants = Applicant.objects.filter(program__duplicate_emails=False).order_by()
+    first = applicants.values("program", "email_normalised").annotate(first=models.Min("pk")).values("first")
+    applicants.filter(pk__in=first).update(email_unique=True)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("grants", "0024_program_questions_version"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="applicant",
+            name="email_normalised",
+            field=models.EmailField(default="", editable=False, max_length=254),
+        ),
+        migrations.AddField(
+            model_name="applicant",
+            name="email_unique",
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(fill_email_fields, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="applicant",
+            index=models.Index(
+                fields=["program", "email_normalised"],
+                name="grants_appl_program_a8ed2a_idx",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="applicant",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("email_unique", True)),
+                fields=("program", "email_normalised"),
+                name="unique_applicant_email_per_program",
+            ),
+        ),
+    ]
@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("grants", "0025_applicant_email_normalised"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RequestProfile",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created", models.DateTimeField(auto_now_add=True)),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("cprofile", "cProfile stats"),
+                            ("stacks", "Sampled stacks"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("method", models.CharField(max_length=10)),
+                ("path", models.TextField()),
+                ("view", models.CharField(max_length=255)),
+                ("status", models.PositiveIntegerField()),
+                ("duration_ms", models.FloatField()),
+                ("file", models.FileField(upload_to="profiles/")),
+                (
+                    "user",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="request_profiles",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+    ]
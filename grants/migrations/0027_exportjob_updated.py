@@ -0,0 +1,17 @@
+from __future__ import annotations
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("grants", "0026_requestprofile"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="exportjob",
+            name="updated",
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
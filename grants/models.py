@@ -1,9 +1,33 @@
 from __future__ import annotations
 
+import csv
+import datetime
+import io
+import random
+
+from django.conf import settings
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Coalesce, Greatest, Sqrt
+from django.utils import timezone
 from urlman import Urls
 
+from .caching import bump_version, get_or_set_versioned
+from .utils import normalise_email
+
+
+class ProgramQuerySet(models.QuerySet):
+    def with_membership(self, user):
+        """
+        Annotates whether the given user is a member of each program, so
+        checking access doesn't take a query of its own.
+        """
+        return self.annotate(
+            user_is_member=models.Exists(
+                Program.users.through.objects.filter(program=models.OuterRef("pk"), user=user.pk)
+            )
+        )
+
 
 class Program(models.Model):
     """
@@ -32,10 +56,34 @@ class Program(models.Model):
         related_name="created_programs",
     )
     users = models.ManyToManyField("users.User", blank=True)
+    # Bumped whenever a question is saved or deleted, so things built from
+    # the questions (like the application form) know to rebuild.
+    questions_version = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = ProgramQuerySet.as_manager()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.saved_duplicate_emails = self.__dict__.get("duplicate_emails")
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        # questions_version only changes through F() updates; don't write a
+        # stale copy of it back when saving the rest of the program.
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != "questions_version"
+            ]
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+            if self.duplicate_emails != self.saved_duplicate_emails:
+                self.sync_email_uniqueness()
+        self.saved_duplicate_emails = self.duplicate_emails
+
     class urls(Urls):
         view = "/{self.slug}/"
         edit = "{view}edit/"
@@ -53,6 +101,8 @@ class Program(models.Model):
         apply = "{view}apply/"
         apply_success = "{view}apply/success/"
         score_random = "{view}applicants/random-unscored/"
+        exports = "{view}applicants/exports/"
+        imports = "{view}applicants/imports/"
 
     def user_allowed(self, user):
         return self.users.filter(pk=user.pk).exists()
@@ -67,7 +117,66 @@ class Program(models.Model):
         Excludes the user's own application (identified by email — the only
         reliable link since Applicant has no FK to User).
         """
-        return self.applicants.exclude(email=user.email)
+        return self.applicants.exclude(email_normalised=normalise_email(user.email or ""))
+
+    def sync_email_uniqueness(self):
+        """
+        Sets which applicants the unique email constraint covers to match
+        duplicate_emails. Turning duplicates off only covers the earliest
+        applicant with each email, so ones that already share it stay.
+        """
+        applicants = self.applicants.order_by()
+        if self.duplicate_emails:
+            applicants.update(email_unique=False)
+        else:
+            first = applicants.values("email_normalised").annotate(first=models.Min("pk")).values("first")
+            applicants.exclude(pk__in=first).update(email_unique=False)
+            applicants.filter(pk__in=first).update(email_unique=True)
+
+    @staticmethod
+    def progress_version(program_id):
+        """
+        Returns the name of the cache version for a program's scoring
+        progress, which changes along with its applicants and scores.
+        """
+        return "program-progress:%s" % program_id
+
+    def progress_changed(self):
+        bump_version(self.progress_version(self.id))
+
+    def scoring_progress(self, user):
+        """
+        Returns the number of applicants under review by the user, how many
+        of them the user has scored, and how many anyone has scored. Cached
+        until the program's applicants or scores change.
+        """
+
+        def count():
+            return (
+                self.applicants_visible_to(user)
+                .exclude(status="rejected")
+                .aggregate(
+                    num_applicants=models.Count("pk"),
+                    num_scored=models.Count(
+                        "pk", filter=models.Exists(Score.objects.filter(applicant=models.OuterRef("pk"), user=user))
+                    ),
+                    num_scored_by_anyone=models.Count("pk", filter=models.Q(score_count__gt=0)),
+                )
+            )
+
+        return get_or_set_versioned(self.progress_version(self.id), "user-%s" % user.pk, count)
+
+
+class ResourceQuerySet(models.QuerySet):
+    def with_allocation_totals(self):
+        """
+        Annotates each resource with the amount allocated so far and the
+        amount remaining, summed in the database.
+        """
+        return self.annotate(
+            allocated=Coalesce(models.Sum("allocations__amount"), 0),
+            remaining=models.F("amount") - models.F("allocated"),
+        )
 
 
 class Resource(models.Model):
@@ -88,6 +197,8 @@ class Resource(models.Model):
     type = models.CharField(max_length=50, choices=TYPE_CHOICES)
     amount = models.PositiveIntegerField()
 
+    objects = ResourceQuerySet.as_manager()
+
     class urls(Urls):
         edit = "{self.program.urls.resources}{self.id}/"
 
@@ -103,9 +214,13 @@ class Resource(models.Model):
         }.get(self.type, self.type)
 
     def amount_allocated(self):
-        return sum(a.amount for a in self.allocations.all())
+        if hasattr(self, "allocated"):
+            return self.allocated
+        return self.allocations.aggregate(total=Coalesce(models.Sum("amount"), 0))["total"]
 
     def amount_remaining(self):
+        if hasattr(self, "remaining"):
+            return self.remaining
         return self.amount - self.amount_allocated()
 
 
@@ -143,31 +258,47 @@ class Question(models.Model):
     def can_filter(self):
         return self.filterable and self.type in ("boolean", "integer")
 
+    @staticmethod
+    def answers_version(question_id):
+        """
+        Returns the name of the cache version for values derived from a
+        question's answers.
+        """
+        return "question-answers:%s" % question_id
+
     def integer_answer_values(self):
-        values = []
-        for answer in self.answers.all():
-            try:
-                values.append(int(answer.answer))
-            except (TypeError, ValueError):
-                continue
-        return values
+        """
+        Returns the query for this question's answers that parse as integers.
+        """
+        return self.answers.filter(answer_int__isnull=False)
 
     def integer_filter_ranges(self):
         """
         Returns inclusive (low, high) buckets for filtering integer answers,
         derived from quartiles of the actual data. Returns [] if there is
         no usable data.
+
+        The buckets are cached until the question's answers change.
         """
         if self.type != "integer":
             return []
-        values = sorted(self.integer_answer_values())
-        if not values:
+        return get_or_set_versioned(
+            self.answers_version(self.id),
+            "integer-filter-ranges",
+            self.compute_integer_filter_ranges,
+        )
+
+    def compute_integer_filter_ranges(self):
+        answers = self.integer_answer_values()
+        stats = answers.aggregate(n=models.Count("id"), mn=models.Min("answer_int"), mx=models.Max("answer_int"))
+        n, mn, mx = stats["n"], stats["mn"], stats["mx"]
+        if not n:
             return []
-        mn, mx = values[0], values[-1]
         if mn == mx:
             return [(mn, mn)]
-        n = len(values)
-        # Quartile breakpoints (inclusive of min and max)
+        # Quartile breakpoints (inclusive of min and max), each fetched by
+        # offset from the (question, answer_int) index.
+        values = answers.order_by("answer_int").values_list("answer_int", flat=True)
         breakpoints = sorted({mn, values[n // 4], values[n // 2], values[(3 * n) // 4], mx})
         ranges = []
         for i, low in enumerate(breakpoints[:-1]):
@@ -182,6 +313,90 @@ class Question(models.Model):
         return ranges
 
 
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+class ApplicantQuerySet(models.QuerySet):
+    def with_score_stats(self, user):
+        """
+        Annotates each applicant with its average score and standard
+        deviation, read from its score summary columns, plus whether the
+        given user has scored it yet.
+        """
+        scored = models.F("score_value_count")
+        # Sample variance from sums, clamped as rounding can take it below zero.
+        variance = models.ExpressionWrapper(
+            (models.F("score_sum_squares") - models.F("score_sum") * models.F("score_sum") / scored) / (scored - 1),
+            output_field=models.FloatField(),
+        )
+        return self.annotate(
+            score_average=models.Case(
+                models.When(score_value_count__gt=0, then=models.F("score_sum") / scored),
+                default=None,
+                output_field=models.FloatField(),
+            ),
+            score_stdev=models.Case(
+                models.When(score_value_count__gt=1, then=Sqrt(Greatest(variance, models.Value(0.0)))),
+                default=models.Value(0.0),
+                output_field=models.FloatField(),
+            ),
+            has_scored=models.Exists(Score.objects.filter(applicant=models.OuterRef("pk"), user=user)),
+        )
+
+    def refresh_score_summaries(self):
+        """
+        Recalculates the score summary columns from the scores themselves,
+        in one UPDATE. Returns the number of applicants updated.
+        """
+        scores = Score.objects.filter(applicant=models.OuterRef("pk")).order_by().values("applicant")
+
+        def total(aggregate, default):
+            return Coalesce(models.Subquery(scores.annotate(total=aggregate).values("total")), default)
+
+        return self.update(
+            score_count=total(models.Count("pk"), 0),
+            score_value_count=total(models.Count("score"), 0),
+            score_sum=total(models.Sum("score"), 0.0),
+            score_sum_squares=total(models.Sum(models.F("score") * models.F("score")), 0.0),
+        )
+
+    def with_sort_keys(self):
+        """
+        Annotates the keys applicant lists are sorted and paginated by.
+        Applicants the annotating user hasn't scored yet get a score_sort of
+        -1, as their scores are hidden, and undated applicants sort as if
+        they applied at the epoch. Requires with_score_stats().
+        """
+        return self.annotate(
+            applied_sort=Coalesce("applied", models.Value(EPOCH)),
+            score_sort=models.Case(
+                models.When(has_scored=True, then=Coalesce("score_average", models.Value(-1.0))),
+                default=models.Value(-1.0),
+            ),
+        )
+
+    def random(self):
+        """
+        Returns a random applicant from the queryset, or None if it's empty.
+        Rather than sorting every row with ORDER BY RANDOM(), it counts the
+        rows and fetches the one at a random offset in id order, so every
+        applicant is equally likely to be picked.
+        """
+        count = self.count()
+        if not count:
+            return None
+        offset = random.randrange(count)
+        # Rows deleted since the count can leave the offset past the end.
+        return self.order_by("pk")[offset : offset + 1].first()
+
+    def order_by_score(self):
+        """
+        Orders by average score, highest first, with unscored applicants
+        last. Requires with_score_stats().
+        """
+        return self.with_sort_keys().order_by("-score_sort", "-applied_sort", "-id")
+
+
 class Applicant(models.Model):
     """
     Someone applying for a grant.
@@ -196,12 +411,42 @@ class Applicant(models.Model):
     program = models.ForeignKey(Program, related_name="applicants", on_delete=models.CASCADE)
     name = models.TextField()
     email = models.EmailField()
+    # The email as matched for duplicates, and whether it has to be unique
+    # within the program (not if the program allows duplicate emails).
+    # Both are kept up to date by save() and Program.sync_email_uniqueness().
+    email_normalised = models.EmailField(default="", editable=False)
+    email_unique = models.BooleanField(default=False, editable=False)
 
     applied = models.DateTimeField(blank=True, null=True)
     applied_to_speak = models.BooleanField(default=False)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
     rejection_reason = models.TextField(blank=True, default="")
 
+    # A summary of the applicant's scores, kept up to date as scores are
+    # saved and deleted so averages don't need the scores themselves.
+    # score_count counts every score, the rest only those with a value.
+    score_count = models.PositiveIntegerField(default=0)
+    score_value_count = models.PositiveIntegerField(default=0)
+    score_sum = models.FloatField(default=0)
+    score_sum_squares = models.FloatField(default=0)
+
+    # Only ever changed with F() updates, so never saved from an instance.
+    summary_fields = ["score_count", "score_value_count", "score_sum", "score_sum_squares"]
+
+    objects = ApplicantQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["program", "email_normalised"]),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["program", "email_normalised"],
+                condition=models.Q(email_unique=True),
+                name="unique_applicant_email_per_program",
+            ),
+        ]
+
     class urls(Urls):
         view = "{self.program.urls.applicants}{self.id}/"
         allocations = "{view}allocations/"
@@ -209,25 +454,38 @@ class Applicant(models.Model):
     def __str__(self):
         return self.name
 
+    def set_email_fields(self, program=None):
+        """
+        Fills in email_normalised, and for new applicants email_unique.
+        """
+        self.email_normalised = normalise_email(self.email)
+        if self._state.adding:
+            self.email_unique = not (program or self.program).duplicate_emails
+
+    def save(self, *args, **kwargs):
+        self.set_email_fields()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None:
+            if not self._state.adding:
+                kwargs["update_fields"] = [
+                    field.name
+                    for field in self._meta.concrete_fields
+                    if not field.primary_key and field.name not in self.summary_fields
+                ]
+        elif "email" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "email_normalised"}
+        super().save(*args, **kwargs)
+
     def average_score(self):
-        scores = [s.score for s in self.scores.all() if s.score]
-        if not scores:
+        if not self.score_value_count:
             return None
-        else:
-            return sum(scores) / float(len(scores))
+        return self.score_sum / self.score_value_count
 
     def variance(self):
-        data = [s.score for s in self.scores.all() if s.score]
-        n = len(data)
-        if n == 0:
-            return 0
-        c = sum(data) / float(len(data))
+        n = self.score_value_count
         if n < 2:
             return 0
-        ss = sum((x - c) ** 2 for x in data)
-        ss -= sum((x - c) for x in data) ** 2 / len(data)
-        assert not ss < 0, "negative sum of square deviations: %f" % ss
-        return ss / (n - 1)
+        return max((self.score_sum_squares - self.score_sum**2 / n) / (n - 1), 0)
 
     def stdev(self):
         return self.variance() ** 0.5
@@ -256,11 +514,43 @@ class Answer(models.Model):
     applicant = models.ForeignKey(Applicant, related_name="answers", on_delete=models.CASCADE)
     question = models.ForeignKey(Question, related_name="answers", on_delete=models.CASCADE)
     answer = models.TextField()
+    # Typed copies of the answer for filtering, kept in step by save().
+    answer_int = models.BigIntegerField(blank=True, null=True)
+    answer_bool = models.BooleanField(blank=True, null=True)
 
     class Meta:
         unique_together = [
             ("applicant", "question"),
         ]
+        indexes = [
+            models.Index(fields=["question", "answer_int"]),
+            models.Index(fields=["question", "answer_bool"]),
+        ]
+
+    @staticmethod
+    def typed_values(answer):
+        """
+        Returns the (integer, boolean) values of an answer's text, each None
+        if the text isn't one.
+        """
+        try:
+            answer_int = int(answer)
+        except (TypeError, ValueError):
+            answer_int = None
+        if answer_int is not None and not -(2**63) <= answer_int < 2**63:
+            answer_int = None
+        answer_bool = {"True": True, "False": False}.get(str(answer))
+        return answer_int, answer_bool
+
+    def set_typed_values(self):
+        self.answer_int, self.answer_bool = self.typed_values(self.answer)
+
+    def save(self, *args, **kwargs):
+        self.set_typed_values()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "answer" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "answer_int", "answer_bool"}
+        super().save(*args, **kwargs)
 
 
 class Score(models.Model):
@@ -294,14 +584,255 @@ class Score(models.Model):
             ),
         ]
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # The score as last loaded or saved, to work out summary changes.
+        self.saved_score = self.__dict__.get("score", models.DEFERRED)
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        update_fields = kwargs.get("update_fields")
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+            if adding:
+                self.change_summary(count=1, add=self.score)
+            elif update_fields is None or "score" in update_fields:
+                self.change_summary(remove=self.saved_score, add=self.score)
+        self.saved_score = self.score
+
+    def change_summary(self, count=0, remove=None, add=None):
+        """
+        Applies a change to this score to the applicant's summary columns,
+        in the database and on the applicant if it's loaded.
+        """
+        if remove is models.DEFERRED:
+            Applicant.objects.filter(pk=self.applicant_id).refresh_score_summaries()
+            return
+        changes = {"score_count": count, "score_value_count": 0, "score_sum": 0.0, "score_sum_squares": 0.0}
+        for value, sign in [(remove, -1), (add, 1)]:
+            if value is not None:
+                changes["score_value_count"] += sign
+                changes["score_sum"] += sign * value
+                changes["score_sum_squares"] += sign * value * value
+        changes = {name: change for name, change in changes.items() if change}
+        if not changes:
+            return
+        Applicant.objects.filter(pk=self.applicant_id).update(
+            **{name: models.F(name) + change for name, change in changes.items()}
+        )
+        if Score.applicant.is_cached(self):
+            for name, change in changes.items():
+                setattr(self.applicant, name, getattr(self.applicant, name) + change)
+
+    def record_history(self, previous):
+        """
+        Adds the previous score to the history if the score has changed.
+        """
+        if previous is not None and self.score != previous:
+            self.score_history = ",".join(
+                [x.strip() for x in (self.score_history or "").split(",") if x.strip()] + ["%.1f" % previous]
+            )
+
     def score_history_human(self):
         return (self.score_history or "").replace(",", ", ")
 
 
 class UploadedCSV(models.Model):
     """
-    A place to store uploaded CSV files while they're being mapped.
+    A place to store uploaded CSV files while they're being mapped, and
+    then to track their import by a background task. The file is kept in
+    storage and parsed a row at a time, never held in memory whole.
+
+    `checkpoint` is the number of data rows already imported; rows are
+    committed in chunks along with it, so an interrupted import can be
+    resumed from there.
     """
 
-    csv = models.TextField()
+    KIND_CHOICES = [
+        ("applicants", "Applicants"),
+        ("scores", "Scores"),
+    ]
+
+    STATUS_CHOICES = [
+        ("uploaded", "Uploaded"),
+        ("queued", "Queued"),
+        ("running", "Running"),
+        ("complete", "Complete"),
+        ("failed", "Failed"),
+    ]
+
+    program = models.ForeignKey(
+        Program,
+        null=True,
+        blank=True,
+        related_name="uploaded_csvs",
+        on_delete=models.CASCADE,
+    )
+    uploaded_by = models.ForeignKey(
+        "users.User",
+        null=True,
+        blank=True,
+        related_name="uploaded_csvs",
+        on_delete=models.SET_NULL,
+    )
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, blank=True)
+    file = models.FileField(upload_to="uploads/", blank=True)
     uploaded = models.DateTimeField(auto_now_add=True)
+
+    target_map = models.JSONField(blank=True, null=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="uploaded")
+    rows_total = models.PositiveIntegerField(default=0)
+    checkpoint = models.PositiveIntegerField(default=0)
+    successful = models.PositiveIntegerField(default=0)
+    error_count = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    class urls(Urls):
+        status = "{self.program.urls.imports}{self.id}/"
+
+    def is_finished(self):
+        return self.status in ("complete", "failed")
+
+    def is_stalled(self):
+        """
+        True if the import is running but hasn't recorded progress for
+        longer than a task is allowed to run, so its worker has gone away.
+        Queued imports wait in the broker, however long that takes, so are
+        never stalled.
+        """
+        if self.status != "running":
+            return False
+        timeout = datetime.timedelta(seconds=settings.Q_CLUSTER.get("timeout", 90) * 2)
+        return self.updated < timezone.now() - timeout
+
+    def percent_done(self):
+        if not self.rows_total:
+            return 100 if self.status == "complete" else 0
+        return int(100 * self.checkpoint / self.rows_total)
+
+    def open_rows(self):
+        """
+        Yields the rows of the stored file as they're parsed, skipping blank
+        lines, without ever reading the whole file into memory.
+        """
+        with self.file.open("rb") as handle:
+            text = io.TextIOWrapper(handle, encoding="utf-8-sig", newline="")
+            try:
+                for row in csv.reader(text):
+                    if any(cell.strip() for cell in row):
+                        yield row
+            finally:
+                text.detach()
+
+    def headers(self):
+        """
+        Returns the first row of the CSV, for mapping columns.
+        """
+        return next(self.open_rows(), [])
+
+    def data_rows(self):
+        """
+        Yields the data rows (everything after the header) of the CSV.
+        """
+        rows = self.open_rows()
+        next(rows, None)
+        yield from rows
+
+
+class ExportJob(models.Model):
+    """
+    A full export of a program's applicants, built in the background by a
+    django-q task and stored as a file for later download.
+    """
+
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("running", "Running"),
+        ("complete", "Complete"),
+        ("failed", "Failed"),
+    ]
+
+    program = models.ForeignKey(Program, related_name="export_jobs", on_delete=models.CASCADE)
+    requested_by = models.ForeignKey("users.User", related_name="export_jobs", on_delete=models.CASCADE)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
+    rows_total = models.PositiveIntegerField(default=0)
+    rows_done = models.PositiveIntegerField(default=0)
+    file = models.FileField(upload_to="exports/", blank=True)
+    error = models.TextField(blank=True, default="")
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+    completed = models.DateTimeField(blank=True, null=True)
+
+    class urls(Urls):
+        view = "{self.program.urls.exports}{self.id}/"
+        status = "{view}status/"
+        download = "{view}download/"
+
+    def __str__(self):
+        return "Export of %s (%s)" % (self.program, self.get_status_display())
+
+    def is_finished(self):
+        return self.status in ("complete", "failed")
+
+    def is_stalled(self):
+        """
+        True if the export is unfinished but hasn't recorded progress for
+        longer than its task is allowed to run, so its worker has gone away.
+        """
+        if self.is_finished():
+            return False
+        timeout = datetime.timedelta(seconds=settings.EXPORT_TIMEOUT * 2)
+        return self.updated < timezone.now() - timeout
+
+    def fail_if_stalled(self):
+        """
+        Marks a stalled export as failed, so it stops being waited on and
+        another can be started.
+        """
+        if self.is_stalled():
+            self.status = "failed"
+            self.error = "The export stopped without finishing, please start another."
+            self.completed = timezone.now()
+            self.save(update_fields=["status", "error", "completed", "updated"])
+
+    def percent_done(self):
+        if not self.rows_total:
+            return 100 if self.status == "complete" else 0
+        return int(100 * self.rows_done / self.rows_total)
+
+
+class RequestProfile(models.Model):
+    """
+    A profile of one request, recorded by RequestProfilingMiddleware: either
+    cProfile stats for a sampled request, or sampled stacks (in collapsed
+    "flame graph" format) for one that ran slow.
+    """
+
+    KIND_CHOICES = [
+        ("cprofile", "cProfile stats"),
+        ("stacks", "Sampled stacks"),
+    ]
+
+    created = models.DateTimeField(auto_now_add=True)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    method = models.CharField(max_length=10)
+    path = models.TextField()
+    view = models.CharField(max_length=255)
+    status = models.PositiveIntegerField()
+    duration_ms = models.FloatField()
+    user = models.ForeignKey(
+        "users.User",
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="request_profiles",
+    )
+    file = models.FileField(upload_to="profiles/")
+
+    def __str__(self):
+        return "%s %s (%.0fms)" % (self.method, self.path, self.duration_ms)
+
+    def filename(self):
+        extension = "prof" if self.kind == "cprofile" else "folded"
+        return "%s-%s.%s" % (self.view, self.pk, extension)
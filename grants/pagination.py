@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import base64
+import binascii
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+class KeysetPage:
+    """
+    One page of results from a KeysetPaginator, plus the cursors needed
+    to link to the pages either side of it.
+    """
+
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """
+    Paginates a queryset by seeking past the sort keys of the last row
+    seen, rather than with OFFSET, so every page costs the same however
+    deep into the results it is.
+
+    `keys` is a list of (name, descending, parser) tuples naming fields or
+    annotations that together give a total, non-null ordering; `parser`
+    turns a JSON-decoded cursor value back into a query value.
+    """
+
+    def __init__(self, queryset, keys, per_page):
+        self.queryset = queryset
+        self.keys = keys
+        self.per_page = per_page
+
+    def ordering(self, reverse=False):
+        return ["-" + name if descending != reverse else name for name, descending, _ in self.keys]
+
+    def seek(self, values, reverse=False):
+        """
+        Returns a Q matching rows strictly after the given key values in the
+        ordering (or strictly before them, if reverse is True).
+        """
+        condition = Q()
+        equal_so_far = Q()
+        for (name, descending, _), value in zip(self.keys, values):
+            lookup = "lt" if descending != reverse else "gt"
+            condition |= equal_so_far & Q(**{f"{name}__{lookup}": value})
+            equal_so_far &= Q(**{name: value})
+        return condition
+
+    def encode_cursor(self, obj):
+        values = [getattr(obj, name) for name, _, _ in self.keys]
+        # Not DjangoJSONEncoder, which truncates datetimes to milliseconds.
+        data = json.dumps(values, default=lambda value: value.isoformat()).encode()
+        return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+    def decode_cursor(self, cursor):
+        """
+        Returns the key values stored in a cursor, or None if it's invalid.
+        """
+        try:
+            data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            values = json.loads(data)
+            if len(values) != len(self.keys):
+                return None
+            return [parser(value) for (_, _, parser), value in zip(self.keys, values)]
+        except (binascii.Error, TypeError, ValueError):
+            return None
+
+    def page(self, after=None, before=None):
+        """
+        Returns the page following the `after` cursor, or preceding the
+        `before` cursor, or the first page if neither is valid.
+        """
+        after_values = self.decode_cursor(after) if after else None
+        before_values = self.decode_cursor(before) if before and not after_values else None
+        reverse = before_values is not None
+        queryset = self.queryset.order_by(*self.ordering(reverse))
+        if after_values:
+            queryset = queryset.filter(self.seek(after_values))
+        elif before_values:
+            queryset = queryset.filter(self.seek(before_values, reverse=True))
+        # Fetch one extra row to find out if there's anything beyond this page.
+        rows = list(queryset[: self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[: self.per_page]
+        if reverse:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, after_values is not None
+        return KeysetPage(
+            rows,
+            next_cursor=self.encode_cursor(rows[-1]) if rows and has_next else None,
+            previous_cursor=self.encode_cursor(rows[0]) if rows and has_previous else None,
+        )
+
+
+def parse_datetime_key(value):
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValueError("Invalid datetime: %r" % value)
+    return parsed
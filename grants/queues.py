@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import random
+
+from django.core.cache import cache
+from django.db.models import Q
+
+
+class ScoringQueue:
+    """
+    A reviewer's queue of applicants still to score in a program, kept in
+    the cache so "Save and score another" doesn't have to search for one.
+
+    The queue is built once with the least-scored applicants first,
+    shuffled within that so reviewers working at the same time spread out.
+    Entries are checked against the database as they reach the front, and
+    ones that have since been scored, rejected or deleted are dropped.
+    """
+
+    timeout = 6 * 60 * 60
+    check_size = 20
+
+    def __init__(self, program, user):
+        self.program = program
+        self.user = user
+        self.key = "grants:scoring-queue:%s:%s" % (program.id, user.pk)
+
+    def candidates(self):
+        return self.program.applicants_visible_to(self.user).exclude(Q(scores__user=self.user) | Q(status="rejected"))
+
+    def build(self):
+        rows = list(self.candidates().values_list("pk", "score_count"))
+        random.shuffle(rows)
+        rows.sort(key=lambda row: row[1])
+        ids = [pk for pk, _ in rows]
+        cache.set(self.key, ids, self.timeout)
+        return ids
+
+    def next(self, exclude=None):
+        """
+        Returns the id of the next applicant to score, skipping `exclude`,
+        or None if there's nobody left. The queue is rebuilt once if it
+        runs dry, to pick up applicants who arrived since it was built.
+        """
+        ids = cache.get(self.key)
+        rebuilt = ids is None
+        if rebuilt:
+            ids = self.build()
+        while True:
+            head = [pk for pk in ids[: self.check_size + 1] if pk != exclude][: self.check_size]
+            if not head:
+                if rebuilt:
+                    return None
+                ids, rebuilt = self.build(), True
+                continue
+            valid = set(self.candidates().filter(pk__in=head).values_list("pk", flat=True))
+            if len(valid) < len(head):
+                ids = [pk for pk in ids if pk in valid or pk not in head]
+                cache.set(self.key, ids, self.timeout)
+            for pk in head:
+                if pk in valid:
+                    return pk
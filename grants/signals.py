@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+from django.db.models import F, QuerySet
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django_q.signals import post_execute
+from django_q.utils import get_func_repr
+
+from . import metrics
+from .caching import bump_version
+from .models import Answer, Applicant, Program, Question, Score
+
+
+def origin_model(origin):
+    return origin.model if isinstance(origin, QuerySet) else type(origin)
+
+
+def once_per_delete(origin, key, compute):
+    """
+    Returns compute(), called once per delete however many rows it cascades
+    to, rather than once for each of them. Saves have no origin, so always
+    call it.
+    """
+    if origin is None:
+        return compute()
+    done = origin.__dict__.setdefault("_once_per_delete", {})
+    if key not in done:
+        done[key] = compute()
+    return done[key]
+
+
+def bump_once(origin, name):
+    once_per_delete(origin, name, lambda: bump_version(name))
+
+
+@receiver([post_save, post_delete], sender=Answer)
+def answer_changed(sender, instance, origin=None, **kwargs):
+    # Nothing cached for a program or question that's being deleted is used again.
+    if origin_model(origin) in (Program, Question):
+        return
+    # Only integer questions have anything cached from their answers.
+    question_id = instance.question_id
+    if once_per_delete(origin, ("question-type", question_id), lambda: instance.question.type) == "integer":
+        bump_once(origin, Question.answers_version(question_id))
+
+
+@receiver([post_save, post_delete], sender=Question)
+def question_changed(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, Program):
+        return
+    Program.objects.filter(pk=instance.program_id).update(questions_version=F("questions_version") + 1)
+
+
+@receiver([post_save, post_delete], sender=Applicant)
+def applicant_changed(sender, instance, origin=None, **kwargs):
+    if origin_model(origin) is Program:
+        return
+    bump_once(origin, Program.progress_version(instance.program_id))
+
+
+@receiver(post_save, sender=Score)
+def score_saved(sender, instance, created=False, **kwargs):
+    bump_version(Program.progress_version(instance.applicant.program_id))
+    if created:
+        metrics.store.inc("grorg_scores_submitted_total")
+
+
+@receiver(post_delete, sender=Score)
+def score_deleted(sender, instance, origin=None, **kwargs):
+    # No need to update a summary that's being deleted along with the score.
+    if origin_model(origin) in (Applicant, Program):
+        return
+    instance.change_summary(count=-1, remove=instance.saved_score)
+    bump_version(Program.progress_version(instance.applicant.program_id))
+
+
+@receiver(post_execute)
+def task_finished(sender, task, **kwargs):
+    labels = {"func": get_func_repr(task["func"])}
+    metrics.store.inc("grorg_tasks_total", {**labels, "result": "success" if task["success"] else "failure"})
+    if task.get("started") and task.get("stopped"):
+        duration = (task["stopped"] - task["started"]).total_seconds()
+        metrics.store.observe("grorg_task_duration_seconds", labels, duration, metrics.TASK_BUCKETS)
@@ -0,0 +1,164 @@
+"""
+Background tasks, run by the django-q cluster configured in Q_CLUSTER.
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import itertools
+import tempfile
+
+from django.core.files import File
+from django.db import IntegrityError
+from django.db.transaction import atomic
+from django.utils import timezone
+from django_q.tasks import async_task
+
+from .caching import bump_version
+from .exports import FullApplicantExport
+from .importers import IMPORTERS
+from .models import Answer, Applicant, ExportJob, Question, UploadedCSV
+from .utils import chunked, normalise_email
+
+IMPORT_CHUNK_SIZE = 500
+# Chunks one task imports before enqueueing another to carry on from the
+# checkpoint, so no task runs into the cluster's timeout however big the
+# file is.
+IMPORT_CHUNKS_PER_TASK = 20
+# Errors kept for the report; any beyond these are only counted.
+IMPORT_MAX_ERRORS = 200
+
+
+def export_applicants(job_id):
+    """
+    Writes a full applicant export for an ExportJob to a temporary file a
+    chunk at a time, recording progress on the job as it goes, then saves
+    the file to storage.
+    """
+    job = ExportJob.objects.select_related("program", "requested_by").get(pk=job_id)
+    job.status = "running"
+    export = FullApplicantExport(job.program, job.requested_by)
+    job.rows_total = export.get_queryset().count()
+    job.save(update_fields=["status", "rows_total", "updated"])
+    try:
+        with tempfile.TemporaryFile() as handle:
+            text = io.TextIOWrapper(handle, encoding="utf-8", newline="")
+            writer = csv.writer(text)
+            writer.writerow(export.headers())
+            for applicants, answers in export.chunks():
+                writer.writerows(export.row(applicant, answers) for applicant in applicants)
+                job.rows_done += len(applicants)
+                job.save(update_fields=["rows_done", "updated"])
+            text.flush()
+            handle.seek(0)
+            job.file.save(
+                "%s-applicants-%s.csv" % (job.program.slug, job.pk),
+                File(handle),
+                save=False,
+            )
+            text.detach()
+    except Exception as e:
+        job.status = "failed"
+        job.error = str(e)
+        job.completed = timezone.now()
+        job.save(update_fields=["status", "error", "completed", "updated"])
+        raise
+    job.status = "complete"
+    job.completed = timezone.now()
+    job.save(update_fields=["status", "file", "completed", "updated"])
+
+
+def import_csv(upload_id):
+    """
+    Imports the rows of a mapped UploadedCSV a chunk at a time, reading the
+    file lazily so memory use doesn't depend on its size. Each chunk is
+    committed together with the checkpoint and counts, so if the worker
+    dies the import can be enqueued again and picks up where it left off.
+    After IMPORT_CHUNKS_PER_TASK chunks it does just that itself.
+
+    Only one task imports an upload at a time: a task has to claim a queued
+    upload to start, and stops if another has moved the checkpoint on, as
+    happens when a running import is resumed by hand.
+    """
+    if not UploadedCSV.objects.filter(pk=upload_id, status="queued").update(status="running", updated=timezone.now()):
+        return
+    upload = UploadedCSV.objects.select_related("program", "uploaded_by").get(pk=upload_id)
+    importer = IMPORTERS[upload.kind](upload.program, upload.target_map, upload.uploaded_by)
+    if not upload.rows_total:
+        upload.rows_total = sum(1 for _ in upload.data_rows())
+        upload.save(update_fields=["rows_total", "updated"])
+    rows = enumerate(upload.data_rows())
+    importer.skip_rows(row for _, row in itertools.islice(rows, upload.checkpoint))
+    try:
+        for chunk in itertools.islice(chunked(rows, IMPORT_CHUNK_SIZE), IMPORT_CHUNKS_PER_TASK):
+            with atomic():
+                # Locked until the chunk is committed, so another task
+                # importing the upload waits here, then sees it's been moved on.
+                checkpoint = (
+                    UploadedCSV.objects.select_for_update().values_list("checkpoint", flat=True).get(pk=upload.pk)
+                )
+                if checkpoint != upload.checkpoint:
+                    return
+                successful, errors = importer.import_rows(chunk)
+                upload.checkpoint += len(chunk)
+                upload.successful += successful
+                upload.error_count += len(errors)
+                kept = errors[: max(IMPORT_MAX_ERRORS - len(upload.errors), 0)]
+                upload.errors += [[index, row, str(error)] for index, row, error in kept]
+                upload.save(update_fields=["checkpoint", "successful", "error_count", "errors", "updated"])
+    except Exception as e:
+        upload.refresh_from_db()
+        upload.status = "failed"
+        upload.errors.append([upload.checkpoint, [], str(e)])
+        upload.save(update_fields=["status", "errors", "updated"])
+        raise
+    if upload.checkpoint < upload.rows_total:
+        upload.status = "queued"
+        upload.save(update_fields=["status", "updated"])
+        async_task("grants.tasks.import_csv", upload.pk, task_name="import-csv-%s" % upload.pk)
+        return
+    # The file isn't needed once it's all in; keep the report.
+    upload.status = "complete"
+    upload.file.delete(save=False)
+    upload.save(update_fields=["status", "file", "updated"])
+
+
+def save_application(program_id, name, email, applied, answers, program=None):
+    """
+    Saves a submitted application - the applicant and all their answers -
+    in one transaction. `answers` maps question ids to answer text.
+
+    Runs in the request, given the program the view has already loaded so
+    it isn't loaded again, or as a task when APPLY_ASYNC is on, in which
+    case another application with the same email may have been saved
+    since the form was checked; the later one is then dropped. Two saved
+    at the same moment can both pass that check, so where the program
+    doesn't allow duplicate emails the database constraint decides.
+    """
+    try:
+        with atomic():
+            if Applicant.objects.filter(program_id=program_id, email_normalised=normalise_email(email)).exists():
+                return None
+            applicant = Applicant(program_id=program_id, name=name, email=email, applied=applied)
+            if program is not None:
+                applicant.program = program
+            applicant.save()
+            answer_objects = [
+                Answer(applicant=applicant, question_id=question_id, answer=answer)
+                for question_id, answer in answers.items()
+            ]
+            # bulk_create skips save() and signals, so do their work here.
+            for answer in answer_objects:
+                answer.set_typed_values()
+            Answer.objects.bulk_create(answer_objects)
+    except IntegrityError:
+        if Applicant.objects.filter(program_id=program_id, email_normalised=normalise_email(email)).exists():
+            return None
+        raise
+    # Only integer answers have anything cached from them, and a new answer
+    # can only change that if it is one.
+    for answer in answer_objects:
+        if answer.answer_int is not None:
+            bump_version(Question.answers_version(answer.question_id))
+    return applicant
@@ -0,0 +1,211 @@
+"""
+Benchmarks of the busiest views and the bulk loaders, run with `just bench`
+(or `pytest -m bench`) and left out of the normal test run.
+
+Each benchmark seeds a program, then records the queries, wall time and
+peak memory of one request or import, and compares them with the stored
+baseline in bench_baseline.json. Query counts mustn't go up at all; time
+and memory may grow by a factor of BENCH_TOLERANCE (default 2) before
+failing, as they vary between machines.
+
+BENCH_SIZES sets the numbers of applicants to seed (default
+"100,1000,10000"), BENCH_QUESTIONS and BENCH_REVIEWERS the numbers of
+questions and reviewers (default 6 and 5). Setting BENCH_UPDATE=1 writes
+the measurements to the baseline instead of checking them.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import pathlib
+import random
+import time
+import tracemalloc
+
+import pytest
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from model_bakery import baker
+
+from grants import tasks
+from grants.models import Answer, Applicant, Score
+
+pytestmark = pytest.mark.bench
+
+BASELINE_PATH = pathlib.Path(__file__).with_name("bench_baseline.json")
+SIZES = [int(size) for size in os.environ.get("BENCH_SIZES", "100,1000,10000").split(",")]
+QUESTIONS = int(os.environ.get("BENCH_QUESTIONS", 6))
+REVIEWERS = int(os.environ.get("BENCH_REVIEWERS", 5))
+TOLERANCE = float(os.environ.get("BENCH_TOLERANCE", 2))
+UPDATE = os.environ.get("BENCH_UPDATE") == "1"
+
+# Slack on top of the tolerance, so tiny measurements aren't flaky.
+MIN_SECONDS = 0.05
+MIN_PEAK_KB = 512
+
+QUESTION_TYPES = ["text", "boolean", "integer"]
+
+
+def seed_program(size):
+    """
+    Makes a program with `size` applicants who have answered every question,
+    and reviewers who have each scored about half of them. The first
+    reviewer created the program.
+    """
+    rng = random.Random(size)
+    reviewers = [
+        baker.make("users.User", email="reviewer%s@example.com" % index, is_staff=index == 0)
+        for index in range(REVIEWERS)
+    ]
+    program = baker.make("grants.Program", name="Bench", slug="bench", created_by=reviewers[0], duplicate_emails=False)
+    program.users.add(*reviewers)
+    questions = [
+        baker.make(
+            "grants.Question",
+            program=program,
+            type=QUESTION_TYPES[index % len(QUESTION_TYPES)],
+            question="Question %s" % index,
+            filterable=True,
+            order=index,
+        )
+        for index in range(QUESTIONS)
+    ]
+    # bulk_create skips save(), so fill in what it would.
+    applicants = baker.prepare(
+        "grants.Applicant",
+        program=program,
+        email=iter("applicant%s@example.com" % index for index in range(size)),
+        _quantity=size,
+    )
+    for applicant in applicants:
+        applicant.set_email_fields(program)
+    applicants = Applicant.objects.bulk_create(applicants, batch_size=1000)
+    answers = []
+    for applicant in applicants:
+        for question in questions:
+            if question.type == "boolean":
+                text = rng.choice(["True", "False"])
+            elif question.type == "integer":
+                text = str(rng.randint(0, 5000))
+            else:
+                text = "Some words about why I'd like to go."
+            answer = Answer(applicant=applicant, question=question, answer=text)
+            answer.set_typed_values()
+            answers.append(answer)
+    Answer.objects.bulk_create(answers, batch_size=1000)
+    Score.objects.bulk_create(
+        [
+            Score(applicant=applicant, user=reviewer, score=rng.randint(1, 5))
+            for reviewer in reviewers
+            for applicant in applicants
+            if rng.random() < 0.5
+        ],
+        batch_size=1000,
+    )
+    program.applicants.refresh_score_summaries()
+    return program, reviewers, applicants
+
+
+def measure(function):
+    """
+    Runs `function` with a cold cache, returning its query count, wall time
+    in seconds and peak memory in KB.
+    """
+    cache.clear()
+    tracemalloc.start()
+    try:
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            function()
+            seconds = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {"queries": len(queries), "seconds": round(seconds, 4), "peak_kb": peak // 1024}
+
+
+def regressions(name, result, baseline):
+    if baseline is None:
+        return ["%s: no baseline, run with BENCH_UPDATE=1 to record one" % name]
+    problems = []
+    if result["queries"] > baseline["queries"]:
+        problems.append("%s: %s queries, baseline %s" % (name, result["queries"], baseline["queries"]))
+    if result["seconds"] > baseline["seconds"] * TOLERANCE + MIN_SECONDS:
+        problems.append("%s: took %.3fs, baseline %.3fs" % (name, result["seconds"], baseline["seconds"]))
+    if result["peak_kb"] > baseline["peak_kb"] * TOLERANCE + MIN_PEAK_KB:
+        problems.append("%s: peak memory %sKB, baseline %sKB" % (name, result["peak_kb"], baseline["peak_kb"]))
+    return problems
+
+
+def get(client, url):
+    response = client.get(url)
+    assert response.status_code == 200, url
+    if response.streaming:
+        # Consumed without being kept, so peak memory is the view's own.
+        for _ in response.streaming_content:
+            pass
+    return response
+
+
+def import_upload(program, user, kind, rows, target_map):
+    """
+    Returns a function that imports `rows` as a CSV upload, with a header.
+    """
+    rows = [["column %s" % offset for offset in range(len(rows[0]))]] + rows
+    upload = baker.make(
+        "grants.UploadedCSV",
+        program=program,
+        uploaded_by=user,
+        kind=kind,
+        file=ContentFile("".join(",".join(row) + "\n" for row in rows).encode(), name="upload.csv"),
+        target_map=target_map,
+        status="queued",
+    )
+    return lambda: tasks.import_csv(upload.pk)
+
+
+@pytest.mark.usefixtures("media_root")
+@pytest.mark.parametrize("size", SIZES)
+def test_benchmarks(db, client, size):
+    program, reviewers, applicants = seed_program(size)
+    client.force_login(reviewers[0])
+    url = "/%s/" % program.slug
+    benchmarks = {
+        "ProgramHome": lambda: get(client, url),
+        "ProgramApplicants": lambda: get(client, url + "applicants/"),
+        "ProgramApplicants?sort=score": lambda: get(client, url + "applicants/?sort=score"),
+        "ProgramApplicantsCsv": lambda: get(client, url + "applicants/csv/"),
+        "ProgramApplicantView": lambda: get(client, url + "applicants/%s/" % applicants[size // 2].pk),
+        # Imports change the data, so they go last.
+        "BulkLoadScores": import_upload(
+            program,
+            reviewers[-1],
+            "scores",
+            [[applicant.email, "3", "Imported"] for applicant in applicants],
+            {"email": 0, "score": 1, "comment": 2},
+        ),
+        "BulkLoadApplicants": import_upload(
+            program,
+            reviewers[0],
+            "applicants",
+            [["New %s" % index, "new%s@example.com" % index, "1"] for index in range(size)],
+            {"name": 0, "email": 1, "q%s" % program.questions.get(order=1).pk: 2},
+        ),
+    }
+    # Load templates and code on first use outside the measurements.
+    for name, function in benchmarks.items():
+        if not name.startswith("BulkLoad"):
+            function()
+    results = {"%s@%s" % (name, size): measure(function) for name, function in benchmarks.items()}
+    baseline = json.loads(BASELINE_PATH.read_text()) if BASELINE_PATH.exists() else {}
+    if UPDATE:
+        baseline.update(results)
+        BASELINE_PATH.write_text(json.dumps(dict(sorted(baseline.items())), indent=2) + "\n")
+        return
+    problems = [
+        problem for name, result in results.items() for problem in regressions(name, result, baseline.get(name))
+    ]
+    assert not problems, "\n".join(problems)
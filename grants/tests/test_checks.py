@@ -0,0 +1,13 @@
+from __future__ import annotations
+
+from grants.checks import check_media_root
+
+
+class TestMediaRootCheck:
+    def test_requires_media_root(self, settings):
+        settings.MEDIA_ROOT = ""
+        assert [error.id for error in check_media_root(None)] == ["grants.E001"]
+
+    def test_passes_when_set(self, settings, tmp_path):
+        settings.MEDIA_ROOT = str(tmp_path)
+        assert check_media_root(None) == []
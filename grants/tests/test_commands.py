@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+import io
+
+import pytest
+from django.core.management import CommandError, call_command
+
+from grants.models import Answer, Program, Question, Score
+
+
+class TestGenerateDataCommand:
+    def generate(self, **options):
+        call_command("generate_data", applicants=40, reviewers=3, stdout=io.StringIO(), **options)
+        program = Program.objects.get(slug="generated-%s-0" % options.get("seed", 0))
+        return program, [
+            (applicant.email, applicant.status, applicant.score_count, applicant.score_sum)
+            for applicant in program.applicants.order_by("email")
+        ]
+
+    def test_generates_a_program(self, db):
+        program, _ = self.generate()
+        assert program.applicants.count() == 40
+        assert set(program.questions.values_list("type", flat=True)) == {type for type, _ in Question.TYPE_CHOICES}
+        assert Answer.objects.filter(applicant__program=program).count() == 40 * 8
+        assert program.users.count() == 3
+        assert Score.objects.filter(applicant__program=program).exists()
+        # Summaries are filled in even though scores are bulk inserted.
+        summaries = list(program.applicants.order_by("pk").values_list("score_count", "score_sum"))
+        program.applicants.refresh_score_summaries()
+        assert list(program.applicants.order_by("pk").values_list("score_count", "score_sum")) == summaries
+        assert not program.resources.with_allocation_totals().filter(remaining__lt=0).exists()
+
+    def test_same_seed_gives_same_data(self, db):
+        _, first = self.generate(seed=3)
+        _, second = self.generate(seed=3, replace=True)
+        _, other = self.generate(seed=4)
+        assert first == second
+        assert first != other
+
+    def test_refuses_to_overwrite_without_replace(self, db):
+        self.generate()
+        with pytest.raises(CommandError):
+            self.generate()
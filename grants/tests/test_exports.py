@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import csv
+import datetime
+import io
+
+import pytest
+from django.utils import timezone
+from model_bakery import baker
+
+from grants.models import ExportJob
+from grants.tasks import export_applicants
+
+
+@pytest.fixture
+def export_job(program, user):
+    return baker.make("grants.ExportJob", program=program, requested_by=user)
+
+
+def read_job_csv(job):
+    with job.file.open("rb") as handle:
+        return list(csv.reader(io.StringIO(handle.read().decode())))
+
+
+class TestExportApplicantsTask:
+    def test_writes_full_export(self, media_root, export_job, program, question, applicant, user, other_user, resource):
+        baker.make("grants.Answer", applicant=applicant, question=question, answer="Travel")
+        baker.make("grants.Score", applicant=applicant, user=other_user, score=4.0, comment="Strong")
+        baker.make("grants.Allocation", applicant=applicant, resource=resource, amount=250)
+        export_applicants(export_job.pk)
+        export_job.refresh_from_db()
+        assert export_job.status == "complete"
+        assert export_job.rows_total == export_job.rows_done == 1
+        assert export_job.completed is not None
+        rows = read_job_csv(export_job)
+        header = dict(zip(rows[0], rows[1]))
+        assert header["Email"] == applicant.email
+        assert header["Average Score"] == "4.0"
+        assert header["Scores"] == f"{other_user}: 4.0 (Strong)"
+        assert header["Allocations"] == "Travel Grant: 250"
+        assert header[question.question] == "Travel"
+
+    def test_includes_rejected_applicants(self, media_root, export_job, program):
+        baker.make("grants.Applicant", program=program, email="rejected@example.com", status="rejected")
+        export_applicants(export_job.pk)
+        export_job.refresh_from_db()
+        rows = read_job_csv(export_job)
+        assert rows[1][0] == "rejected@example.com"
+
+    def test_records_failure(self, media_root, export_job, monkeypatch):
+        def explode(self):
+            raise RuntimeError("boom")
+
+        monkeypatch.setattr("grants.exports.FullApplicantExport.chunks", explode)
+        with pytest.raises(RuntimeError):
+            export_applicants(export_job.pk)
+        export_job.refresh_from_db()
+        assert export_job.status == "failed"
+        assert export_job.error == "boom"
+
+
+class TestExportViews:
+    def test_requires_manager(self, client_logged_in, program):
+        response = client_logged_in.get(f"/{program.slug}/applicants/exports/")
+        assert response.status_code == 404
+
+    def test_start_export_enqueues_task(self, manager_client, program, user, monkeypatch, settings):
+        enqueued = []
+        monkeypatch.setattr(
+            "grants.views.export.async_task", lambda func, *args, **kwargs: enqueued.append((args, kwargs["timeout"]))
+        )
+        response = manager_client.post(f"/{program.slug}/applicants/exports/")
+        job = ExportJob.objects.get()
+        assert response.status_code == 302
+        assert response.url == job.urls.view
+        assert job.requested_by == user
+        assert enqueued == [((job.pk,), settings.EXPORT_TIMEOUT)]
+
+    def test_stalled_export_is_marked_failed(self, manager_client, export_job):
+        export_job.status = "running"
+        export_job.save()
+        assert manager_client.get(export_job.urls.status).json()["status"] == "running"
+        ExportJob.objects.filter(pk=export_job.pk).update(updated=timezone.now() - datetime.timedelta(hours=1))
+        data = manager_client.get(export_job.urls.status).json()
+        assert data["status"] == "failed"
+        assert "stopped" in data["error"]
+
+    def test_finished_export_is_not_stalled(self, program, user):
+        job = baker.make("grants.ExportJob", program=program, requested_by=user, status="complete")
+        ExportJob.objects.filter(pk=job.pk).update(updated=timezone.now() - datetime.timedelta(hours=1))
+        job.refresh_from_db()
+        assert job.is_stalled() is False
+
+    def test_status_reports_progress(self, manager_client, program, export_job):
+        export_job.rows_total = 10
+        export_job.rows_done = 4
+        export_job.save()
+        response = manager_client.get(export_job.urls.status)
+        assert response.json() == {
+            "status": "pending",
+            "rows_done": 4,
+            "rows_total": 10,
+            "percent_done": 40,
+            "error": "",
+            "download_url": None,
+        }
+
+    def test_download_after_completion(self, media_root, manager_client, program, export_job, applicant):
+        assert manager_client.get(export_job.urls.download).status_code == 404
+        export_applicants(export_job.pk)
+        response = manager_client.get(export_job.urls.status)
+        assert response.json()["download_url"] == export_job.urls.download
+        response = manager_client.get(export_job.urls.download)
+        assert response.status_code == 200
+        assert applicant.email in b"".join(response.streaming_content).decode()
+
+    def test_job_page_renders(self, manager_client, export_job):
+        response = manager_client.get(export_job.urls.view)
+        assert response.status_code == 200
+        assert export_job.urls.status in response.content.decode()
@@ -1,8 +1,9 @@
 from __future__ import annotations
 
 import pytest
+from model_bakery import baker
 
-from grants.forms import ScoreForm
+from grants.forms import ResourceForm, ScoreForm
 
 
 @pytest.mark.django_db
@@ -37,3 +38,12 @@ class TestScoreForm:
     def test_empty_score_valid(self):
         form = ScoreForm(data={"score": "", "comment": "No score yet"})
         assert form.is_valid()
+
+
+class TestResourceForm:
+    def test_amount_below_allocated_runs_one_query(self, resource, applicant, django_assert_num_queries):
+        baker.make("grants.Allocation", applicant=applicant, resource=resource, amount=600)
+        form = ResourceForm(data={"name": resource.name, "type": resource.type, "amount": 500}, instance=resource)
+        with django_assert_num_queries(1):
+            assert not form.is_valid()
+        assert form.errors["amount"] == ["600 has already been allocated; remove allocations first."]
@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from model_bakery import baker
+
+from grants.importers import ApplicantImporter, ScoreImporter
+from grants.models import Answer, Applicant, Score
+
+
+@pytest.fixture
+def integer_question(program):
+    return baker.make("grants.Question", program=program, type="integer", question="Budget", order=3)
+
+
+@pytest.fixture
+def target_map(question, boolean_question, integer_question):
+    return {
+        "name": 0,
+        "email": 1,
+        "timestamp": 2,
+        f"q{question.id}": 3,
+        f"q{boolean_question.id}": 4,
+        f"q{integer_question.id}": 5,
+    }
+
+
+def numbered(rows):
+    return list(enumerate(rows))
+
+
+class TestApplicantImporter:
+    def test_creates_applicants_and_answers(self, program, target_map, question, boolean_question, integer_question):
+        importer = ApplicantImporter(program, target_map)
+        successful, errors = importer.import_rows(
+            numbered([["Ada", "ada@example.com", "2024-01-02T03:04:05", "Travel", "yes", "300"]])
+        )
+        assert (successful, errors) == (1, [])
+        applicant = Applicant.objects.get(email="ada@example.com")
+        assert applicant.name == "Ada"
+        assert applicant.applied.year == 2024
+        answers = dict(applicant.answers.values_list("question_id", "answer"))
+        assert answers == {question.id: "Travel", boolean_question.id: "True", integer_question.id: "300"}
+        assert applicant.answers.get(question=boolean_question).answer_bool is True
+        assert applicant.answers.get(question=integer_question).answer_int == 300
+
+    def test_invalidates_cached_integer_filter_ranges(self, program, target_map, integer_question):
+        assert integer_question.integer_filter_ranges() == []
+        importer = ApplicantImporter(program, target_map)
+        importer.import_rows(numbered([["Ada", "ada@example.com", "", "Travel", "yes", "300"]]))
+        assert integer_question.integer_filter_ranges() == [(300, 300)]
+
+    def test_updates_existing_applicant_and_answers(self, program, target_map, question, applicant):
+        baker.make("grants.Answer", applicant=applicant, question=question, answer="Old answer")
+        importer = ApplicantImporter(program, target_map)
+        successful, errors = importer.import_rows(numbered([["New Name", applicant.email, "", "New answer", "no", ""]]))
+        assert (successful, errors) == (1, [])
+        applicant.refresh_from_db()
+        assert applicant.name == "New Name"
+        assert Applicant.objects.count() == 1
+        assert Answer.objects.get(applicant=applicant, question=question).answer == "New answer"
+
+    def test_reports_invalid_rows_and_imports_the_rest(self, program, target_map):
+        importer = ApplicantImporter(program, target_map)
+        successful, errors = importer.import_rows(
+            numbered(
+                [
+                    ["Ada", "ada@example.com", "", "a", "yes", "1"],
+                    ["", "blank@example.com", "", "a", "yes", "1"],
+                    ["Grace", "grace@example.com", "", "a", "yes", "lots"],
+                    ["Ada Again", "ADA@example.com", "", "a", "yes", "1"],
+                ]
+            )
+        )
+        assert successful == 1
+        assert [(index, str(error)) for index, _, error in errors] == [
+            (1, "Name is blank"),
+            (2, "Invalid integer value for question Budget: lots"),
+            (3, "Duplicate email 'ada@example.com' - this email already appeared earlier in the CSV"),
+        ]
+        assert list(Applicant.objects.values_list("email", flat=True)) == ["ada@example.com"]
+
+    def test_duplicate_emails_allowed_when_program_permits(self, program, target_map):
+        program.duplicate_emails = True
+        program.save()
+        importer = ApplicantImporter(program, target_map)
+        row = ["Ada", "ada@example.com", "", "a", "yes", "1"]
+        successful, errors = importer.import_rows(numbered([row, row]))
+        assert (successful, errors) == (2, [])
+        assert Applicant.objects.filter(email="ada@example.com").count() == 2
+
+    def test_query_count_does_not_grow_with_rows(self, program, target_map):
+        def count_queries(rows):
+            with CaptureQueriesContext(connection) as queries:
+                ApplicantImporter(program, target_map).import_rows(numbered(rows))
+            return len(queries)
+
+        small = count_queries([["A", "a@example.com", "", "x", "yes", "1"]])
+        large = count_queries([[f"N{i}", f"n{i}@example.com", "", "x", "no", str(i)] for i in range(50)])
+        assert large == small
+
+
+class TestScoreImporter:
+    target_map = {"email": 0, "score": 1, "comment": 2}
+
+    def test_creates_and_updates_scores(self, program, user, applicant):
+        other = baker.make("grants.Applicant", program=program, email="bob@example.com")
+        baker.make("grants.Score", applicant=other, user=user, score=2.0)
+        importer = ScoreImporter(program, self.target_map, user)
+        rows = [[applicant.email.upper(), "4", "Good"], ["bob@example.com", "5", ""]]
+        assert importer.import_rows(numbered(rows)) == (2, [])
+        scores = {score.applicant_id: score for score in Score.objects.filter(user=user)}
+        assert (scores[applicant.id].score, scores[applicant.id].comment) == (4.0, "Good")
+        assert (scores[other.id].score, scores[other.id].score_history) == (5.0, "2.0")
+        other.refresh_from_db()
+        assert (other.score_count, other.score_sum) == (1, 5.0)
+
+    def test_repeated_rows_are_applied_in_order(self, program, user, applicant):
+        importer = ScoreImporter(program, self.target_map, user)
+        rows = [[applicant.email, "3", ""], [applicant.email, "4", ""], [applicant.email, "5", "Final"]]
+        assert importer.import_rows(numbered(rows)) == (3, [])
+        score = Score.objects.get()
+        assert (score.score, score.comment, score.score_history) == (5.0, "Final", "3.0,4.0")
+        applicant.refresh_from_db()
+        assert (applicant.score_count, applicant.score_sum) == (1, 5.0)
+
+    def test_only_matches_applicants_in_program(self, program, user):
+        baker.make("grants.Applicant", email="elsewhere@example.com")
+        importer = ScoreImporter(program, self.target_map, user)
+        successful, errors = importer.import_rows(numbered([["elsewhere@example.com", "3", ""]]))
+        assert successful == 0
+        assert "No applicant" in str(errors[0][2])
+        assert not Score.objects.exists()
+
+    def test_reports_invalid_rows_and_imports_the_rest(self, program, user, applicant):
+        importer = ScoreImporter(program, self.target_map, user)
+        rows = [
+            [applicant.email, "", ""],
+            [applicant.email, "7", ""],
+            [applicant.email, "x", ""],
+            [applicant.email, "2", ""],
+        ]
+        successful, errors = importer.import_rows(numbered(rows))
+        assert successful == 1
+        assert [index for index, _, _ in errors] == [0, 1, 2]
+        assert Score.objects.get().score == 2.0
+
+    def test_query_count_does_not_grow_with_rows(self, program, user):
+        applicants = baker.make(
+            "grants.Applicant", program=program, email=iter(f"n{i}@example.com" for i in range(50)), _quantity=50
+        )
+
+        def count_queries(rows):
+            with CaptureQueriesContext(connection) as queries:
+                ScoreImporter(program, self.target_map, user).import_rows(numbered(rows))
+            return len(queries)
+
+        small = count_queries([[applicants[0].email, "3", ""]])
+        large = count_queries([[applicant.email, "4", ""] for applicant in applicants[1:]])
+        assert large == small
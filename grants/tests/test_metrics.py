@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import datetime
+import json
+import time
+
+import pytest
+from model_bakery import baker
+
+from grants import metrics
+from grants.importers import ScoreImporter
+from grants.signals import task_finished
+
+
+@pytest.fixture
+def metrics_dir(settings, tmp_path, monkeypatch):
+    settings.METRICS_DIR = str(tmp_path)
+    monkeypatch.setattr(metrics, "store", metrics.MetricsStore(str(tmp_path)))
+    return tmp_path
+
+
+def sample_lines(text):
+    return [line for line in text.splitlines() if not line.startswith("#")]
+
+
+def scrape(client, settings):
+    settings.METRICS_TOKEN = "s3cret"
+    response = client.get("/metrics/", headers={"Authorization": "Bearer s3cret"})
+    return sample_lines(response.content.decode())
+
+
+class TestMetricsStore:
+    def test_adds_up_every_process(self, metrics_dir):
+        (metrics_dir / "web-1-100.json").write_text(json.dumps([["grorg_scores_submitted_total", {}, 2]]))
+        (metrics_dir / "web-2-100.json").write_text(json.dumps([["grorg_scores_submitted_total", {}, 3]]))
+        store = metrics.MetricsStore(str(metrics_dir))
+        store.inc("grorg_scores_submitted_total")
+        store.flush()
+        assert metrics.process_samples(str(metrics_dir)) == {("grorg_scores_submitted_total", ()): 6}
+
+    def test_histograms_are_cumulative(self, metrics_dir):
+        store = metrics.MetricsStore(str(metrics_dir))
+        store.observe("grorg_task_duration_seconds", {"func": "f"}, 0.7, [0.5, 1, 5])
+        store.flush()
+        samples = metrics.process_samples(str(metrics_dir))
+        buckets = {
+            dict(labels)["le"]: value
+            for (name, labels), value in samples.items()
+            if name == "grorg_task_duration_seconds_bucket"
+        }
+        assert buckets == {"1": 1, "5": 1, "+Inf": 1}
+        assert samples[("grorg_task_duration_seconds_sum", (("func", "f"),))] == 0.7
+
+    def test_writes_from_a_background_thread(self, metrics_dir):
+        store = metrics.MetricsStore(str(metrics_dir), interval=0.2)
+        store.inc("grorg_scores_submitted_total")
+        assert not list(metrics_dir.glob("*.json"))
+        deadline = time.monotonic() + 5
+        while not list(metrics_dir.glob("*.json")) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert metrics.process_samples(str(metrics_dir)) == {("grorg_scores_submitted_total", ()): 1}
+
+    def test_records_nothing_without_a_directory(self, tmp_path):
+        store = metrics.MetricsStore("")
+        store.inc("grorg_scores_submitted_total")
+        assert not store.values
+
+
+class TestMetricsEndpoint:
+    def test_reports_requests_scores_and_tasks(self, metrics_dir, settings, client_logged_in, program, applicant, user):
+        settings.MIDDLEWARE = ("grants.middleware.MetricsMiddleware",) + tuple(settings.MIDDLEWARE)
+        client_logged_in.get(f"/{program.slug}/applicants/")
+        baker.make("grants.Score", applicant=applicant, user=user, score=3)
+        started = datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)
+        task_finished(
+            "django_q",
+            {
+                "func": "grants.tasks.import_csv",
+                "success": False,
+                "started": started,
+                "stopped": started + datetime.timedelta(seconds=2),
+            },
+        )
+        lines = scrape(client_logged_in, settings)
+        assert 'grorg_requests_total{method="GET",status="200",view="program.ProgramApplicants"} 1' in lines
+        assert 'grorg_request_duration_seconds_count{view="program.ProgramApplicants"} 1' in lines
+        assert "grorg_scores_submitted_total 1" in lines
+        assert 'grorg_tasks_total{func="grants.tasks.import_csv",result="failure"} 1' in lines
+        assert 'grorg_task_duration_seconds_bucket{func="grants.tasks.import_csv",le="5"} 1' in lines
+        assert 'grorg_queue_depth{state="queued"} 0' in lines
+
+    def test_reports_import_and_export_progress(self, client, program, user, settings):
+        baker.make(
+            "grants.UploadedCSV", program=program, kind="scores", status="complete", successful=40, error_count=2
+        )
+        baker.make("grants.ExportJob", program=program, requested_by=user, status="running", rows_done=15)
+        lines = scrape(client, settings)
+        assert 'grorg_imports{kind="scores",status="complete"} 1' in lines
+        assert 'grorg_import_rows{kind="scores",outcome="successful"} 40' in lines
+        assert 'grorg_exports{status="running"} 1' in lines
+        assert "grorg_export_rows 15" in lines
+
+    def test_counts_imported_scores_once(
+        self, metrics_dir, program, user, applicant, django_capture_on_commit_callbacks
+    ):
+        scored = baker.make("grants.Applicant", program=program, email="scored@example.com")
+        baker.make("grants.Score", applicant=scored, user=user, score=2)
+        importer = ScoreImporter(program, {"email": 0, "score": 1}, user)
+        with django_capture_on_commit_callbacks(execute=True):
+            importer.import_rows([(0, [applicant.email, "4"]), (1, [scored.email, "5"])])
+        # One saved by a reviewer, and one of the two imported.
+        assert "grorg_scores_submitted_total 2" in sample_lines(metrics.render())
+
+    def test_token_required_when_set(self, client, db, settings):
+        settings.METRICS_TOKEN = "s3cret"
+        assert client.get("/metrics/").status_code == 403
+        response = client.get("/metrics/", headers={"Authorization": "Bearer s3cret"})
+        assert response.status_code == 200
+        assert response["Content-Type"].startswith("text/plain")
+
+    def test_not_served_without_token_outside_debug(self, client, db, settings):
+        settings.METRICS_TOKEN = ""
+        assert client.get("/metrics/").status_code == 403
+        settings.DEBUG = True
+        assert client.get("/metrics/").status_code == 200
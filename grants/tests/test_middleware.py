@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import functools
+import logging
+import marshal
+import threading
+import time
+
+import pytest
+from django.urls import ResolverMatch
+
+from grants.middleware import QueryTimer, StackSampler, view_name
+from grants.models import RequestProfile
+
+
+@pytest.fixture
+def timing(settings):
+    settings.MIDDLEWARE = ("grants.middleware.RequestTimingMiddleware",) + tuple(settings.MIDDLEWARE)
+    return settings
+
+
+@pytest.fixture
+def profiling(settings, media_root):
+    settings.MIDDLEWARE = ("grants.middleware.RequestProfilingMiddleware",) + tuple(settings.MIDDLEWARE)
+    settings.REQUEST_PROFILING_SAMPLE_RATE = 0
+    settings.REQUEST_PROFILING_SLOW_MS = 0
+    return settings
+
+
+class TestRequestTimingMiddleware:
+    def test_adds_server_timing_header(self, timing, client_logged_in, program):
+        response = client_logged_in.get(f"/{program.slug}/applicants/")
+        metrics = dict(part.split(";", 1) for part in response["Server-Timing"].split(", "))
+        assert set(metrics) == {"db", "render", "total"}
+        assert "queries" in metrics["db"]
+
+    def test_logs_view_name_and_counts(self, timing, client_logged_in, program, caplog):
+        with caplog.at_level(logging.INFO, logger="grants.middleware"):
+            client_logged_in.get(f"/{program.slug}/applicants/")
+        record = caplog.records[-1]
+        assert record.view == "program.ProgramApplicants"
+        assert record.status == 200
+        assert record.queries > 0
+        assert record.render_ms > 0
+
+    def test_logs_slowest_queries_of_slow_requests(self, timing, client_logged_in, program, caplog):
+        timing.REQUEST_TIMING_SLOW_MS = 0
+        with caplog.at_level(logging.INFO, logger="grants.middleware"):
+            client_logged_in.get(f"/{program.slug}/")
+        warning = next(record for record in caplog.records if record.levelno == logging.WARNING)
+        assert "Slow request view=program.ProgramHome" in warning.getMessage()
+        assert "SELECT" in warning.getMessage()
+
+    def test_unresolved_requests_are_timed(self, timing, client, db):
+        response = client.get("/no/such/page/here/")
+        assert response.status_code == 404
+        assert "total;dur=" in response["Server-Timing"]
+
+
+class TestViewName:
+    def test_names_function_views_after_the_function(self, rf):
+        request = rf.get("/")
+        request.resolver_match = ResolverMatch(functools.partial(slow_context, 1), (), {})
+        assert view_name(request) == "test_middleware.slow_context"
+
+
+class TestQueryTimer:
+    def test_keeps_slowest_queries(self):
+        durations = {"fast": 0.0, "slow": 0.02, "medium": 0.01}
+        timer = QueryTimer(keep=2)
+        for sql in durations:
+            timer(lambda sql, *args: time.sleep(durations[sql]), sql, None, False, {})
+        assert timer.count == 3
+        assert timer.seconds >= 0.03
+        assert [sql for _, _, sql in sorted(timer.slowest, reverse=True)] == ["slow", "medium"]
+
+
+class TestRequestProfilingMiddleware:
+    def test_saves_cprofile_stats_for_sampled_requests(self, profiling, client_logged_in, program, user):
+        profiling.REQUEST_PROFILING_SAMPLE_RATE = 1
+        client_logged_in.get(f"/{program.slug}/applicants/")
+        profile = RequestProfile.objects.get()
+        assert (profile.kind, profile.view, profile.status, profile.user) == (
+            "cprofile",
+            "program.ProgramApplicants",
+            200,
+            user,
+        )
+        with profile.file.open("rb") as handle:
+            stats = marshal.load(handle)
+        assert any(function == "get_context_data" for _, _, function in stats)
+
+    def test_saves_sampled_stacks_for_slow_requests(self, profiling, client_logged_in, program, monkeypatch):
+        profiling.REQUEST_PROFILING_SLOW_MS = 1
+        profiling.REQUEST_PROFILING_INTERVAL_MS = 1
+        # Make the request slow enough to be sampled.
+        monkeypatch.setattr("grants.views.program.ProgramHome.get_context_data", slow_context)
+        client_logged_in.get(f"/{program.slug}/")
+        profile = RequestProfile.objects.get()
+        assert (profile.kind, profile.view) == ("stacks", "program.ProgramHome")
+        with profile.file.open("rb") as handle:
+            lines = handle.read().decode().splitlines()
+        assert any("slow_context" in line for line in lines)
+        assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+
+    def test_fast_requests_are_not_saved(self, profiling, client_logged_in, program):
+        profiling.REQUEST_PROFILING_SLOW_MS = 60000
+        client_logged_in.get(f"/{program.slug}/")
+        assert not RequestProfile.objects.exists()
+
+    def test_admin_download_is_staff_only(self, profiling, client, user, program):
+        profiling.REQUEST_PROFILING_SAMPLE_RATE = 1
+        client.force_login(user)
+        client.get(f"/{program.slug}/")
+        profile = RequestProfile.objects.get()
+        url = f"/{profiling.ADMIN_URL}grants/requestprofile/{profile.pk}/download/"
+        assert client.get(url).status_code == 302
+        user.is_staff = user.is_superuser = True
+        user.save()
+        response = client.get(url)
+        assert response.status_code == 200
+        assert response["Content-Disposition"].endswith('.prof"')
+
+
+def slow_context(*args, **kwargs):
+    time.sleep(0.05)
+    return {}
+
+
+class TestStackSampler:
+    def test_only_samples_requests_past_threshold(self):
+        sampler = StackSampler(threshold=60, interval=1)
+        samples = sampler.track(threading.get_ident())
+        sampler.sample()
+        assert not samples
+        sampler.threshold = 0
+        sampler.sample()
+        assert "test_only_samples_requests_past_threshold" in next(iter(samples))
+        sampler.untrack(threading.get_ident())
+        assert not sampler.running
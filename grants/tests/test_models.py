@@ -1,10 +1,14 @@
 from __future__ import annotations
 
+import io
+
 import pytest
 from django.core.exceptions import ValidationError
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError
 from model_bakery import baker
 
-from grants.models import Score
+from grants.models import Answer, Applicant, Program, Question, Score
 
 
 class TestProgramModel:
@@ -44,6 +48,68 @@ class TestProgramModel:
         assert same_name in list(program.applicants_visible_to(user))
 
 
+class TestProgramQuestionsVersion:
+    def test_question_changes_bump_version(self, program):
+        question = baker.make("grants.Question", program=program, type="text")
+        question.question = "Changed"
+        question.save()
+        question.delete()
+        program.refresh_from_db()
+        assert program.questions_version == 3
+
+    def test_saving_stale_program_keeps_version(self, program):
+        baker.make("grants.Question", program=program, type="text")
+        program.name = "Renamed"
+        program.save()
+        program.refresh_from_db()
+        assert (program.name, program.questions_version) == ("Renamed", 1)
+
+
+class TestAnswersVersion:
+    def test_deleting_applicants_bumps_each_integer_question_once(self, program, question, monkeypatch):
+        integer_question = baker.make("grants.Question", program=program, type="integer")
+        applicants = [baker.make("grants.Applicant", program=program, email=f"a{i}@example.com") for i in range(3)]
+        for applicant in applicants:
+            baker.make("grants.Answer", applicant=applicant, question=question, answer="Yes")
+            baker.make("grants.Answer", applicant=applicant, question=integer_question, answer="5")
+        bumped = []
+        monkeypatch.setattr("grants.signals.bump_version", bumped.append)
+        Applicant.objects.filter(program=program).delete()
+        assert [name for name in bumped if name.startswith("question-answers")] == [
+            Question.answers_version(integer_question.id)
+        ]
+
+    def test_saving_answers_bumps_integer_questions_only(self, program, question, applicant, monkeypatch):
+        integer_question = baker.make("grants.Question", program=program, type="integer")
+        bumped = []
+        monkeypatch.setattr("grants.signals.bump_version", bumped.append)
+        Answer.objects.create(applicant=applicant, question=question, answer="Travel")
+        Answer.objects.create(applicant=applicant, question=integer_question, answer="5")
+        assert bumped == [Question.answers_version(integer_question.id)]
+
+    def test_deleting_program_does_not_bump_answers(self, program, question, applicant, monkeypatch):
+        baker.make("grants.Answer", applicant=applicant, question=question, answer="Yes")
+        bumped = []
+        monkeypatch.setattr("grants.signals.bump_version", bumped.append)
+        program.delete()
+        assert not [name for name in bumped if name.startswith("question-answers")]
+
+
+class TestProgressVersion:
+    def test_deleting_applicants_bumps_progress_once(self, program, monkeypatch):
+        baker.make("grants.Applicant", program=program, _quantity=3)
+        bumped = []
+        monkeypatch.setattr("grants.signals.bump_version", bumped.append)
+        program.applicants.all().delete()
+        assert bumped == [Program.progress_version(program.id)]
+
+    def test_deleting_program_does_not_bump_progress(self, program, applicant, monkeypatch):
+        bumped = []
+        monkeypatch.setattr("grants.signals.bump_version", bumped.append)
+        program.delete()
+        assert bumped == []
+
+
 class TestQuestionModel:
     def test_str_returns_question_text(self, question):
         assert str(question) == "Why do you want this grant?"
@@ -114,6 +180,46 @@ class TestQuestionFiltering:
         q = baker.make("grants.Question", program=program, type="boolean", filterable=True)
         assert q.integer_filter_ranges() == []
 
+    def test_integer_filter_ranges_are_cached_until_answers_change(self, program):
+        q = baker.make("grants.Question", program=program, type="integer", filterable=True)
+        a1 = baker.make("grants.Applicant", program=program, email="a1@example.com")
+        a2 = baker.make("grants.Applicant", program=program, email="a2@example.com")
+        answer = baker.make("grants.Answer", applicant=a1, question=q, answer="100")
+        assert q.integer_filter_ranges() == [(100, 100)]
+        # Queryset updates send no signals, so the cached buckets remain.
+        Answer.objects.filter(pk=answer.pk).update(answer_int=200)
+        assert q.integer_filter_ranges() == [(100, 100)]
+        baker.make("grants.Answer", applicant=a2, question=q, answer="300")
+        assert q.integer_filter_ranges() == [(200, 300)]
+        answer.delete()
+        assert q.integer_filter_ranges() == [(300, 300)]
+
+
+class TestAnswerTypedValues:
+    @pytest.mark.parametrize(
+        "text,answer_int,answer_bool",
+        [
+            ("42", 42, None),
+            (" -7 ", -7, None),
+            ("True", None, True),
+            ("False", None, False),
+            ("Travel", None, None),
+            ("", None, None),
+            ("9" * 20, None, None),
+        ],
+    )
+    def test_save_sets_typed_values(self, applicant, question, text, answer_int, answer_bool):
+        answer = baker.make("grants.Answer", applicant=applicant, question=question, answer=text)
+        answer.refresh_from_db()
+        assert (answer.answer_int, answer.answer_bool) == (answer_int, answer_bool)
+
+    def test_save_with_update_fields_keeps_typed_values_in_step(self, applicant, question):
+        answer = baker.make("grants.Answer", applicant=applicant, question=question, answer="1")
+        answer.answer = "2"
+        answer.save(update_fields=["answer"])
+        answer.refresh_from_db()
+        assert answer.answer_int == 2
+
 
 class TestApplicantModel:
     def test_str_returns_name(self, applicant):
@@ -145,6 +251,162 @@ class TestApplicantModel:
         assert applicant.stdev() == variance**0.5
 
 
+class TestApplicantScoreStats:
+    def test_with_score_stats_with_no_scores(self, applicant, user):
+        annotated = Applicant.objects.with_score_stats(user).get(pk=applicant.pk)
+        assert annotated.score_count == 0
+        assert annotated.score_average is None
+        assert annotated.score_stdev == 0
+        assert annotated.has_scored is False
+
+    def test_with_score_stats_matches_python_stats(self, applicant, user, other_user):
+        baker.make("grants.Score", applicant=applicant, user=user, score=2.0)
+        baker.make("grants.Score", applicant=applicant, user=other_user, score=4.0)
+        annotated = Applicant.objects.with_score_stats(user).get(pk=applicant.pk)
+        assert annotated.score_count == 2
+        assert annotated.score_average == applicant.average_score()
+        assert annotated.score_stdev == pytest.approx(applicant.stdev())
+        assert annotated.has_scored is True
+
+    def test_with_score_stats_ignores_blank_scores(self, applicant, user, other_user):
+        baker.make("grants.Score", applicant=applicant, user=user, score=4.0)
+        baker.make("grants.Score", applicant=applicant, user=other_user, score=None)
+        annotated = Applicant.objects.with_score_stats(user).get(pk=applicant.pk)
+        assert annotated.score_count == 2
+        assert annotated.score_average == 4.0
+        assert annotated.score_stdev == 0
+
+    def test_with_score_stats_has_scored_is_per_user(self, applicant, user, other_user):
+        baker.make("grants.Score", applicant=applicant, user=other_user, score=4.0)
+        annotated = Applicant.objects.with_score_stats(user).get(pk=applicant.pk)
+        assert annotated.score_count == 1
+        assert annotated.has_scored is False
+
+    def test_order_by_score_puts_unscored_last(self, program, user):
+        low = baker.make("grants.Applicant", program=program, email="low@example.com")
+        high = baker.make("grants.Applicant", program=program, email="high@example.com")
+        unscored = baker.make("grants.Applicant", program=program, email="unscored@example.com")
+        baker.make("grants.Score", applicant=low, user=user, score=2.0)
+        baker.make("grants.Score", applicant=high, user=user, score=5.0)
+        ordered = list(program.applicants.with_score_stats(user).order_by_score())
+        assert ordered == [high, low, unscored]
+
+
+class TestApplicantRandom:
+    def test_random_of_empty_queryset_is_none(self, program):
+        assert program.applicants.random() is None
+
+    def test_random_picks_applicant_at_offset(self, program, monkeypatch):
+        applicants = [baker.make("grants.Applicant", program=program, email=f"a{i}@example.com") for i in range(3)]
+        candidates = program.applicants.exclude(pk=applicants[1].pk)
+        monkeypatch.setattr("grants.models.random.randrange", lambda count: count - 1)
+        assert candidates.random() == applicants[2]
+        monkeypatch.setattr("grants.models.random.randrange", lambda count: 0)
+        assert candidates.random() == applicants[0]
+
+    def test_random_ignores_gaps_in_ids(self, program, monkeypatch):
+        applicants = [baker.make("grants.Applicant", program=program, email=f"a{i}@example.com") for i in range(4)]
+        Applicant.objects.filter(pk__in=[applicants[1].pk, applicants[2].pk]).delete()
+        offsets = []
+        monkeypatch.setattr("grants.models.random.randrange", lambda count: offsets.append(count) or 1)
+        assert program.applicants.random() == applicants[3]
+        assert offsets == [2]
+
+    def test_random_runs_two_queries(self, program, django_assert_num_queries):
+        for i in range(5):
+            baker.make("grants.Applicant", program=program, email=f"a{i}@example.com")
+        with django_assert_num_queries(2):
+            assert program.applicants.random() is not None
+
+
+class TestApplicantScoreSummary:
+    def summary(self, applicant):
+        applicant.refresh_from_db()
+        return (applicant.score_count, applicant.score_value_count, applicant.score_sum, applicant.score_sum_squares)
+
+    def test_saving_scores_updates_summary(self, applicant, user, other_user):
+        score = baker.make("grants.Score", applicant=applicant, user=user, score=2.0)
+        baker.make("grants.Score", applicant=applicant, user=other_user, score=None)
+        assert self.summary(applicant) == (2, 1, 2.0, 4.0)
+        score = Score.objects.get(pk=score.pk)
+        score.score = 4.0
+        score.save()
+        assert self.summary(applicant) == (2, 1, 4.0, 16.0)
+
+    def test_saving_other_fields_leaves_summary(self, applicant, user):
+        score = baker.make("grants.Score", applicant=applicant, user=user, score=3.0)
+        score.comment = "Good"
+        score.save(update_fields=["comment"])
+        assert self.summary(applicant) == (1, 1, 3.0, 9.0)
+
+    def test_deleting_scores_updates_summary(self, applicant, user, other_user):
+        score = baker.make("grants.Score", applicant=applicant, user=user, score=2.0)
+        baker.make("grants.Score", applicant=applicant, user=other_user, score=5.0)
+        Score.objects.get(pk=score.pk).delete()
+        assert self.summary(applicant) == (1, 1, 5.0, 25.0)
+        other_user.delete()
+        assert self.summary(applicant) == (0, 0, 0.0, 0.0)
+
+    def test_deferred_score_falls_back_to_refresh(self, applicant, user):
+        baker.make("grants.Score", applicant=applicant, user=user, score=2.0)
+        score = Score.objects.defer("score").get()
+        score.score = 3.0
+        score.save()
+        assert self.summary(applicant) == (1, 1, 3.0, 9.0)
+
+    def test_refresh_score_summaries_recalculates(self, applicant, user, other_user):
+        baker.make("grants.Score", applicant=applicant, user=user, score=2.0)
+        baker.make("grants.Score", applicant=applicant, user=other_user, score=3.0)
+        Applicant.objects.update(score_count=0, score_value_count=0, score_sum=0, score_sum_squares=0)
+        assert Applicant.objects.refresh_score_summaries() == 1
+        assert self.summary(applicant) == (2, 2, 5.0, 13.0)
+
+    def test_rebuild_command(self, program, applicant, user):
+        baker.make("grants.Score", applicant=applicant, user=user, score=4.0)
+        Applicant.objects.update(score_count=0, score_value_count=0, score_sum=0, score_sum_squares=0)
+        call_command("rebuild_score_summaries", program.slug, stdout=io.StringIO())
+        assert self.summary(applicant) == (1, 1, 4.0, 16.0)
+
+    def test_rebuild_command_rejects_unknown_program(self, db):
+        with pytest.raises(CommandError):
+            call_command("rebuild_score_summaries", "nope", stdout=io.StringIO())
+
+
+class TestApplicantEmail:
+    def test_save_normalises_email(self, program):
+        applicant = baker.make("grants.Applicant", program=program, email=" Ada@Example.com")
+        assert applicant.email_normalised == "ada@example.com"
+
+    def test_duplicate_email_rejected_by_database(self, program):
+        baker.make("grants.Applicant", program=program, email="ada@example.com")
+        with pytest.raises(IntegrityError):
+            baker.make("grants.Applicant", program=program, email="ADA@example.com")
+
+    def test_duplicate_email_allowed_when_program_allows_it(self, program):
+        program.duplicate_emails = True
+        program.save()
+        baker.make("grants.Applicant", program=program, email="ada@example.com", _quantity=2)
+        assert program.applicants.count() == 2
+
+    def test_turning_duplicates_off_keeps_existing_duplicates(self, program):
+        program.duplicate_emails = True
+        program.save()
+        first, second = baker.make("grants.Applicant", program=program, email="ada@example.com", _quantity=2)
+        program.duplicate_emails = False
+        program.save()
+        assert list(program.applicants.filter(email_unique=True)) == [first]
+        with pytest.raises(IntegrityError):
+            baker.make("grants.Applicant", program=program, email="ada@example.com")
+
+    def test_saving_stale_applicant_keeps_score_summary(self, applicant, user):
+        stale = Applicant.objects.get(pk=applicant.pk)
+        baker.make("grants.Score", applicant=applicant, user=user, score=3.0)
+        stale.status = "accepted"
+        stale.save()
+        applicant.refresh_from_db()
+        assert (applicant.status, applicant.score_count) == ("accepted", 1)
+
+
 class TestScoreModel:
     def test_score_history_human_formats_correctly(self, score):
         score.score_history = "3.0,4.0,5.0"
@@ -210,3 +472,13 @@ class TestResourceModel:
         )
         assert resource.amount_allocated() == 300
         assert resource.amount_remaining() == 700
+
+    def test_with_allocation_totals(self, program, resource, applicant):
+        other = baker.make("grants.Applicant", program=program, email="other@example.com")
+        baker.make("grants.Allocation", applicant=applicant, resource=resource, amount=300)
+        baker.make("grants.Allocation", applicant=other, resource=resource, amount=200)
+        unused = baker.make("grants.Resource", program=program, name="Tickets", type="ticket", amount=5)
+        totals = {
+            r.pk: (r.amount_allocated(), r.amount_remaining()) for r in program.resources.with_allocation_totals()
+        }
+        assert totals == {resource.pk: (500, 500), unused.pk: (0, 5)}
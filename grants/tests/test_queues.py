@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+from model_bakery import baker
+
+from grants.queues import ScoringQueue
+
+
+def make_applicants(program, count):
+    return [baker.make("grants.Applicant", program=program, email=f"a{i}@example.com") for i in range(count)]
+
+
+class TestScoringQueue:
+    def test_empty_program_has_no_next(self, program, user):
+        assert ScoringQueue(program, user).next() is None
+
+    def test_least_scored_applicants_come_first(self, program, user, other_user):
+        scored, unscored = make_applicants(program, 2)
+        baker.make("grants.Score", applicant=scored, user=other_user, score=3)
+        assert ScoringQueue(program, user).next() == unscored.pk
+
+    def test_skips_applicants_scored_since_queue_was_built(self, program, user):
+        applicants = make_applicants(program, 3)
+        queue = ScoringQueue(program, user)
+        first = queue.next()
+        baker.make("grants.Score", applicant_id=first, user=user, score=3)
+        second = queue.next()
+        assert second != first
+        baker.make("grants.Score", applicant_id=second, user=user, score=3)
+        third = queue.next()
+        assert {first, second, third} == {applicant.pk for applicant in applicants}
+        baker.make("grants.Score", applicant_id=third, user=user, score=3)
+        assert queue.next() is None
+
+    def test_exclude_leaves_applicant_in_queue(self, program, user):
+        first, second = make_applicants(program, 2)
+        queue = ScoringQueue(program, user)
+        head = queue.next()
+        other = queue.next(exclude=head)
+        assert {head, other} == {first.pk, second.pk}
+        assert queue.next() == head
+        assert queue.next(exclude=head) == other
+
+    def test_rebuilds_to_pick_up_new_applicants(self, program, user):
+        (applicant,) = make_applicants(program, 1)
+        queue = ScoringQueue(program, user)
+        assert queue.next() == applicant.pk
+        baker.make("grants.Score", applicant=applicant, user=user, score=3)
+        late = baker.make("grants.Applicant", program=program, email="late@example.com")
+        assert queue.next() == late.pk
+
+    def test_skips_own_and_rejected_applications(self, program, user):
+        baker.make("grants.Applicant", program=program, email=user.email)
+        baker.make("grants.Applicant", program=program, email="r@example.com", status="rejected")
+        assert ScoringQueue(program, user).next() is None
@@ -0,0 +1,203 @@
+from __future__ import annotations
+
+import datetime
+
+import pytest
+from django.core.files.base import ContentFile
+from django.db.models import F
+from django.utils import timezone
+from model_bakery import baker
+
+from grants import tasks
+from grants.models import Applicant, Question, Score, UploadedCSV
+
+
+def make_upload(program, user, kind, csv, target_map, **kwargs):
+    return baker.make(
+        "grants.UploadedCSV",
+        program=program,
+        uploaded_by=user,
+        kind=kind,
+        file=ContentFile(csv.encode(), name="upload.csv"),
+        target_map=target_map,
+        status="queued",
+        **kwargs,
+    )
+
+
+@pytest.mark.usefixtures("media_root")
+class TestImportCsv:
+    def test_imports_applicants_in_chunks(self, program, user, question, monkeypatch):
+        monkeypatch.setattr(tasks, "IMPORT_CHUNK_SIZE", 2)
+        csv = "Name,Email,Answer\n" + "".join(f"N{i},n{i}@example.com,A{i}\n" for i in range(5))
+        upload = make_upload(program, user, "applicants", csv, {"name": 0, "email": 1, f"q{question.id}": 2})
+        tasks.import_csv(upload.pk)
+        upload.refresh_from_db()
+        assert upload.status == "complete"
+        assert (upload.rows_total, upload.checkpoint, upload.successful, upload.error_count) == (5, 5, 5, 0)
+        assert not upload.file
+        assert Applicant.objects.count() == 5
+
+    def test_continues_in_a_new_task_after_enough_chunks(self, program, user, question, monkeypatch):
+        monkeypatch.setattr(tasks, "IMPORT_CHUNK_SIZE", 2)
+        monkeypatch.setattr(tasks, "IMPORT_CHUNKS_PER_TASK", 2)
+        enqueued = []
+        monkeypatch.setattr(tasks, "async_task", lambda func, *args, **kwargs: enqueued.append(args))
+        csv = "Name,Email,Answer\n" + "".join(f"N{i},n{i}@example.com,A{i}\n" for i in range(5))
+        upload = make_upload(program, user, "applicants", csv, {"name": 0, "email": 1, f"q{question.id}": 2})
+        tasks.import_csv(upload.pk)
+        upload.refresh_from_db()
+        assert (upload.status, upload.checkpoint) == ("queued", 4)
+        assert enqueued == [(upload.pk,)]
+        tasks.import_csv(upload.pk)
+        upload.refresh_from_db()
+        assert (upload.status, upload.checkpoint) == ("complete", 5)
+        assert len(enqueued) == 1
+        assert Applicant.objects.count() == 5
+
+    def test_keeps_only_the_first_errors(self, program, user, monkeypatch):
+        monkeypatch.setattr(tasks, "IMPORT_CHUNK_SIZE", 2)
+        monkeypatch.setattr(tasks, "IMPORT_MAX_ERRORS", 3)
+        csv = "Name,Email\n" + "".join(f",n{i}@example.com\n" for i in range(5))
+        upload = make_upload(program, user, "applicants", csv, {"name": 0, "email": 1})
+        tasks.import_csv(upload.pk)
+        upload.refresh_from_db()
+        assert upload.error_count == 5
+        assert [index for index, _, _ in upload.errors] == [0, 1, 2]
+
+    def test_resumes_from_checkpoint(self, program, user, question):
+        csv = "Name,Email,Answer\nAda,ada@example.com,A\nGrace,grace@example.com,B\nAda,ADA@example.com,C\n"
+        upload = make_upload(
+            program,
+            user,
+            "applicants",
+            csv,
+            {"name": 0, "email": 1, f"q{question.id}": 2},
+            checkpoint=1,
+            successful=1,
+        )
+        tasks.import_csv(upload.pk)
+        upload.refresh_from_db()
+        # Only the rows after the checkpoint are imported, but the skipped
+        # row still counts towards duplicate detection.
+        assert list(Applicant.objects.values_list("email", flat=True)) == ["grace@example.com"]
+        assert upload.successful == 2
+        assert upload.error_count == 1
+        assert "Duplicate email" in upload.errors[0][2]
+
+    def test_imports_scores_for_uploader(self, program, user, applicant):
+        csv = f"Email,Score,Comment\n{applicant.email},4,Nice\nmissing@example.com,3,\n"
+        upload = make_upload(program, user, "scores", csv, {"email": 0, "score": 1, "comment": 2})
+        tasks.import_csv(upload.pk)
+        upload.refresh_from_db()
+        score = Score.objects.get(applicant=applicant, user=user)
+        assert (score.score, score.comment) == (4.0, "Nice")
+        assert upload.successful == 1
+        assert upload.errors[0][0] == 1
+
+    def test_reads_quoted_multiline_cells_and_skips_blank_lines(self, program, user, question):
+        csv = 'Name,Email,Answer\n\nAda,ada@example.com,"Line one\nLine two"\n\n'
+        upload = make_upload(program, user, "applicants", csv, {"name": 0, "email": 1, f"q{question.id}": 2})
+        tasks.import_csv(upload.pk)
+        upload.refresh_from_db()
+        assert upload.rows_total == 1
+        assert Applicant.objects.get().answers.get().answer == "Line one\nLine two"
+
+    def test_running_imports_are_not_started_again(self, program, user):
+        upload = make_upload(program, user, "applicants", "Name,Email\nAda,ada@example.com\n", {"name": 0, "email": 1})
+        UploadedCSV.objects.filter(pk=upload.pk).update(status="running")
+        tasks.import_csv(upload.pk)
+        assert not Applicant.objects.exists()
+
+    def test_stops_when_another_task_moves_the_checkpoint_on(self, program, user, monkeypatch):
+        monkeypatch.setattr(tasks, "IMPORT_CHUNK_SIZE", 2)
+        csv = "Name,Email\n" + "".join(f"N{i},n{i}@example.com\n" for i in range(5))
+        upload = make_upload(program, user, "applicants", csv, {"name": 0, "email": 1})
+        chunked = tasks.chunked
+
+        def other_task_imports_second_chunk(rows, size):
+            for number, chunk in enumerate(chunked(rows, size)):
+                if number == 1:
+                    UploadedCSV.objects.filter(pk=upload.pk).update(checkpoint=F("checkpoint") + len(chunk))
+                yield chunk
+
+        monkeypatch.setattr(tasks, "chunked", other_task_imports_second_chunk)
+        tasks.import_csv(upload.pk)
+        upload.refresh_from_db()
+        assert (upload.status, upload.checkpoint, upload.successful) == ("running", 4, 2)
+        assert Applicant.objects.count() == 2
+
+    def test_finished_imports_are_not_rerun(self, program, user, question):
+        upload = make_upload(program, user, "applicants", "Name,Email\nAda,ada@example.com\n", {"name": 0, "email": 1})
+        upload.status = "complete"
+        upload.save()
+        tasks.import_csv(upload.pk)
+        assert not Applicant.objects.exists()
+
+
+class TestSaveApplication:
+    def test_bumps_versions_of_integer_answers_only(self, program, question, monkeypatch):
+        integer_question = baker.make("grants.Question", program=program, type="integer")
+        bumped = []
+        monkeypatch.setattr(tasks, "bump_version", bumped.append)
+        answers = {question.id: "Travel", integer_question.id: "12"}
+        tasks.save_application(program.id, "Ada", "ada@example.com", timezone.now(), answers, program=program)
+        assert bumped == [Question.answers_version(integer_question.id)]
+
+    def test_saves_applicant_and_answers(self, program, question):
+        applied = timezone.now()
+        applicant = tasks.save_application(program.id, "Ada", "ada@example.com", applied, {question.id: "Travel"})
+        assert (applicant.name, applicant.applied) == ("Ada", applied)
+        assert applicant.answers.get().answer == "Travel"
+
+    def test_drops_duplicate_email(self, program, question, applicant):
+        result = tasks.save_application(program.id, "Again", applicant.email, timezone.now(), {question.id: "Travel"})
+        assert result is None
+        assert Applicant.objects.filter(email=applicant.email).count() == 1
+
+    def test_drops_duplicate_email_differing_in_case(self, program, question, applicant):
+        email = applicant.email.upper()
+        assert tasks.save_application(program.id, "Again", email, timezone.now(), {question.id: "Travel"}) is None
+        assert program.applicants.count() == 1
+
+    def test_drops_application_that_loses_race(self, program, question, applicant, monkeypatch):
+        # Miss the existing applicant on the first check, as if it was
+        # saved between that check and the insert.
+        real_filter = Applicant.objects.filter
+        calls = []
+
+        def filter(**kwargs):
+            calls.append(kwargs)
+            return Applicant.objects.none() if len(calls) == 1 else real_filter(**kwargs)
+
+        monkeypatch.setattr(Applicant.objects, "filter", filter)
+        result = tasks.save_application(program.id, "Again", applicant.email, timezone.now(), {question.id: "Travel"})
+        assert result is None
+        assert len(calls) == 2
+        assert program.applicants.count() == 1
+
+
+class TestUploadedCSVStalled:
+    def test_running_import_without_progress_is_stalled(self, program):
+        upload = baker.make("grants.UploadedCSV", program=program, status="running")
+        assert upload.is_stalled() is False
+        UploadedCSV.objects.filter(pk=upload.pk).update(updated=timezone.now() - datetime.timedelta(hours=1))
+        upload.refresh_from_db()
+        assert upload.is_stalled() is True
+
+    @pytest.mark.parametrize("status", ["uploaded", "queued", "complete", "failed"])
+    def test_idle_or_finished_imports_are_not_stalled(self, program, status):
+        upload = baker.make("grants.UploadedCSV", program=program, status=status)
+        UploadedCSV.objects.filter(pk=upload.pk).update(updated=timezone.now() - datetime.timedelta(hours=1))
+        upload.refresh_from_db()
+        assert upload.is_stalled() is False
+
+    def test_resume_reenqueues_stalled_import(self, client_logged_in, program, monkeypatch):
+        enqueued = []
+        monkeypatch.setattr("grants.views.bulk_load.async_task", lambda func, *args, **kwargs: enqueued.append(args))
+        upload = baker.make("grants.UploadedCSV", program=program, kind="applicants", status="running")
+        UploadedCSV.objects.filter(pk=upload.pk).update(updated=timezone.now() - datetime.timedelta(hours=1))
+        response = client_logged_in.post(upload.urls.status)
+        assert response.json()["status"] == "queued"
+        client_logged_in.post(upload.urls.status)
+        assert enqueued == [(upload.pk,)]
@@ -1,9 +1,18 @@
 from __future__ import annotations
 
+import csv
+import datetime
+import io
+
 import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from model_bakery import baker
 
 from grants.models import Applicant, Program, Score
+from grants.views.program import ProgramApplicants
 
 
 class TestIndexView:
@@ -27,6 +36,47 @@ class TestProgramHomeView:
         response = client_logged_in.get(f"/{program.slug}/")
         assert response.status_code == 200
 
+    def test_unknown_program_returns_404(self, client_logged_in):
+        response = client_logged_in.get("/no-such-program/")
+        assert response.status_code == 404
+
+    def test_vote_counts_skip_own_application_and_rejected(self, client_logged_in, program, user, other_user):
+        program.users.add(other_user)
+        pending = baker.make("grants.Applicant", program=program, email="a@example.com")
+        rejected = baker.make("grants.Applicant", program=program, email="b@example.com", status="rejected")
+        own = baker.make("grants.Applicant", program=program, email=other_user.email.upper())
+        for applicant in [pending, rejected, own]:
+            baker.make("grants.Score", applicant=applicant, user=other_user, score=3)
+        baker.make("grants.Score", applicant=own, user=user, score=3)
+        response = client_logged_in.get(f"/{program.slug}/")
+        votes = {u.pk: u.num_votes for u in response.context["users"]}
+        assert votes == {user.pk: 1, other_user.pk: 1}
+        assert response.context["num_applicants"] == 2
+        assert response.context["num_scored"] == 1
+        assert response.context["num_scored_by_anyone"] == 2
+
+    def test_query_count_does_not_grow_with_reviewers(self, client_logged_in, program):
+        def count_queries():
+            with CaptureQueriesContext(connection) as queries:
+                client_logged_in.get(f"/{program.slug}/")
+            return len(queries)
+
+        count_queries()  # Fill the progress cache.
+        before = count_queries()
+        for i in range(5):
+            program.users.add(baker.make("users.User", email=f"reviewer{i}@example.com"))
+        assert count_queries() == before
+
+    def test_progress_is_refreshed_when_scores_change(self, client_logged_in, program, user):
+        applicant = baker.make("grants.Applicant", program=program, email="a@example.com")
+        assert client_logged_in.get(f"/{program.slug}/").context["num_scored"] == 0
+        score = baker.make("grants.Score", applicant=applicant, user=user, score=3)
+        assert client_logged_in.get(f"/{program.slug}/").context["num_scored"] == 1
+        score.delete()
+        assert client_logged_in.get(f"/{program.slug}/").context["num_scored"] == 0
+        baker.make("grants.Applicant", program=program, email="b@example.com")
+        assert client_logged_in.get(f"/{program.slug}/").context["num_applicants"] == 2
+
 
 class TestProgramApplyView:
     def test_apply_page_accessible_without_login(self, client, program):
@@ -57,6 +107,65 @@ class TestProgramApplyView:
         assert response.status_code == 200  # Form re-displayed with errors
         assert Applicant.objects.filter(email=applicant.email).count() == 1
 
+    def test_apply_saves_answers(self, client, program, question, boolean_question):
+        data = {"name": "New", "email": "new@example.com", f"question-{question.id}": "Travel"}
+        data[f"question-{boolean_question.id}"] = "on"
+        client.post(f"/{program.slug}/apply/", data)
+        applicant = Applicant.objects.get(email="new@example.com")
+        answers = {answer.question_id: (answer.answer, answer.answer_bool) for answer in applicant.answers.all()}
+        assert answers == {question.id: ("Travel", None), boolean_question.id: ("True", True)}
+
+    def test_apply_async_enqueues_application(self, client, program, question, settings, monkeypatch):
+        settings.APPLY_ASYNC = True
+        enqueued = []
+        monkeypatch.setattr("grants.views.program.async_task", lambda func, *args, **kwargs: enqueued.append(args))
+        response = client.post(
+            f"/{program.slug}/apply/",
+            {"name": "New", "email": "new@example.com", f"question-{question.id}": "Travel"},
+        )
+        assert response.url == program.urls.apply_success
+        assert not Applicant.objects.exists()
+        ((program_id, name, email, _, answers),) = enqueued
+        assert (program_id, name, email, answers) == (program.id, "New", "new@example.com", {question.id: "Travel"})
+
+    @pytest.mark.usefixtures("sync_tasks")
+    def test_apply_async_saves_application_in_task(self, client, program, question, settings):
+        settings.APPLY_ASYNC = True
+        client.post(
+            f"/{program.slug}/apply/",
+            {"name": "New", "email": "new@example.com", f"question-{question.id}": "Travel"},
+        )
+        assert Applicant.objects.get(email="new@example.com").answers.get().answer == "Travel"
+
+    def test_form_class_is_reused_until_questions_change(self, client, program, question):
+        form_class = client.get(f"/{program.slug}/apply/").context["form"].__class__
+        assert client.get(f"/{program.slug}/apply/").context["form"].__class__ is form_class
+        baker.make("grants.Question", program=program, type="integer", question="How far?", order=2)
+        form = client.get(f"/{program.slug}/apply/").context["form"]
+        assert form.__class__ is not form_class
+        assert [field.label for field in form] == ["Name", "Email", question.question, "How far?"]
+        question.delete()
+        form = client.get(f"/{program.slug}/apply/").context["form"]
+        assert [field.label for field in form] == ["Name", "Email", "How far?"]
+
+    def test_apply_query_count(self, client, program, django_assert_num_queries):
+        questions = baker.make("grants.Question", program=program, type="text", _quantity=15)
+        data = {"name": "New", "email": "new@example.com"}
+        data.update((f"question-{question.id}", "Travel") for question in questions)
+        client.get(f"/{program.slug}/apply/")
+        # The program, the duplicate check in the form and again in the
+        # transaction, the applicant, bumping the progress version and the
+        # answers, however many questions there are.
+        with django_assert_num_queries(12):
+            client.post(f"/{program.slug}/apply/", data)
+        assert Applicant.objects.get(email="new@example.com").answers.count() == 15
+
+    def test_cached_form_class_skips_questions_query(self, client, program, question, django_assert_num_queries):
+        client.get(f"/{program.slug}/apply/")
+        # Just the program.
+        with django_assert_num_queries(1):
+            client.get(f"/{program.slug}/apply/")
+
 
 class TestProgramApplicantsView:
     def test_requires_authentication(self, client, program):
@@ -68,6 +177,167 @@ class TestProgramApplicantsView:
         assert response.status_code == 200
         assert applicant.name in response.content.decode()
 
+    def test_sort_by_score(self, client_logged_in, program, user):
+        low = baker.make("grants.Applicant", program=program, name="LowScore", email="low@example.com")
+        high = baker.make("grants.Applicant", program=program, name="HighScore", email="high@example.com")
+        baker.make("grants.Score", applicant=low, user=user, score=2.0)
+        baker.make("grants.Score", applicant=high, user=user, score=5.0)
+        response = client_logged_in.get(f"/{program.slug}/applicants/?sort=score")
+        assert list(response.context["applicants"]) == [high, low]
+
+    def test_sort_by_score_count(self, client_logged_in, program, user, other_user):
+        many = baker.make("grants.Applicant", program=program, name="Many", email="many@example.com")
+        few = baker.make("grants.Applicant", program=program, name="Few", email="few@example.com")
+        baker.make("grants.Score", applicant=many, user=user, score=3.0)
+        baker.make("grants.Score", applicant=many, user=other_user, score=4.0)
+        baker.make("grants.Score", applicant=few, user=user, score=3.0)
+        response = client_logged_in.get(f"/{program.slug}/applicants/?sort=scores")
+        applicants = list(response.context["applicants"])
+        assert applicants == [few, many]
+        assert applicants[1].score_count == 2
+        assert applicants[1].score_average == 3.5
+
+
+class TestProgramApplicantsPagination:
+    @pytest.fixture(autouse=True)
+    def small_pages(self, monkeypatch):
+        monkeypatch.setattr(ProgramApplicants, "paginate_by", 2)
+
+    def walk_pages(self, client, url):
+        """Follows next links from url, returning the applicants on each page."""
+        pages = []
+        while url:
+            response = client.get(url)
+            pages.append(list(response.context["applicants"]))
+            next_url = response.context["next_page_url"]
+            url = response.request["PATH_INFO"] + next_url if next_url else None
+        return pages
+
+    def test_pages_by_applied_date(self, client_logged_in, program):
+        now = timezone.now()
+        applicants = [
+            baker.make(
+                "grants.Applicant",
+                program=program,
+                email=f"a{i}@example.com",
+                applied=now - datetime.timedelta(days=i),
+            )
+            for i in range(5)
+        ]
+        undated = baker.make("grants.Applicant", program=program, email="undated@example.com", applied=None)
+        pages = self.walk_pages(client_logged_in, f"/{program.slug}/applicants/")
+        assert pages == [applicants[0:2], applicants[2:4], [applicants[4], undated]]
+
+    def test_pages_by_score_with_ties(self, client_logged_in, program, user):
+        applied = timezone.now()
+        applicants = [
+            baker.make("grants.Applicant", program=program, email=f"a{i}@example.com", applied=applied)
+            for i in range(5)
+        ]
+        for applicant in applicants[:3]:
+            baker.make("grants.Score", applicant=applicant, user=user, score=3.0)
+        pages = self.walk_pages(client_logged_in, f"/{program.slug}/applicants/?sort=score")
+        seen = [applicant for page in pages for applicant in page]
+        assert len(seen) == 5
+        assert set(seen) == set(applicants)
+        assert set(seen[:3]) == set(applicants[:3])
+
+    def test_pages_by_score_count(self, client_logged_in, program, user):
+        applicants = [baker.make("grants.Applicant", program=program, email=f"a{i}@example.com") for i in range(3)]
+        baker.make("grants.Score", applicant=applicants[0], user=user, score=3.0)
+        pages = self.walk_pages(client_logged_in, f"/{program.slug}/applicants/?sort=scores")
+        assert [len(page) for page in pages] == [2, 1]
+        assert pages[-1] == [applicants[0]]
+
+    def test_previous_link_returns_to_earlier_page(self, client_logged_in, program):
+        for i in range(3):
+            baker.make("grants.Applicant", program=program, email=f"a{i}@example.com")
+        first = client_logged_in.get(f"/{program.slug}/applicants/")
+        assert first.context["previous_page_url"] is None
+        second = client_logged_in.get(f"/{program.slug}/applicants/" + first.context["next_page_url"])
+        back = client_logged_in.get(f"/{program.slug}/applicants/" + second.context["previous_page_url"])
+        assert list(back.context["applicants"]) == list(first.context["applicants"])
+
+    def test_page_links_keep_filters(self, client_logged_in, program, user):
+        program.created_by = user
+        program.save()
+        q = baker.make("grants.Question", program=program, type="boolean", filterable=True)
+        for i in range(3):
+            applicant = baker.make("grants.Applicant", program=program, email=f"a{i}@example.com")
+            baker.make("grants.Answer", applicant=applicant, question=q, answer="True")
+        response = client_logged_in.get(f"/{program.slug}/applicants/?sort=score&q{q.id}=yes")
+        next_url = response.context["next_page_url"]
+        assert "sort=score" in next_url
+        assert f"q{q.id}=yes" in next_url
+
+    def test_invalid_cursor_shows_first_page(self, client_logged_in, program, applicant):
+        response = client_logged_in.get(f"/{program.slug}/applicants/?after=not-a-cursor")
+        assert response.status_code == 200
+        assert list(response.context["applicants"]) == [applicant]
+
+
+class TestProgramApplicantsCsv:
+    def read_csv(self, response):
+        content = b"".join(response.streaming_content).decode()
+        return list(csv.reader(io.StringIO(content)))
+
+    def test_exports_applicants_with_answers(self, client_logged_in, program, question, boolean_question, applicant):
+        baker.make("grants.Answer", applicant=applicant, question=question, answer="Travel costs")
+        response = client_logged_in.get(f"/{program.slug}/applicants/csv/")
+        assert response.status_code == 200
+        assert response["Content-Type"] == "text/csv"
+        rows = self.read_csv(response)
+        assert rows[0] == ["Email", "Name", "Has Scored", "Average Score", question.question, boolean_question.question]
+        assert rows[1] == [applicant.email, applicant.name, "False", "-1", "Travel costs", ""]
+
+    def test_shows_average_once_scored(self, client_logged_in, program, applicant, user, other_user):
+        baker.make("grants.Score", applicant=applicant, user=user, score=3.0)
+        baker.make("grants.Score", applicant=applicant, user=other_user, score=4.0)
+        rows = self.read_csv(client_logged_in.get(f"/{program.slug}/applicants/csv/"))
+        assert rows[1][2:4] == ["True", "3.5"]
+
+    def test_excludes_rejected_applicants(self, client_logged_in, program):
+        baker.make("grants.Applicant", program=program, email="rejected@example.com", status="rejected")
+        rows = self.read_csv(client_logged_in.get(f"/{program.slug}/applicants/csv/"))
+        assert rows[1:] == []
+
+    def test_query_count_does_not_grow_with_applicants(self, client_logged_in, program, question, boolean_question):
+        def count_queries():
+            with CaptureQueriesContext(connection) as queries:
+                self.read_csv(client_logged_in.get(f"/{program.slug}/applicants/csv/"))
+            return len(queries)
+
+        applicant = baker.make("grants.Applicant", program=program, email="first@example.com")
+        baker.make("grants.Answer", applicant=applicant, question=question, answer="Yes")
+        baseline = count_queries()
+        for i in range(10):
+            applicant = baker.make("grants.Applicant", program=program, email=f"a{i}@example.com")
+            baker.make("grants.Answer", applicant=applicant, question=question, answer="Yes")
+            baker.make("grants.Answer", applicant=applicant, question=boolean_question, answer="True")
+        assert count_queries() == baseline
+
+
+class TestBulkStatusChanges:
+    def test_manager_can_bulk_reject(self, manager_client, program, applicant):
+        response = manager_client.post(f"/{program.slug}/applicants/bulk-reject/", {"applicant_ids": [applicant.id]})
+        assert response.status_code == 302
+        applicant.refresh_from_db()
+        assert applicant.status == "rejected"
+
+    def test_non_manager_is_turned_away_before_anything_changes(self, client_logged_in, program, applicant):
+        response = client_logged_in.post(f"/{program.slug}/applicants/bulk-reject/", {"applicant_ids": [applicant.id]})
+        assert response.status_code == 404
+        applicant.refresh_from_db()
+        assert applicant.status == "pending"
+
+    def test_non_staff_cannot_mark_speakers(self, client_logged_in, program, applicant):
+        response = client_logged_in.post(
+            f"/{program.slug}/applicants/bulk-speaker/", {"applicant_ids": [applicant.id], "action": "mark_speaker"}
+        )
+        assert response.status_code == 404
+        applicant.refresh_from_db()
+        assert applicant.applied_to_speak is False
+
 
 class TestProgramApplicantsFilters:
     """Filter UI is only shown to managers; make user the program manager."""
@@ -185,6 +455,57 @@ class TestApplicantViewAndScoring:
         assert score.score == 5.0
         assert "3.0" in score.score_history
 
+    def test_shows_answers_and_scores(self, client_logged_in, program, applicant, question, user, other_user):
+        baker.make("grants.Answer", applicant=applicant, question=question, answer="To learn")
+        baker.make("grants.Score", applicant=applicant, user=user, score=3.0)
+        baker.make("grants.Score", applicant=applicant, user=other_user, score=5.0, comment="Strong")
+        body = client_logged_in.get(f"/{program.slug}/applicants/{applicant.id}/").content.decode()
+        assert "To learn" in body
+        assert str(other_user) in body
+        assert "Strong" in body
+
+    # Session, user, program with membership, applicant, questions,
+    # answers and scores.
+    QUERY_BUDGET = 7
+    # Unscored applicants also get the next one to score from the scoring
+    # queue: reading it from the cache and checking its head. A cold queue
+    # is built and written to the cache too, which is several queries with
+    # the database cache.
+    UNSCORED_WARM_QUERY_BUDGET = QUERY_BUDGET + 2
+    UNSCORED_COLD_QUERY_BUDGET = UNSCORED_WARM_QUERY_BUDGET + 6
+
+    @pytest.mark.parametrize("extra", [0, 10])
+    def test_query_budget(self, client_logged_in, program, applicant, user, django_assert_max_num_queries, extra):
+        for i in range(extra):
+            question = baker.make("grants.Question", program=program, type="text", order=i)
+            baker.make("grants.Answer", applicant=applicant, question=question, answer="Answer %s" % i)
+            reviewer = baker.make("users.User", email=f"reviewer{i}@example.com")
+            baker.make("grants.Score", applicant=applicant, user=reviewer, score=4.0)
+        baker.make("grants.Score", applicant=applicant, user=user, score=3.0)
+        with django_assert_max_num_queries(self.QUERY_BUDGET):
+            response = client_logged_in.get(f"/{program.slug}/applicants/{applicant.id}/")
+        assert response.status_code == 200
+
+    @pytest.mark.parametrize("warm", [False, True])
+    @pytest.mark.parametrize("extra", [0, 10])
+    def test_query_budget_unscored(
+        self, client_logged_in, program, applicant, django_assert_max_num_queries, extra, warm
+    ):
+        for i in range(extra):
+            question = baker.make("grants.Question", program=program, type="text", order=i)
+            baker.make("grants.Answer", applicant=applicant, question=question, answer="Answer %s" % i)
+            reviewer = baker.make("users.User", email=f"reviewer{i}@example.com")
+            baker.make("grants.Score", applicant=applicant, user=reviewer, score=4.0)
+            baker.make("grants.Applicant", program=program, email=f"other{i}@example.com")
+        baker.make("grants.Applicant", program=program, email="next@example.com")
+        url = f"/{program.slug}/applicants/{applicant.id}/"
+        if warm:
+            client_logged_in.get(url)
+        budget = self.UNSCORED_WARM_QUERY_BUDGET if warm else self.UNSCORED_COLD_QUERY_BUDGET
+        with django_assert_max_num_queries(budget):
+            response = client_logged_in.get(url)
+        assert response.context["next_applicant_url"]
+
 
 class TestScoringClosed:
     """When `Program.completed` is True, no new scores can be submitted."""
@@ -240,6 +561,29 @@ class TestOwnApplicationHiddenFromReviewer:
         response = client_logged_in.get(f"/{program.slug}/applicants/{own.id}/allocations/")
         assert response.status_code == 404
 
+    def test_random_unscored_picks_unscored_applicant(self, client_logged_in, program, user):
+        scored = baker.make("grants.Applicant", program=program, email="s@example.com")
+        baker.make("grants.Score", applicant=scored, user=user, score=3)
+        baker.make("grants.Applicant", program=program, email="r@example.com", status="rejected")
+        unscored = baker.make("grants.Applicant", program=program, email="u@example.com")
+        for _ in range(5):
+            response = client_logged_in.get(f"/{program.slug}/applicants/random-unscored/")
+            assert response.url == unscored.urls.view
+
+    def test_save_and_score_another_goes_to_next_in_queue(self, client_logged_in, program, user):
+        current = baker.make("grants.Applicant", program=program, email="c@example.com")
+        following = baker.make("grants.Applicant", program=program, email="f@example.com")
+        response = client_logged_in.get(f"/{program.slug}/applicants/{current.id}/")
+        assert f'<link rel="prefetch" href="{following.urls.view}">' in response.content.decode()
+        response = client_logged_in.post(
+            f"/{program.slug}/applicants/{current.id}/", {"score": 4, "comment": "", "random_after": "1"}
+        )
+        assert response.url == following.urls.view
+        response = client_logged_in.post(
+            f"/{program.slug}/applicants/{following.id}/", {"score": 4, "comment": "", "random_after": "1"}
+        )
+        assert response.url == program.urls.applicants
+
     def test_random_unscored_skips_own_application(self, client_logged_in, program, user):
         baker.make("grants.Applicant", program=program, email=user.email, name="Self")
         response = client_logged_in.get(f"/{program.slug}/applicants/random-unscored/")
@@ -261,6 +605,81 @@ class TestOwnApplicationHiddenFromReviewer:
         assert namesake.name in response.content.decode()
 
 
+@pytest.mark.usefixtures("media_root")
+class TestBulkLoadApplicants:
+    def upload(self, client, program, content):
+        response = client.post(
+            f"/{program.slug}/applicants/bulk/",
+            {"csv": SimpleUploadedFile("applicants.csv", content.encode(), content_type="text/csv")},
+        )
+        return response.context["form"]
+
+    def test_upload_shows_mapping_form(self, client_logged_in, program, question):
+        form = self.upload(client_logged_in, program, "Name,Email,Answer\nAda,ada@example.com,Yes\n")
+        assert form.fields["email"].choices == [("", "---"), (0, "Name"), (1, "Email"), (2, "Answer")]
+
+    def test_upload_strips_byte_order_mark(self, client_logged_in, program, question):
+        form = self.upload(client_logged_in, program, "\ufeffName,Email\nAda,ada@example.com\n")
+        assert form.fields["email"].choices == [("", "---"), (0, "Name"), (1, "Email")]
+
+    def test_mapping_imports_rows_and_reports_errors(self, client_logged_in, program, question, sync_tasks):
+        form = self.upload(
+            client_logged_in,
+            program,
+            "Name,Email,Answer\nAda,ada@example.com,Travel\n,blank@example.com,Travel\n",
+        )
+        response = client_logged_in.post(
+            f"/{program.slug}/applicants/bulk/",
+            {"csv_id": form["csv_id"].value(), "name": 0, "email": 1, f"q{question.id}": 2},
+            follow=True,
+        )
+        upload = response.context["upload"]
+        assert upload.status == "complete"
+        assert upload.successful == 1
+        assert upload.errors == [[1, ["", "blank@example.com", "Travel"], "Name is blank"]]
+        assert "Name is blank" in response.content.decode()
+        applicant = Applicant.objects.get(email="ada@example.com")
+        assert applicant.answers.get().answer == "Travel"
+
+    def test_mapping_enqueues_import(self, client_logged_in, program, question, monkeypatch):
+        enqueued = []
+        monkeypatch.setattr("grants.views.bulk_load.async_task", lambda func, *args, **kwargs: enqueued.append(args))
+        form = self.upload(client_logged_in, program, "Name,Email,Answer\nAda,ada@example.com,Travel\n")
+        response = client_logged_in.post(
+            f"/{program.slug}/applicants/bulk/",
+            {"csv_id": form["csv_id"].value(), "name": 0, "email": 1, f"q{question.id}": 2},
+        )
+        upload_id = int(form["csv_id"].value())
+        assert response.status_code == 302
+        assert response.url == f"/{program.slug}/applicants/bulk/?import={upload_id}"
+        assert enqueued == [(upload_id,)]
+        assert not Applicant.objects.exists()
+        page = client_logged_in.get(response.url)
+        assert f"/{program.slug}/applicants/imports/{upload_id}/" in page.content.decode()
+
+    def test_status_endpoint_reports_progress(self, client_logged_in, program):
+        upload = baker.make(
+            "grants.UploadedCSV",
+            program=program,
+            kind="applicants",
+            status="running",
+            rows_total=10,
+            checkpoint=5,
+            successful=4,
+            error_count=1,
+        )
+        response = client_logged_in.get(upload.urls.status)
+        assert response.json() == {
+            "status": "running",
+            "rows_done": 5,
+            "rows_total": 10,
+            "percent_done": 50,
+            "successful": 4,
+            "error_count": 1,
+            "stalled": False,
+        }
+
+
 class TestProgramQuestionsView:
     def test_requires_authentication(self, client, program):
         response = client.get(f"/{program.slug}/questions/")
@@ -282,6 +701,34 @@ class TestProgramResourcesView:
         assert response.status_code == 200
         assert resource.name in response.content.decode()
 
+    def test_cannot_reduce_amount_below_allocated(self, client_logged_in, program, resource, applicant):
+        baker.make("grants.Allocation", applicant=applicant, resource=resource, amount=600)
+        response = client_logged_in.post(
+            f"/{program.slug}/resources/{resource.id}/", {"name": resource.name, "type": "money", "amount": 500}
+        )
+        assert response.status_code == 200
+        resource.refresh_from_db()
+        assert resource.amount == 1000
+
+
+class TestApplicantAllocations:
+    def test_allocates_resource(self, client_logged_in, program, resource, applicant):
+        response = client_logged_in.post(
+            f"/{program.slug}/applicants/{applicant.id}/allocations/", {"resource": resource.id, "amount": 1000}
+        )
+        assert response.status_code == 302
+        assert applicant.allocations.get().amount == 1000
+
+    def test_rejects_allocation_over_total(self, client_logged_in, program, resource, applicant):
+        other = baker.make("grants.Applicant", program=program, email="other@example.com")
+        baker.make("grants.Allocation", applicant=other, resource=resource, amount=800)
+        response = client_logged_in.post(
+            f"/{program.slug}/applicants/{applicant.id}/allocations/", {"resource": resource.id, "amount": 300}
+        )
+        assert response.status_code == 200
+        assert "Only 200 of Travel Grant is left" in response.content.decode()
+        assert not applicant.allocations.exists()
+
 
 class TestCreateProgramView:
     def test_requires_authentication(self, client, db):
@@ -0,0 +1,19 @@
+from __future__ import annotations
+
+import itertools
+
+
+def chunked(iterable, size):
+    """
+    Yields lists of up to size items from iterable.
+    """
+    iterator = iter(iterable)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+def normalise_email(email):
+    """
+    Returns the form of an email address used to match applicants.
+    """
+    return email.strip().lower()
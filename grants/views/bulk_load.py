@@ -1,46 +1,63 @@
 from __future__ import annotations
 
 import collections
-import csv
-import datetime
 
 from django import forms
-from django.db.transaction import atomic
-from django.http import Http404
-from django.views.generic import TemplateView
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404, redirect
+from django.utils import timezone
+from django.views.generic import TemplateView, View
+from django_q.tasks import async_task
 
 from ..forms import BulkLoadMapBaseForm, BulkLoadUploadForm
-from ..models import Answer, Applicant, Score, UploadedCSV
+from ..models import UploadedCSV
 from .program import ProgramMixin
 
 
 class BulkLoader(ProgramMixin):
     """
     Generic base class for bulk loaders.
+
+    Once the columns are mapped, the import runs as a background task and
+    the page polls ImportStatus until it's done.
     """
 
     def get_context_data(self):
+        if "import" in self.request.GET:
+            upload = get_object_or_404(
+                UploadedCSV,
+                program=self.program,
+                kind=self.kind,
+                pk=self.request.GET["import"],
+            )
+            return {
+                "upload": upload,
+            }
         return {
             "form": BulkLoadUploadForm(),
         }
 
-    def before_import(self, rows, target_map):
-        """Hook called before processing rows. Override in subclasses."""
-        pass
-
     def post(self, request):
         # If there's a CSV, load it into the database, otherwise retrieve
         # the one we stored there before.
         if "csv" in request.FILES:
-            csv_obj = UploadedCSV.objects.create(csv=request.FILES["csv"].read().decode())
+            csv_obj = UploadedCSV.objects.create(
+                program=self.program,
+                uploaded_by=request.user,
+                kind=self.kind,
+                file=request.FILES["csv"],
+            )
         else:
-            csv_obj = UploadedCSV.objects.get(pk=request.POST["csv_id"])
-
-        # We always get a CSV file - parse it.
-        reader = csv.reader([x + "\n" for x in csv_obj.csv.split("\n") if len(x.strip())])
+            csv_obj = get_object_or_404(
+                UploadedCSV,
+                program=self.program,
+                kind=self.kind,
+                status="uploaded",
+                pk=request.POST["csv_id"],
+            )
 
-        rows = list(reader)
-        headers = rows[0]
+        # We always get a CSV file - read its header row for the mapping.
+        headers = csv_obj.headers()
         column_choices = [("", "---")] + list(enumerate(headers))
         # Make form with question mapping fields
         fields = collections.OrderedDict(
@@ -55,25 +72,14 @@ class BulkLoader(ProgramMixin):
         form = type("BulkLoadMapForm", (BulkLoadMapBaseForm,), fields)(form_input)
         # Did they submit mappings for all questions? If not, show form
         if form.is_valid():
-            # Save and import!
-            errors = []
-            successful = 0
-            target_map = {name: int(value) for name, value in form.cleaned_data.items() if name != "csv_id" and value}
-            self.before_import(rows, target_map)
-            for i, row in enumerate(rows[1:]):
-                try:
-                    with atomic():
-                        self.process_row(row, target_map)
-                        successful += 1
-                except Exception as e:
-                    errors.append((i, row, e))
-            csv_obj.delete()
-            return self.render_to_response(
-                {
-                    "successful": successful,
-                    "errors": errors,
-                }
-            )
+            # Save and import in the background
+            csv_obj.target_map = {
+                name: int(value) for name, value in form.cleaned_data.items() if name != "csv_id" and value
+            }
+            csv_obj.status = "queued"
+            csv_obj.save(update_fields=["target_map", "status", "updated"])
+            async_task("grants.tasks.import_csv", csv_obj.pk, task_name="import-csv-%s" % csv_obj.pk)
+            return redirect("%s?import=%s" % (request.path, csv_obj.pk))
         else:
             # Show mapping form
             return self.render_to_response(
@@ -83,18 +89,46 @@ class BulkLoader(ProgramMixin):
             )
 
 
+class ImportStatus(ProgramMixin, View):
+    """
+    Reports the progress of a background CSV import as JSON, for polling.
+    POSTing restarts an import whose worker has gone away.
+    """
+
+    def get_upload(self, upload_id):
+        return get_object_or_404(UploadedCSV, program=self.program, pk=upload_id)
+
+    def get(self, request, upload_id):
+        upload = self.get_upload(upload_id)
+        return JsonResponse(
+            {
+                "status": upload.status,
+                "rows_done": upload.checkpoint,
+                "rows_total": upload.rows_total,
+                "percent_done": upload.percent_done(),
+                "successful": upload.successful,
+                "error_count": upload.error_count,
+                "stalled": upload.is_stalled(),
+            }
+        )
+
+    def post(self, request, upload_id):
+        upload = self.get_upload(upload_id)
+        # Only the first of several resumes of the same stalled import counts.
+        if upload.is_stalled() and UploadedCSV.objects.filter(
+            pk=upload.pk, status="running", updated=upload.updated
+        ).update(status="queued", updated=timezone.now()):
+            async_task("grants.tasks.import_csv", upload.pk, task_name="import-csv-%s" % upload.pk)
+        return self.get(request, upload_id)
+
+
 class BulkLoadApplicants(BulkLoader, TemplateView):
     """
     Allows bulk importing of applications using CSV.
     """
 
     template_name = "program-bulk-applicants.html"
-
-    time_formats = [
-        "%Y-%m-%dT%H:%M:%SZ",
-        "%Y-%m-%dT%H:%M:%S",
-        "%m/%d/%Y %H:%M:%S",
-    ]
+    kind = "applicants"
 
     def get_targets(self):
         targets = [
@@ -112,71 +146,6 @@ class BulkLoadApplicants(BulkLoader, TemplateView):
             )
         return targets
 
-    def before_import(self, rows, target_map):
-        """Initialize tracking for duplicate emails within this import."""
-        self._imported_emails = set()
-
-    def process_row(self, row, target_map):
-        email = row[target_map["email"]].strip().lower()
-
-        # Check for duplicate email within this import
-        if not self.program.duplicate_emails and email in self._imported_emails:
-            raise ValueError(f"Duplicate email '{email}' - this email already appeared earlier in the CSV")
-        self._imported_emails.add(email)
-        if self.program.duplicate_emails:
-            applicant = None
-        else:
-            applicant = Applicant.objects.filter(program=self.program, email=row[target_map["email"]]).first()
-        if not applicant:
-            applicant = Applicant(
-                program=self.program,
-                name=row[target_map["name"]],
-                email=row[target_map["email"]],
-            )
-        else:
-            applicant.name = row[target_map["name"]]
-        if not applicant.name.strip():
-            raise ValueError("Name is blank")
-        if not applicant.email.strip():
-            raise ValueError("Email is blank")
-        # Parse datetime if present
-        if "timestamp" in target_map:
-            for time_format in self.time_formats:
-                try:
-                    applicant.applied = datetime.datetime.strptime(row[target_map["timestamp"]], time_format)
-                except ValueError:
-                    pass
-        applicant.save()
-        # Save answers
-        for key, _offset in target_map.items():
-            if key not in ["name", "email", "timestamp"]:
-                raw_answer = row[target_map[key]]
-                question = self.program.questions.get(pk=key.lstrip("q"))
-                if question.type == "boolean":
-                    answer = str(
-                        not any((raw_answer.lower().strip() == no_word) for no_word in ("no", "false", "off", "", "0"))
-                    )
-                elif question.type == "integer":
-                    if not raw_answer.strip():
-                        answer = None
-                    else:
-                        try:
-                            answer = str(int(raw_answer.strip()))
-                        except ValueError:
-                            raise ValueError(
-                                "Invalid integer value for question %s: %s" % (question.question, raw_answer)
-                            )
-                else:
-                    answer = raw_answer
-                answer_obj = Answer.objects.filter(applicant=applicant, question=question).first()
-                if not answer_obj:
-                    answer_obj = Answer(
-                        applicant=applicant,
-                        question=question,
-                    )
-                answer_obj.answer = answer or ""
-                answer_obj.save()
-
 
 class BulkLoadScores(BulkLoader, TemplateView):
     """
@@ -184,6 +153,7 @@ class BulkLoadScores(BulkLoader, TemplateView):
     """
 
     template_name = "program-bulk-scores.html"
+    kind = "scores"
 
     def get(self, request, *args, **kwargs):
         if self.program.completed:
@@ -201,19 +171,3 @@ class BulkLoadScores(BulkLoader, TemplateView):
             ("score", True, "Score"),
             ("comment", False, "Comment"),
         ]
-
-    def process_row(self, row, target_map):
-        applicant = Applicant.objects.get(email=row[target_map["email"]])
-
-        score = Score.objects.get_or_create(applicant=applicant, user=self.request.user)[0]
-        score_value = row[target_map["score"]]
-        try:
-            score.score = float(score_value)
-        except ValueError:
-            if not score_value.strip():
-                raise ValueError("Score is blank")
-            else:
-                raise ValueError("Score is invalid: %s" % score_value)
-        if "comment" in target_map:
-            score.comment = row[target_map["comment"]]
-        score.save()
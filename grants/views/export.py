@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+from django.conf import settings
+from django.http import FileResponse, Http404, JsonResponse
+from django.shortcuts import get_object_or_404, redirect
+from django.views.generic import TemplateView, View
+from django_q.tasks import async_task
+
+from ..models import ExportJob
+from .program import ProgramMixin
+
+
+class ExportJobMixin(ProgramMixin):
+    """
+    Restricts full exports to program managers, as they contain every
+    reviewer's scores and comments.
+    """
+
+    manage_required = True
+
+    def get_job(self, job_id):
+        job = get_object_or_404(ExportJob, program=self.program, pk=job_id)
+        job.fail_if_stalled()
+        return job
+
+
+class ProgramExports(ExportJobMixin, TemplateView):
+    """
+    Lists recent full exports of a program and starts new ones.
+    """
+
+    template_name = "program-exports.html"
+
+    def get_context_data(self):
+        jobs = list(self.program.export_jobs.select_related("requested_by").order_by("-created")[:20])
+        for job in jobs:
+            job.fail_if_stalled()
+        return {
+            "jobs": jobs,
+        }
+
+    def post(self, request):
+        job = ExportJob.objects.create(program=self.program, requested_by=request.user)
+        async_task(
+            "grants.tasks.export_applicants",
+            job.pk,
+            task_name="export-applicants-%s" % job.pk,
+            timeout=settings.EXPORT_TIMEOUT,
+        )
+        return redirect(job.urls.view)
+
+
+class ExportJobView(ExportJobMixin, TemplateView):
+    """
+    Shows the progress of an export, polling its status until it's done.
+    """
+
+    template_name = "export-job.html"
+
+    def get_context_data(self, job_id):
+        return {
+            "job": self.get_job(job_id),
+        }
+
+
+class ExportJobStatus(ExportJobMixin, View):
+    """
+    Returns an export's progress as JSON, for polling.
+    """
+
+    def get(self, request, job_id):
+        job = self.get_job(job_id)
+        return JsonResponse(
+            {
+                "status": job.status,
+                "rows_done": job.rows_done,
+                "rows_total": job.rows_total,
+                "percent_done": job.percent_done(),
+                "error": job.error,
+                "download_url": job.urls.download if job.status == "complete" else None,
+            }
+        )
+
+
+class ExportJobDownload(ExportJobMixin, View):
+    """
+    Serves a finished export file.
+    """
+
+    def get(self, request, job_id):
+        job = self.get_job(job_id)
+        if job.status != "complete" or not job.file:
+            raise Http404("Export is not ready")
+        return FileResponse(
+            job.file.open("rb"),
+            as_attachment=True,
+            filename="%s-applicants.csv" % self.program.slug,
+            content_type="text/csv",
+        )
@@ -0,0 +1,24 @@
+from __future__ import annotations
+
+import secrets
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.views.decorators.http import require_GET
+
+from .. import metrics as grants_metrics
+
+
+@require_GET
+def metrics(request):
+    """
+    Serves metrics for Prometheus to scrape, see grants.metrics. Only
+    served without METRICS_TOKEN in DEBUG, as each scrape runs queries.
+    """
+    if settings.METRICS_TOKEN:
+        expected = "Bearer %s" % settings.METRICS_TOKEN
+        if not secrets.compare_digest(request.headers.get("Authorization", ""), expected):
+            return HttpResponseForbidden("Missing or incorrect metrics token")
+    elif not settings.DEBUG:
+        return HttpResponseForbidden("Metrics are only served with METRICS_TOKEN set")
+    return HttpResponse(grants_metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
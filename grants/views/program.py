@@ -1,28 +1,35 @@
 from __future__ import annotations
 
-import collections
 import csv
 
-from django import forms
-from django.db.models import Q
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
+from django.db.models.functions import Lower, Trim
 from django.http import Http404
-from django.http import HttpResponse
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.utils import timezone
+from django.utils.functional import cached_property
 from django.views.generic import FormView, ListView, TemplateView, UpdateView, View
+from django_q.tasks import async_task
 
+from ..exports import ApplicantExport, Echo
 from ..forms import (
     AllocationForm,
     ApproveApplicantForm,
-    BaseApplyForm,
     ProgramEditForm,
     ProgramForm,
     QuestionForm,
     RejectApplicantForm,
     ResourceForm,
     ScoreForm,
+    application_form_class,
 )
-from ..models import Answer, Applicant, Program, Question, Resource, Score
+from ..models import Answer, Applicant, Program, Question, Resource
+from ..pagination import KeysetPaginator, parse_datetime_key
+from ..queues import ScoringQueue
+from ..tasks import save_application
 
 
 def _parse_integer_range(value):
@@ -72,23 +79,37 @@ class CreateProgram(FormView):
 class ProgramMixin:
     """
     Generic view base class which does things in context of a Program.
+
+    The program and the user's access to it are loaded once per request,
+    in one query, and kept as user_allowed and user_can_manage. Set
+    manage_required or staff_required to turn away other users before
+    the view runs.
     """
 
     login_required = True
+    manage_required = False
+    staff_required = False
 
     def dispatch(self, *args, **kwargs):
         self.program_slug = kwargs.pop("program")
-        self.program = Program.objects.get(slug=self.program_slug)
+        self.program = get_object_or_404(Program.objects.with_membership(self.request.user), slug=self.program_slug)
+        self.user_allowed = self.program.user_is_member
+        self.user_can_manage = self.program.user_can_manage(self.request.user)
         if self.login_required and not self.request.user.is_authenticated:
             return redirect("account_login")
-        if self.login_required and not self.program.user_allowed(self.request.user):
+        if self.login_required and not self.user_allowed:
             raise Http404("You don't have access to this program")
+        if self.manage_required and not self.user_can_manage:
+            raise Http404("Access denied")
+        if self.staff_required and not self.request.user.is_staff:
+            raise Http404("Staff access required")
         return super().dispatch(*args, **kwargs)
 
     def render_to_response(self, context, **kwargs):
         context["program"] = self.program
-        context["user_allowed_program"] = self.program.user_allowed(self.request.user)
-        context["user_can_manage"] = self.program.user_can_manage(self.request.user)
+        context["user_allowed_program"] = self.user_allowed
+        context["user_can_manage"] = self.user_can_manage
+        context["user_can_bulk_edit"] = self.user_can_manage or self.request.user.is_staff
         return super().render_to_response(context, **kwargs)
 
 
@@ -100,25 +121,18 @@ class ProgramHome(ProgramMixin, TemplateView):
     template_name = "program-home.html"
 
     def get_context_data(self):
-        active_applicants = self.program.applicants_visible_to(self.request.user).exclude(status="rejected")
-        users = list(self.program.users.all())
-        for user in users:
-            user.num_votes = (
-                user.scores.filter(
-                    applicant__program=self.program,
-                    applicant__status__in=["pending", "accepted"],
-                )
-                .exclude(applicant__email=user.email)
-                .count()
+        # Each reviewer's votes, not counting rejected applicants or their own
+        # application, matched on email the way normalise_email() does.
+        users = self.program.users.annotate(
+            num_votes=Count(
+                "scores",
+                filter=Q(scores__applicant__program=self.program, scores__applicant__status__in=["pending", "accepted"])
+                & ~Q(scores__applicant__email_normalised=Lower(Trim("email"))),
             )
+        )
         return {
-            "num_applicants": active_applicants.count(),
-            "num_scored": self.request.user.scores.filter(
-                applicant__program=self.program,
-                applicant__status__in=["pending", "accepted"],
-            )
-            .exclude(applicant__email=self.request.user.email)
-            .count(),
+            **self.program.scoring_progress(self.request.user),
+            "resources": self.program.resources.with_allocation_totals(),
             "users": users,
         }
 
@@ -131,16 +145,7 @@ class EditProgram(ProgramMixin, UpdateView):
     template_name = "program-edit.html"
     form_class = ProgramEditForm
     model = Program
-
-    def get(self, request, *args, **kwargs):
-        if not self.program.user_can_manage(request.user):
-            raise Http404("Only superusers and the program creator can edit this program")
-        return super().get(request, *args, **kwargs)
-
-    def post(self, request, *args, **kwargs):
-        if not self.program.user_can_manage(request.user):
-            raise Http404("Only superusers and the program creator can edit this program")
-        return super().post(request, *args, **kwargs)
+    manage_required = True
 
     def get_object(self):
         return self.program
@@ -204,32 +209,19 @@ class ProgramApply(ProgramMixin, FormView):
         return kwargs
 
     def get_form_class(self):
-        fields = collections.OrderedDict()
-        for question in self.program.questions.order_by("order"):
-            widget = forms.Textarea if question.type == "textarea" else None
-            fields["question-%s" % question.id] = {
-                "boolean": forms.BooleanField,
-                "text": forms.CharField,
-                "textarea": forms.CharField,
-                "integer": forms.IntegerField,
-            }[question.type](required=question.required, widget=widget, label=question.question)
-        return type("ApplicationForm", (BaseApplyForm,), fields)
+        return application_form_class(self.program)
 
     def form_valid(self, form):
-        applicant = Applicant.objects.create(
-            program=self.program,
-            name=form.cleaned_data["name"],
-            email=form.cleaned_data["email"],
-            applied=timezone.now(),
-        )
-        for question in self.program.questions.order_by("order"):
+        answers = {}
+        for question in form.questions:
             value = form.cleaned_data.get("question-%s" % question.id, None) or None
             if value:
-                Answer.objects.create(
-                    applicant=applicant,
-                    question=question,
-                    answer=value,
-                )
+                answers[question.id] = str(value)
+        args = (self.program.id, form.cleaned_data["name"], form.cleaned_data["email"], timezone.now(), answers)
+        if settings.APPLY_ASYNC:
+            async_task("grants.tasks.save_application", *args, task_name="save-application-%s" % self.program.id)
+        else:
+            save_application(*args, program=self.program)
         return redirect(self.program.urls.apply_success)
 
 
@@ -249,6 +241,27 @@ class ProgramApplicants(ProgramMixin, ListView):
 
     template_name = "program-applicants.html"
     context_object_name = "applicants"
+    paginate_by = 100
+
+    # Keyset pagination keys for each sort; each ends in the primary key so
+    # the ordering is total.
+    sort_keys = {
+        "applied": [
+            ("applied_sort", True, parse_datetime_key),
+            ("id", True, int),
+        ],
+        "score": [
+            ("score_sort", True, float),
+            ("applied_sort", True, parse_datetime_key),
+            ("id", True, int),
+        ],
+        "scores": [
+            ("score_count", False, int),
+            ("applied_sort", True, parse_datetime_key),
+            ("id", True, int),
+        ],
+    }
+    cursor_params = ("after", "before")
 
     def get_queryset(self):
         # Work out sort
@@ -260,7 +273,7 @@ class ProgramApplicants(ProgramMixin, ListView):
         else:
             self.sort = "applied"
         # Managers can view rejected applicants via ?status=rejected
-        can_manage = self.program.user_can_manage(self.request.user)
+        can_manage = self.user_can_manage
         self.viewing_rejected = can_manage and self.request.GET.get("status") == "rejected"
         qs = self.program.applicants_visible_to(self.request.user)
         if self.viewing_rejected:
@@ -280,49 +293,53 @@ class ProgramApplicants(ProgramMixin, ListView):
                     continue
                 if fq.type == "boolean" and filter_val in ("yes", "no"):
                     self.active_filters[fq.id] = filter_val
-                    answer_value = "True" if filter_val == "yes" else "False"
-                    matching_applicant_ids = Answer.objects.filter(question=fq, answer=answer_value).values_list(
-                        "applicant_id", flat=True
-                    )
+                    matching_applicant_ids = Answer.objects.filter(
+                        question=fq, answer_bool=filter_val == "yes"
+                    ).values_list("applicant_id", flat=True)
                     qs = qs.filter(pk__in=matching_applicant_ids)
                 elif fq.type == "integer":
                     parsed = _parse_integer_range(filter_val)
                     if parsed is None:
                         continue
                     low, high = parsed
-                    matching_applicant_ids = []
-                    for ans in Answer.objects.filter(question=fq):
-                        try:
-                            v = int(ans.answer)
-                        except (TypeError, ValueError):
-                            continue
-                        if low <= v <= high:
-                            matching_applicant_ids.append(ans.applicant_id)
+                    matching_applicant_ids = Answer.objects.filter(
+                        question=fq, answer_int__gte=low, answer_int__lte=high
+                    ).values_list("applicant_id", flat=True)
                     self.active_filters[fq.id] = filter_val
                     qs = qs.filter(pk__in=matching_applicant_ids)
 
-        applicants = list(qs.prefetch_related("scores").order_by("-applied"))
-        for applicant in applicants:
-            applicant.score_count = len(applicant.scores.all())
-            applicant.has_scored = any(s.user_id == self.request.user.pk for s in applicant.scores.all())
-            if applicant.has_scored:
-                applicant.average_score = applicant.average_score()
-            else:
-                applicant.average_score = -1
-        if self.sort == "score":
-            applicants.sort(key=lambda a: a.average_score, reverse=True)
-        elif self.sort == "scores":
-            applicants.sort(key=lambda a: a.score_count)
-        return applicants
+        return qs.with_score_stats(self.request.user).with_sort_keys().prefetch_related("allocations__resource")
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = KeysetPaginator(queryset, self.sort_keys[self.sort], page_size)
+        page = paginator.page(
+            after=self.request.GET.get("after"),
+            before=self.request.GET.get("before"),
+        )
+        return paginator, page, page.object_list, page.has_other_pages()
+
+    def page_url(self, param, cursor):
+        """
+        Returns a link to another page of the current list, keeping the
+        sort and any filters.
+        """
+        params = self.request.GET.copy()
+        for key in self.cursor_params:
+            params.pop(key, None)
+        params[param] = cursor
+        return "?" + params.urlencode()
 
     def get_context_data(self):
         context = super().get_context_data()
         context["sort"] = self.sort
         context["viewing_rejected"] = self.viewing_rejected
+        page = context["page_obj"]
+        context["next_page_url"] = self.page_url("after", page.next_cursor) if page.has_next() else None
+        context["previous_page_url"] = self.page_url("before", page.previous_cursor) if page.has_previous() else None
         # Build filter UI data for each filterable question.
         # Clicking an active filter clears it (toggle off); clicking another
-        # value replaces it.
-        base_params = {k: v for k, v in self.request.GET.items()}
+        # value replaces it. Changing filters goes back to the first page.
+        base_params = {k: v for k, v in self.request.GET.items() if k not in self.cursor_params}
         for fq in self.filter_questions:
             fq.active_filter = self.active_filters.get(fq.id, "")
             param_key = f"q{fq.id}"
@@ -354,82 +371,22 @@ class ProgramApplicants(ProgramMixin, ListView):
         return context
 
 
-class ProgramApplicantsCsv(ProgramMixin, ListView):
+class ProgramApplicantsCsv(ProgramMixin, View):
     """
-    Shows applications to the program.
+    Streams the program's applications as a CSV file.
     """
 
-    context_object_name = "applicants"
-
     def get(self, request, *args, **kwargs):
-        # Work out sort
-        if self.request.GET.get("sort", None) == "score":
-            self.sort = "score"
-        else:
-            self.sort = "applied"
-        # Fetch applicants visible to this user, excluding rejected
-        applicants = list(
-            self.program.applicants_visible_to(self.request.user)
-            .exclude(status="rejected")
-            .prefetch_related("scores")
-            .order_by("-applied")
+        sort = "score" if self.request.GET.get("sort", None) == "score" else "applied"
+        export = ApplicantExport(self.program, self.request.user, sort=sort)
+        writer = csv.writer(Echo())
+        response = StreamingHttpResponse(
+            (writer.writerow(row) for row in export.rows()),
+            content_type="text/csv",
         )
-        for applicant in applicants:
-            applicant.has_scored = applicant.scores.filter(user=self.request.user).exists()
-            if applicant.has_scored:
-                applicant.average_score = applicant.average_score()
-            else:
-                applicant.average_score = -1
-        if self.sort == "score":
-            applicants.sort(key=lambda a: a.average_score, reverse=True)
-
-        # Prepare CSV response
-        response = HttpResponse(content_type="text/csv")
         response["Content-Disposition"] = 'attachment; filename="applicants.csv"'
-
-        writer = csv.writer(response)
-        questions = self.program.questions.order_by("order")
-        headers = ["Email", "Name", "Has Scored", "Average Score"]
-        if self.request.user.is_staff:
-            headers.append("Applied to Speak")
-        headers += [question.question for question in questions.only("question")]
-        writer.writerow(headers)
-
-        for applicant in applicants:
-            row = [
-                applicant.email,
-                applicant.name,
-                applicant.has_scored,
-                applicant.average_score,
-            ]
-            if self.request.user.is_staff:
-                row.append(applicant.applied_to_speak)
-            questions = self.program.questions.order_by("order")
-            for question in questions:
-                try:
-                    value = (
-                        Answer.objects.filter(
-                            applicant=applicant,
-                            question=question,
-                        )
-                        .only("answer")
-                        .first()
-                        .answer
-                    )
-                except Exception as e:
-                    print(f"{e=}")
-                    value = ""
-                row += [value]
-
-            writer.writerow(row)
-
         return response
 
-    def get_context_data(self):
-        context = super().get_context_data()
-        context["sort"] = self.sort
-        return context
-
 
 class ProgramApplicantView(ProgramMixin, TemplateView):
     """
@@ -441,17 +398,19 @@ class ProgramApplicantView(ProgramMixin, TemplateView):
     def get(self, request, applicant_id):
         applicant = get_object_or_404(self.program.applicants_visible_to(self.request.user), pk=applicant_id)
         questions = list(self.program.questions.order_by("order"))
+        answers = {answer.question_id: answer for answer in applicant.answers.all()}
         for question in questions:
-            question.answer = question.answers.filter(applicant=applicant).first()
-        # See if we already scored this one
-        score = Score.objects.filter(applicant=applicant, user=self.request.user).first()
+            question.answer = answers.get(question.id)
+        # Fetch every score at once, and see if we already scored this one
+        scores = list(applicant.scores.select_related("user").order_by("id"))
+        score = next((s for s in scores if s.user_id == self.request.user.pk), None)
         old_score = score.score if score else None
         if score:
-            all_scores = Score.objects.filter(applicant=applicant)
+            all_scores = scores
             form = ScoreForm(instance=score)
         else:
             all_scores = None
-        can_manage = self.program.user_can_manage(request.user)
+        can_manage = self.user_can_manage
         reject_form = RejectApplicantForm() if can_manage else None
         approve_form = ApproveApplicantForm() if can_manage else None
         if request.method == "POST":
@@ -474,18 +433,23 @@ class ProgramApplicantView(ProgramMixin, TemplateView):
                     new_score = form.save(commit=False)
                     new_score.applicant = applicant
                     new_score.user = self.request.user
-                    if old_score and new_score.score != old_score:
-                        new_score.score_history = ",".join(
-                            [x.strip() for x in (new_score.score_history or "").split(",") if x.strip()]
-                            + ["%.1f" % old_score]
-                        )
+                    new_score.record_history(old_score)
                     new_score.save()
                     if "random_after" in request.POST:
-                        return redirect(self.program.urls.score_random)
+                        next_id = ScoringQueue(self.program, request.user).next()
+                        if next_id is None:
+                            return redirect(self.program.urls.applicants)
+                        return redirect(Applicant(pk=next_id, program=self.program).urls.view)
                     else:
                         return redirect(".")
         else:
             form = ScoreForm(instance=score)
+        # Let the browser fetch the next applicant to score while this one is read.
+        next_applicant_url = None
+        if score is None and not self.program.completed:
+            next_id = ScoringQueue(self.program, request.user).next(exclude=applicant.id)
+            if next_id is not None:
+                next_applicant_url = Applicant(pk=next_id, program=self.program).urls.view
         return self.render_to_response(
             {
                 "applicant": applicant,
@@ -495,6 +459,7 @@ class ProgramApplicantView(ProgramMixin, TemplateView):
                 "reject_form": reject_form,
                 "approve_form": approve_form,
                 "scoring_closed": self.program.completed,
+                "next_applicant_url": next_applicant_url,
             }
         )
 
@@ -513,8 +478,7 @@ class RandomUnscoredApplicant(ProgramMixin, View):
         applicant = (
             self.program.applicants_visible_to(self.request.user)
             .exclude(Q(scores__user=self.request.user) | Q(status="rejected"))
-            .order_by("?")
-            .first()
+            .random()
         )
         if applicant:
             return redirect(applicant.urls.view)
@@ -531,11 +495,13 @@ class ApplicantAllocations(ProgramMixin, FormView):
     template_name = "applicant-allocations.html"
 
     def dispatch(self, request, *args, **kwargs):
-        applicant_id = kwargs.pop("applicant_id")
-        self.program = get_object_or_404(Program, slug=kwargs["program"])
-        self.applicant = get_object_or_404(self.program.applicants_visible_to(request.user), pk=applicant_id)
+        self.applicant_id = kwargs.pop("applicant_id")
         return super().dispatch(request, *args, **kwargs)
 
+    @cached_property
+    def applicant(self):
+        return get_object_or_404(self.program.applicants_visible_to(self.request.user), pk=self.applicant_id)
+
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
         kwargs["applicant"] = self.applicant
@@ -548,9 +514,20 @@ class ApplicantAllocations(ProgramMixin, FormView):
         return context
 
     def form_valid(self, form):
-        question = form.save(commit=False)
-        question.applicant = self.applicant
-        question.save()
+        with transaction.atomic():
+            # Lock the resource so concurrent allocations can't each see room
+            # for themselves and together go over the total.
+            resource = Resource.objects.select_for_update().get(pk=form.cleaned_data["resource"].pk)
+            amount = form.cleaned_data["amount"]
+            if amount > resource.amount_remaining():
+                form.add_error(
+                    "amount",
+                    "Only %s of %s is left to allocate." % (max(resource.amount_remaining(), 0), resource),
+                )
+                return self.form_invalid(form)
+            question = form.save(commit=False)
+            question.applicant = self.applicant
+            question.save()
         return redirect(".")
 
     def post(self, request, *args, **kwargs):
@@ -571,7 +548,7 @@ class ProgramResources(ProgramMixin, FormView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context["resources"] = self.program.resources.order_by("name")
+        context["resources"] = self.program.resources.with_allocation_totals().order_by("name")
         return context
 
     def form_valid(self, form):
@@ -607,11 +584,7 @@ class BulkUpdateSpeakerStatus(ProgramMixin, View):
     Allows staff users to bulk update applied_to_speak status for applicants.
     """
 
-    def dispatch(self, *args, **kwargs):
-        result = super().dispatch(*args, **kwargs)
-        if hasattr(self, "request") and not self.request.user.is_staff:
-            raise Http404("Staff access required")
-        return result
+    staff_required = True
 
     def post(self, request):
         applicant_ids = request.POST.getlist("applicant_ids")
@@ -632,11 +605,7 @@ class BulkRejectApplicants(ProgramMixin, View):
     Allows superusers and program creators to bulk reject applicants.
     """
 
-    def dispatch(self, *args, **kwargs):
-        result = super().dispatch(*args, **kwargs)
-        if hasattr(self, "request") and not self.program.user_can_manage(self.request.user):
-            raise Http404("Access denied")
-        return result
+    manage_required = True
 
     def post(self, request):
         applicant_ids = request.POST.getlist("applicant_ids")
@@ -648,6 +617,7 @@ class BulkRejectApplicants(ProgramMixin, View):
                 program=self.program,
                 pk__in=applicant_ids,
             ).update(status=new_status)
+            self.program.progress_changed()
 
         if action == "restore_pending":
             return redirect(self.program.urls.applicants + "?status=rejected")
@@ -659,11 +629,7 @@ class BulkApproveApplicants(ProgramMixin, View):
     Allows superusers and program creators to bulk approve applicants.
     """
 
-    def dispatch(self, *args, **kwargs):
-        result = super().dispatch(*args, **kwargs)
-        if hasattr(self, "request") and not self.program.user_can_manage(self.request.user):
-            raise Http404("Access denied")
-        return result
+    manage_required = True
 
     def post(self, request):
         applicant_ids = request.POST.getlist("applicant_ids")
@@ -673,5 +639,6 @@ class BulkApproveApplicants(ProgramMixin, View):
                 program=self.program,
                 pk__in=applicant_ids,
             ).update(status="accepted")
+            self.program.progress_changed()
 
         return redirect(self.program.urls.applicants)
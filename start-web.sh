@@ -1,6 +1,11 @@
 #!/bin/sh
 uv run -m manage migrate --noinput
 
+uv run -m manage createcachetable
+
 uv run -m manage collectstatic --noinput
 
+# Forget metrics from this host's previous processes.
+[ -n "$METRICS_DIR" ] && rm -f "$METRICS_DIR/$(hostname)"-*.json
+
 uv run -m manage prodserver web
@@ -1,2 +1,5 @@
 #!/bin/sh
+# Forget metrics from this host's previous processes.
+[ -n "$METRICS_DIR" ] && rm -f "$METRICS_DIR/$(hostname)"-*.json
+
 uv run -m manage qcluster --skip-checks